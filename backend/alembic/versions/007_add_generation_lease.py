@@ -0,0 +1,32 @@
+"""Add lease columns for durable generation queue
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Воркер, захвативший статью, и срок аренды (продлевается heartbeat'ом)
+    op.add_column('articles', sa.Column('locked_by', sa.String(length=100), nullable=True))
+    op.add_column('articles', sa.Column('lease_expires_at', sa.DateTime(), nullable=True))
+    # Количество попыток генерации, чтобы не зацикливаться на "ядовитых" статьях
+    op.add_column('articles', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('articles', 'attempts')
+    op.drop_column('articles', 'lease_expires_at')
+    op.drop_column('articles', 'locked_by')
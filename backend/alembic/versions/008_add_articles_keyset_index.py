@@ -0,0 +1,40 @@
+"""Add composite index for keyset pagination of articles
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '008'
+down_revision: Union[str, None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Список статей и /api/articles/changes идут по (updated_at, id) в обе стороны.
+    # CONCURRENTLY нельзя выполнять в транзакции - строим индекс без блокировки записи
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_articles_updated_at_id',
+            'articles',
+            ['updated_at', 'id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_articles_updated_at_id',
+            table_name='articles',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
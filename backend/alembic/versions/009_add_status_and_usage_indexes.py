@@ -0,0 +1,57 @@
+"""Add indexes for article status queries and usage lookups
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '009'
+down_revision: Union[str, None] = '008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY нельзя выполнять в транзакции - строим индексы без блокировки записи
+    with op.get_context().autocommit_block():
+        # Частичный индекс только по активным статьям: очередь генерации,
+        # подсчет pending и очистка зависших статей не сканируют завершенные
+        op.create_index(
+            'ix_articles_active_status_created_at',
+            'articles',
+            ['status', 'created_at'],
+            postgresql_where=sa.text("status IN ('pending', 'generating')"),
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+        # Статистика и получение статьи читают использование токенов по article_id
+        op.create_index(
+            'ix_openai_usage_article_id',
+            'openai_usage',
+            ['article_id'],
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_openai_usage_article_id',
+            table_name='openai_usage',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+        op.drop_index(
+            'ix_articles_active_status_created_at',
+            table_name='articles',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
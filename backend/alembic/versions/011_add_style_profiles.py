@@ -0,0 +1,63 @@
+"""Store style examples once in style_profiles
+
+Revision ID: 011
+Revises: 010
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '011'
+down_revision: Union[str, None] = '010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('style_profiles',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('content', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('content_hash', name='uq_style_profiles_content_hash')
+    )
+    op.add_column('articles', sa.Column('style_profile_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.create_foreign_key(
+        'fk_articles_style_profile_id', 'articles', 'style_profiles', ['style_profile_id'], ['id']
+    )
+
+    # Переносим существующие примеры стиля: по одной строке на уникальный текст.
+    # Хеш совпадает с crud.style_content_hash (sha256 от UTF-8 текста в hex)
+    op.execute("""
+        INSERT INTO style_profiles (id, content_hash, content, created_at)
+        SELECT gen_random_uuid(), encode(sha256(convert_to(style_examples, 'UTF8')), 'hex'),
+               style_examples, timezone('utc', now())
+        FROM (SELECT DISTINCT style_examples FROM articles
+              WHERE style_examples IS NOT NULL AND style_examples <> '') AS samples
+    """)
+    op.execute("""
+        UPDATE articles
+        SET style_profile_id = style_profiles.id, style_examples = NULL
+        FROM style_profiles
+        WHERE articles.style_examples IS NOT NULL AND articles.style_examples <> ''
+          AND style_profiles.content_hash = encode(sha256(convert_to(articles.style_examples, 'UTF8')), 'hex')
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        UPDATE articles
+        SET style_examples = style_profiles.content
+        FROM style_profiles
+        WHERE articles.style_profile_id = style_profiles.id
+    """)
+    op.drop_constraint('fk_articles_style_profile_id', 'articles', type_='foreignkey')
+    op.drop_column('articles', 'style_profile_id')
+    op.drop_table('style_profiles')
@@ -0,0 +1,29 @@
+"""Add cached style digest to style_profiles
+
+Revision ID: 012
+Revises: 011
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '012'
+down_revision: Union[str, None] = '011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Сжатое описание стиля составляется один раз на уникальный текст примеров
+    op.add_column('style_profiles', sa.Column('digest', sa.Text(), nullable=True))
+    op.add_column('style_profiles', sa.Column('digest_model', sa.String(length=50), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('style_profiles', 'digest_model')
+    op.drop_column('style_profiles', 'digest')
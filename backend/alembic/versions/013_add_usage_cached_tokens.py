@@ -0,0 +1,27 @@
+"""Add cached_tokens to openai_usage
+
+Revision ID: 013
+Revises: 012
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '013'
+down_revision: Union[str, None] = '012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Входные токены, прочитанные из кеша промпта провайдера
+    op.add_column('openai_usage', sa.Column('cached_tokens', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    op.drop_column('openai_usage', 'cached_tokens')
@@ -0,0 +1,27 @@
+"""Add parallel_sections flag to articles
+
+Revision ID: 014
+Revises: 013
+Create Date: 2026-10-17 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '014'
+down_revision: Union[str, None] = '013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Режим генерации разделов статьи параллельно (по умолчанию - одним запросом)
+    op.add_column('articles', sa.Column('parallel_sections', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade() -> None:
+    op.drop_column('articles', 'parallel_sections')
@@ -0,0 +1,40 @@
+"""Add serp_cache table
+
+Revision ID: 016
+Revises: 015
+Create Date: 2026-10-17 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '016'
+down_revision: Union[str, None] = '015'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Общий кеш результатов поиска для всех процессов
+    op.create_table('serp_cache',
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('query', sa.Text(), nullable=False),
+        sa.Column('hl', sa.String(length=10), nullable=False),
+        sa.Column('gl', sa.String(length=10), nullable=False),
+        sa.Column('results', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('cache_key')
+    )
+    # Для удаления просроченных записей
+    op.create_index('ix_serp_cache_expires_at', 'serp_cache', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_serp_cache_expires_at', table_name='serp_cache')
+    op.drop_table('serp_cache')
@@ -0,0 +1,70 @@
+"""Add commit-ordered change_xid to articles for /api/articles/changes
+
+Revision ID: 017
+Revises: 016
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '017'
+down_revision: Union[str, None] = '016'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Номер транзакции, последней изменившей статью. Выставляется базой, а не приложением,
+    # поэтому поздно закоммиченная запись не окажется позади уже выданного курсора.
+    # Существующие строки не переписываем: NULL - изменение до любого выданного курсора,
+    # клиент получает их при загрузке списка, а в ленту они попадут при следующем изменении
+    op.add_column('articles', sa.Column('change_xid', sa.BigInteger(), nullable=True))
+
+    # Изменением считается запись, сдвинувшая updated_at: промежуточный текст при потоковой
+    # генерации updated_at не меняет и в изменения не попадает
+    op.execute("""
+        CREATE OR REPLACE FUNCTION articles_set_change_xid() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' OR NEW.updated_at IS DISTINCT FROM OLD.updated_at THEN
+                NEW.change_xid := txid_current();
+            ELSE
+                NEW.change_xid := OLD.change_xid;
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER articles_change_xid
+        BEFORE INSERT OR UPDATE ON articles
+        FOR EACH ROW EXECUTE PROCEDURE articles_set_change_xid()
+    """)
+
+    # CONCURRENTLY нельзя выполнять в транзакции - строим индекс без блокировки записи
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_articles_change_xid_id',
+            'articles',
+            ['change_xid', 'id'],
+            postgresql_where=sa.text('change_xid IS NOT NULL'),
+            postgresql_concurrently=True,
+            if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_articles_change_xid_id',
+            table_name='articles',
+            postgresql_concurrently=True,
+            if_exists=True
+        )
+    op.execute("DROP TRIGGER IF EXISTS articles_change_xid ON articles")
+    op.execute("DROP FUNCTION IF EXISTS articles_set_change_xid()")
+    op.drop_column('articles', 'change_xid')
@@ -0,0 +1,28 @@
+"""Add article_completion_tokens to openai_usage
+
+Revision ID: 018
+Revises: 017
+Create Date: 2026-10-17 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '018'
+down_revision: Union[str, None] = '017'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Выходные токены только генерации текста статьи (без структуры, описания стиля и n8n) -
+    # по ним калибруется число знаков на токен. NULL - запись без этапа статьи или старая
+    op.add_column('openai_usage', sa.Column('article_completion_tokens', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('openai_usage', 'article_completion_tokens')
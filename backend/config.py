@@ -9,8 +9,91 @@ class Settings:
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
     ANTHROPIC_API_KEY: str = os.getenv("ANTHROPIC_API_KEY", "")  # Новый ключ для Claude
     SERP_API_KEY: str = os.getenv("SERP_API_KEY", "")
+    # Язык интерфейса и страна поиска
+    SERP_HL: str = os.getenv("SERP_HL", "ru")
+    SERP_GL: str = os.getenv("SERP_GL", "ru")
+    # Кеш результатов поиска: в памяти процесса (LRU) и общий в таблице serp_cache
+    SERP_CACHE_ENABLED: bool = os.getenv("SERP_CACHE_ENABLED", "true").lower() == "true"
+    SERP_CACHE_TTL_SECONDS: int = int(os.getenv("SERP_CACHE_TTL_SECONDS", "86400"))
+    SERP_CACHE_MAX_ENTRIES: int = int(os.getenv("SERP_CACHE_MAX_ENTRIES", "1000"))
+    SERP_CACHE_SHARED: bool = os.getenv("SERP_CACHE_SHARED", "true").lower() == "true"
+    # Одновременных запросов к хосту поиска на процесс (SerpAPI и запасной поиск Google)
+    SERP_API_CONCURRENCY: int = int(os.getenv("SERP_API_CONCURRENCY", "4"))
+    SERP_SCRAPE_CONCURRENCY: int = int(os.getenv("SERP_SCRAPE_CONCURRENCY", "2"))
+    # Анализ по теме и связанным запросам (выдачи запрашиваются одновременно и объединяются)
+    SERP_FANOUT_ENABLED: bool = os.getenv("SERP_FANOUT_ENABLED", "false").lower() == "true"
+    SERP_FANOUT_MAX_QUERIES: int = int(os.getenv("SERP_FANOUT_MAX_QUERIES", "4"))
+    SERP_FANOUT_DEADLINE_SECONDS: float = float(os.getenv("SERP_FANOUT_DEADLINE_SECONDS", "8"))
     FRONTEND_URL: str = os.getenv("FRONTEND_URL", "http://localhost:3000")
     
+    # Режим генерации: "n8n" - генерацию выполняет n8n по webhook, "local" - пул воркеров внутри приложения,
+    # "worker" - API только ставит статьи в очередь, генерирует отдельный процесс worker.py
+    GENERATION_MODE: str = os.getenv("GENERATION_MODE", "n8n")
+    # Количество одновременных генераций и глубина очереди ожидания
+    GENERATION_WORKERS: int = int(os.getenv("GENERATION_WORKERS", "4"))
+    # Количество одновременных генераций в отдельном процессе worker.py
+    WORKER_CONCURRENCY: int = int(os.getenv("WORKER_CONCURRENCY", os.getenv("GENERATION_WORKERS", "4")))
+    # Как часто worker.py пишет метрики пула в лог (секунды)
+    WORKER_STATS_INTERVAL: int = int(os.getenv("WORKER_STATS_INTERVAL", "60"))
+    GENERATION_QUEUE_SIZE: int = int(os.getenv("GENERATION_QUEUE_SIZE", "100"))
+    # Максимум тем в одном запросе /api/articles/generate-batch
+    GENERATION_BATCH_MAX: int = int(os.getenv("GENERATION_BATCH_MAX", "500"))
+    # Хранилище очереди: "postgres" - статьи в статусе pending забираются через FOR UPDATE SKIP LOCKED,
+    # "memory" - очередь только в памяти процесса (теряется при перезапуске)
+    GENERATION_QUEUE_BACKEND: str = os.getenv("GENERATION_QUEUE_BACKEND", "postgres")
+    GENERATION_LEASE_SECONDS: int = int(os.getenv("GENERATION_LEASE_SECONDS", "120"))
+    GENERATION_HEARTBEAT_SECONDS: int = int(os.getenv("GENERATION_HEARTBEAT_SECONDS", "30"))
+    GENERATION_POLL_SECONDS: float = float(os.getenv("GENERATION_POLL_SECONDS", "2"))
+    GENERATION_MAX_ATTEMPTS: int = int(os.getenv("GENERATION_MAX_ATTEMPTS", "3"))
+    # Как часто частичный текст генерируемой статьи сохраняется в базу и как часто SSE опрашивает базу.
+    # Без изменений интервал опроса удваивается до STREAM_POLL_MAX_SECONDS; смена статуса (NOTIFY) будит сразу
+    STREAM_FLUSH_SECONDS: float = float(os.getenv("STREAM_FLUSH_SECONDS", "2"))
+    STREAM_POLL_SECONDS: float = float(os.getenv("STREAM_POLL_SECONDS", "2"))
+    STREAM_POLL_MAX_SECONDS: float = float(os.getenv("STREAM_POLL_MAX_SECONDS", "10"))
+    
+    # Сжатие примеров стиля: вместо исходных примеров в промпт статьи идет их краткое описание,
+    # составленное один раз и закешированное по хешу текста. Короткие примеры передаются как есть
+    STYLE_DIGEST_ENABLED: bool = os.getenv("STYLE_DIGEST_ENABLED", "true").lower() == "true"
+    STYLE_DIGEST_MIN_CHARS: int = int(os.getenv("STYLE_DIGEST_MIN_CHARS", "1500"))
+    # Модель для составления описания; пусто - модель генерируемой статьи
+    STYLE_DIGEST_MODEL: str = os.getenv("STYLE_DIGEST_MODEL", "")
+    
+    # Контроль длины статьи: допустимое отклонение от заданного числа знаков
+    LENGTH_TOLERANCE: int = int(os.getenv("LENGTH_TOLERANCE", "200"))
+    # Лишнее срезается локально; дописывать через LLM только при недоборе не меньше этой доли от заданной длины
+    LENGTH_EXPAND_MIN_SHORTFALL: float = float(os.getenv("LENGTH_EXPAND_MIN_SHORTFALL", "0.15"))
+    
+    # Бюджет токенов статьи: max_tokens считается из character_count по числу знаков на токен,
+    # откалиброванному по прошлым записям openai_usage для каждой модели и языка
+    TOKEN_BUDGET_HEADROOM: float = float(os.getenv("TOKEN_BUDGET_HEADROOM", "1.3"))
+    TOKEN_BUDGET_MIN_SAMPLES: int = int(os.getenv("TOKEN_BUDGET_MIN_SAMPLES", "5"))
+    TOKEN_BUDGET_REFRESH_SECONDS: int = int(os.getenv("TOKEN_BUDGET_REFRESH_SECONDS", "3600"))
+    
+    # Режим parallel_sections: сколько разделов одной статьи генерируется одновременно
+    SECTION_PARALLEL_CONCURRENCY: int = int(os.getenv("SECTION_PARALLEL_CONCURRENCY", "6"))
+    
+    # Webhook n8n: доставка в фоне через общую HTTP-сессию, неудачные попытки повторяются с backoff
+    N8N_WEBHOOK_URL: str = os.getenv("N8N_WEBHOOK_URL", "https://n8n.tech.ai-community.com/webhook/generate-article")
+    WEBHOOK_TIMEOUT_SECONDS: float = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "10"))
+    WEBHOOK_CONCURRENCY: int = int(os.getenv("WEBHOOK_CONCURRENCY", "4"))
+    WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "8"))
+    WEBHOOK_RETRY_BASE_SECONDS: float = float(os.getenv("WEBHOOK_RETRY_BASE_SECONDS", "10"))
+    WEBHOOK_RETRY_MAX_SECONDS: float = float(os.getenv("WEBHOOK_RETRY_MAX_SECONDS", "3600"))
+    WEBHOOK_POLL_SECONDS: float = float(os.getenv("WEBHOOK_POLL_SECONDS", "15"))
+    
+    # Пулы соединений SQLAlchemy: синхронный (генерация, очередь задач) и asyncpg (обработчики API).
+    # Сумма обоих пулов с overflow плюс соединение LISTEN не может превышать DB_MAX_CONNECTIONS -
+    # это потолок на процесс; Heroku Postgres ограничивает число соединений на базу на все дино
+    DB_MAX_CONNECTIONS: int = int(os.getenv("DB_MAX_CONNECTIONS", "10"))
+    DB_SYNC_POOL_SIZE: int = int(os.getenv("DB_SYNC_POOL_SIZE", "2"))
+    DB_SYNC_MAX_OVERFLOW: int = int(os.getenv("DB_SYNC_MAX_OVERFLOW", "2"))
+    DB_ASYNC_POOL_SIZE: int = int(os.getenv("DB_ASYNC_POOL_SIZE", "3"))
+    DB_ASYNC_MAX_OVERFLOW: int = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "2"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    # Пересоздавать соединения старше N секунд, проверять соединение перед выдачей из пула
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_PRE_PING: bool = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+    
     @property
     def database_url_fixed(self) -> str:
         """Fix DATABASE_URL for SQLAlchemy 2.0+ compatibility"""
@@ -19,6 +102,13 @@ class Settings:
             url = url.replace("postgres://", "postgresql://", 1)
         return url
     
+    @property
+    def async_database_url(self) -> str:
+        """DATABASE_URL для асинхронного драйвера asyncpg"""
+        url = self.database_url_fixed.replace("postgresql://", "postgresql+asyncpg://", 1)
+        # asyncpg не понимает параметр libpq sslmode - у него это параметр ssl
+        return url.replace("sslmode=", "ssl=")
+    
     # OpenAI pricing per 1K tokens (as of 2024)
     OPENAI_PRICING = {
         # GPT-3.5 Models
@@ -49,6 +139,25 @@ class Settings:
         "claude-3-5-haiku-20241022": {"input": 0.00025, "output": 0.00125},
     }
     
+    # Максимум выходных токенов одного ответа модели
+    MODEL_MAX_OUTPUT_TOKENS = {
+        "gpt-3.5-turbo": 4096,
+        "gpt-3.5-turbo-16k": 4096,
+        "gpt-3.5-turbo-instruct": 4096,
+        "gpt-4": 4096,
+        "gpt-4-32k": 8192,
+        "gpt-4-turbo": 4096,
+        "gpt-4-turbo-preview": 4096,
+        "gpt-4o": 16384,
+        "gpt-4o-mini": 16384,
+        "text-davinci-003": 4096,
+        "claude-3-haiku-20240307": 4096,
+        "claude-3-sonnet-20240229": 4096,
+        "claude-3-opus-20240229": 4096,
+        "claude-3-5-sonnet-20241022": 8192,
+        "claude-3-5-haiku-20241022": 8192,
+    }
+    
     # Combined pricing for all models
     @property
     def ALL_PRICING(self):
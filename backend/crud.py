@@ -1,13 +1,141 @@
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from uuid import UUID
-from datetime import datetime
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import and_, func, or_, select, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta
+import base64
+import hashlib
 import models
 import schemas
 
+# Колонки для списков статей: без тяжелых текстов (article, structure, style_examples)
+ARTICLE_SUMMARY_COLUMNS = (
+    models.Article.id,
+    models.Article.topic,
+    models.Article.thesis,
+    models.Article.character_count,
+    models.Article.seo_score,
+    models.Article.model_used,
+    models.Article.status,
+    models.Article.error_message,
+    models.Article.created_at,
+    models.Article.updated_at,
+)
+
+def encode_cursor(updated_at: datetime, article_id: UUID) -> str:
+    """Кодирует позицию (updated_at, id) в непрозрачный курсор"""
+    raw = f"{updated_at.isoformat()}|{article_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, Optional[UUID]]:
+    """Декодирует курсор; также принимает обычную ISO-дату updated_at (тогда id не задан)"""
+    try:
+        return datetime.fromisoformat(cursor), None
+    except ValueError:
+        pass
+    
+    padded = cursor + "=" * (-len(cursor) % 4)
+    updated_at, article_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+    return datetime.fromisoformat(updated_at), UUID(article_id)
+
+def encode_change_cursor(change_xid: int, article_id: Optional[UUID] = None) -> str:
+    """Кодирует позицию ленты изменений (change_xid, id) в непрозрачный курсор"""
+    raw = f"{change_xid}|{article_id or ''}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_change_cursor(cursor: str) -> Tuple[int, Optional[UUID]]:
+    """Декодирует курсор ленты изменений; без id позиция включает саму транзакцию change_xid"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    change_xid, article_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+    return int(change_xid), UUID(article_id) if article_id else None
+
+# Транзакции с номером меньше этого уже завершены: их изменения видны целиком и новых не будет
+CHANGES_HORIZON = select(func.txid_snapshot_xmin(func.txid_current_snapshot()))
+
+def build_article_changes_query(since_xid: int, since_id: Optional[UUID], horizon: int, limit: int):
+    """Статьи, измененные после позиции (change_xid, id) завершенными транзакциями (change_xid < horizon).
+
+    Изменения еще идущих транзакций подождут следующего запроса, поэтому
+    поздний commit не проскакивает мимо курсора клиента. Строки с change_xid
+    NULL (не менялись после миграции) лежат раньше любого курсора и сюда не попадают.
+    """
+    if since_id is None:
+        position = models.Article.change_xid >= since_xid
+    else:
+        position = or_(
+            models.Article.change_xid > since_xid,
+            and_(models.Article.change_xid == since_xid, models.Article.id > since_id)
+        )
+    return (
+        select(*ARTICLE_SUMMARY_COLUMNS, models.Article.change_xid)
+        .where(position, models.Article.change_xid < horizon)
+        .order_by(models.Article.change_xid.asc(), models.Article.id.asc())
+        .limit(limit)
+    )
+
+def next_change_cursor(rows: list, horizon: int, limit: int) -> str:
+    """Курсор после страницы изменений: последняя строка полной страницы или горизонт завершенных транзакций"""
+    if len(rows) == limit:
+        return encode_change_cursor(rows[-1].change_xid, rows[-1].id)
+    return encode_change_cursor(horizon)
+
+def style_content_hash(content: str) -> str:
+    """Ключ профиля стиля: sha256 от текста примеров"""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def build_style_profile_insert(content: str):
+    """INSERT профиля стиля, который при совпадении хеша ничего не делает"""
+    return (
+        pg_insert(models.StyleProfile)
+        .values(id=uuid4(), content_hash=style_content_hash(content), content=content, created_at=datetime.utcnow())
+        .on_conflict_do_nothing(index_elements=["content_hash"])
+        .returning(models.StyleProfile.id)
+    )
+
+def get_or_create_style_profile(db: Session, content: str) -> UUID:
+    """Возвращает ID профиля стиля с таким текстом, создавая его при необходимости (без commit)"""
+    profile_id = db.execute(build_style_profile_insert(content)).scalar_one_or_none()
+    if profile_id is None:
+        profile_id = db.query(models.StyleProfile.id).filter(
+            models.StyleProfile.content_hash == style_content_hash(content)
+        ).scalar()
+    return profile_id
+
+def get_style_digest(db: Session, content_hash: str) -> Optional[str]:
+    """Получает сохраненное сжатое описание стиля по хешу примеров"""
+    return db.query(models.StyleProfile.digest).filter(models.StyleProfile.content_hash == content_hash).scalar()
+
+def save_style_digest(db: Session, content: str, digest: str, model: str):
+    """Сохраняет сжатое описание стиля в профиль (создает профиль, если его еще нет)"""
+    profile_id = get_or_create_style_profile(db, content)
+    db.query(models.StyleProfile).filter(models.StyleProfile.id == profile_id).update(
+        {models.StyleProfile.digest: digest, models.StyleProfile.digest_model: model},
+        synchronize_session=False
+    )
+    db.commit()
+
+def build_serp_cache_upsert(cache_key: str, query: str, hl: str, gl: str, results: dict, ttl_seconds: int):
+    """INSERT результатов поиска в общий кеш, перезаписывающий прежнюю запись с тем же ключом"""
+    now = datetime.utcnow()
+    values = {"results": results, "created_at": now, "expires_at": now + timedelta(seconds=ttl_seconds)}
+    return (
+        pg_insert(models.SerpCacheEntry)
+        .values(cache_key=cache_key, query=query, hl=hl, gl=gl, **values)
+        .on_conflict_do_update(index_elements=[models.SerpCacheEntry.cache_key], set_=values)
+    )
+
+def _with_style_profile(db: Session, article_data: dict) -> dict:
+    """Заменяет текст style_examples ссылкой на дедуплицированный профиль стиля"""
+    article_data = dict(article_data)
+    style_examples = article_data.pop("style_examples", None)
+    if style_examples:
+        article_data["style_profile_id"] = get_or_create_style_profile(db, style_examples)
+    return article_data
+
 def create_article(db: Session, article_data: dict) -> models.Article:
     """Создает новую статью"""
-    db_article = models.Article(**article_data)
+    db_article = models.Article(**_with_style_profile(db, article_data))
     db.add(db_article)
     db.commit()
     db.refresh(db_article)
@@ -20,6 +148,7 @@ def create_article_for_async_generation(db: Session, request: schemas.Generation
         "thesis": request.thesis,
         "style_examples": request.style_examples or "",
         "character_count": request.character_count or 5000,
+        "parallel_sections": bool(request.parallel_sections),
         "model_used": request.model,
         "status": models.ArticleStatus.PENDING,
         "keywords": None,
@@ -29,35 +158,62 @@ def create_article_for_async_generation(db: Session, request: schemas.Generation
         "error_message": None
     }
     
-    db_article = models.Article(**article_data)
+    db_article = models.Article(**_with_style_profile(db, article_data))
     db.add(db_article)
     db.commit()
     db.refresh(db_article)
     return db_article
 
-def update_article_status(db: Session, article_id: UUID, status: models.ArticleStatus, error_message: Optional[str] = None) -> bool:
-    """Обновляет статус статьи"""
-    article = db.query(models.Article).filter(models.Article.id == article_id).first()
-    if article:
-        article.status = status
-        article.updated_at = datetime.utcnow()
-        if error_message:
-            article.error_message = error_message
-        db.commit()
-        return True
-    return False
+ExpectedStatus = Union[models.ArticleStatus, Iterable[models.ArticleStatus], None]
 
-def update_article_content(db: Session, article_id: UUID, content_data: dict) -> bool:
-    """Обновляет содержимое статьи после генерации"""
-    article = db.query(models.Article).filter(models.Article.id == article_id).first()
-    if article:
-        for key, value in content_data.items():
-            if hasattr(article, key):
-                setattr(article, key, value)
-        article.updated_at = datetime.utcnow()
-        db.commit()
-        return True
-    return False
+def build_article_update(article_id: UUID, values: Dict[str, Any], expected_status: ExpectedStatus = None,
+                         locked_by: Optional[str] = None, touch: bool = True):
+    """Собирает UPDATE статьи одним запросом с RETURNING updated_at.
+
+    expected_status - compare-and-set: строка обновляется, только если ее статус
+    все еще ожидаемый, поэтому параллельные воркеры не затирают друг друга.
+    locked_by - строка обновляется, только пока аренда статьи у этого воркера.
+    touch=False - запись не считается изменением статьи (updated_at и change_xid
+    не меняются), например промежуточный текст при потоковой генерации.
+    """
+    # Неизвестные ключи игнорируем, updated_at всегда выставляем сами
+    values = {key: value for key, value in values.items() if key not in ("updated_at", "change_xid") and hasattr(models.Article, key)}
+    # Явное присваивание старого значения отключает onupdate
+    values["updated_at"] = datetime.utcnow() if touch else models.Article.updated_at
+    
+    stmt = update(models.Article).where(models.Article.id == article_id)
+    if expected_status is not None:
+        if isinstance(expected_status, models.ArticleStatus):
+            expected_status = (expected_status,)
+        stmt = stmt.where(models.Article.status.in_(list(expected_status)))
+    if locked_by is not None:
+        stmt = stmt.where(models.Article.locked_by == locked_by)
+    return stmt.values(**values).returning(models.Article.updated_at).execution_options(synchronize_session=False)
+
+def build_status_values(status: models.ArticleStatus, error_message: Optional[str] = None) -> Dict[str, Any]:
+    values = {"status": status}
+    if error_message:
+        values["error_message"] = error_message
+    return values
+
+def update_article_status(db: Session, article_id: UUID, status: models.ArticleStatus, error_message: Optional[str] = None,
+                          expected_status: ExpectedStatus = None, locked_by: Optional[str] = None) -> Optional[datetime]:
+    """Обновляет статус статьи; возвращает новый updated_at или None, если строка не обновлена"""
+    updated_at = db.execute(
+        build_article_update(article_id, build_status_values(status, error_message), expected_status, locked_by)
+    ).scalar_one_or_none()
+    db.commit()
+    return updated_at
+
+def update_article_content(db: Session, article_id: UUID, content_data: dict,
+                           expected_status: ExpectedStatus = None, locked_by: Optional[str] = None,
+                           touch: bool = True) -> Optional[datetime]:
+    """Обновляет содержимое статьи; возвращает новый updated_at или None, если строка не обновлена"""
+    updated_at = db.execute(
+        build_article_update(article_id, content_data, expected_status, locked_by, touch)
+    ).scalar_one_or_none()
+    db.commit()
+    return updated_at
 
 def create_openai_usage(db: Session, usage_data: dict) -> models.OpenAIUsage:
     """Создает запись об использовании OpenAI"""
@@ -71,18 +227,91 @@ def get_article(db: Session, article_id: UUID) -> Optional[models.Article]:
     """Получает статью по ID"""
     return db.query(models.Article).filter(models.Article.id == article_id).first()
 
-def get_articles(db: Session, skip: int = 0, limit: int = 100) -> List[models.Article]:
-    """Получает список статей с пагинацией, отсортированный по дате обновления"""
-    return db.query(models.Article).order_by(models.Article.updated_at.desc()).offset(skip).limit(limit).all()
+def get_article_status_info(db: Session, article_id: UUID):
+    """Получает статус статьи без загрузки текстов: (status, error_message, created_at, updated_at)"""
+    return (
+        db.query(
+            models.Article.status,
+            models.Article.error_message,
+            models.Article.created_at,
+            models.Article.updated_at
+        )
+        .filter(models.Article.id == article_id)
+        .first()
+    )
+
+def get_article_stream_state(db: Session, article_id: UUID) -> Optional[Tuple[models.ArticleStatus, Optional[str], Optional[str]]]:
+    """Получает только статус, текущий текст и ошибку статьи для потоковой трансляции"""
+    return (
+        db.query(models.Article.status, models.Article.article, models.Article.error_message)
+        .filter(models.Article.id == article_id)
+        .first()
+    )
+
+def get_articles(db: Session, skip: int = 0, limit: int = 100,
+                 before: Optional[Tuple[datetime, Optional[UUID]]] = None) -> List[models.Article]:
+    """Получает список статей, отсортированный по дате обновления.
+
+    before - позиция (updated_at, id) из курсора: keyset-пагинация по индексу
+    (updated_at, id), глубокие страницы стоят столько же, сколько первая.
+    skip оставлен для старых клиентов.
+    """
+    # Тексты статей списку не нужны - не читаем их из базы
+    query = db.query(models.Article).options(load_only(*ARTICLE_SUMMARY_COLUMNS))
+    if before is not None:
+        before_at, before_id = before
+        if before_id is None:
+            query = query.filter(models.Article.updated_at < before_at)
+        else:
+            query = query.filter(tuple_(models.Article.updated_at, models.Article.id) < tuple_(before_at, before_id))
+    elif skip:
+        query = query.offset(skip)
+    
+    return query.order_by(models.Article.updated_at.desc(), models.Article.id.desc()).limit(limit).all()
+
+def get_article_changes(db: Session, since_xid: int, since_id: Optional[UUID] = None, limit: int = 200) -> Tuple[list, str]:
+    """Получает статьи, изменившиеся после позиции (change_xid, id), и курсор следующего запроса.
+
+    Удаления сюда не попадают - о них сообщают push-события.
+    """
+    # Горизонт берем отдельным запросом до выборки: все, что ниже него, выборка уже увидит
+    horizon = db.execute(CHANGES_HORIZON).scalar_one()
+    rows = db.execute(build_article_changes_query(since_xid, since_id, horizon, limit)).all()
+    return rows, next_change_cursor(rows, horizon, limit)
+
+def get_latest_article_position(db: Session) -> Optional[Tuple[datetime, UUID]]:
+    """Получает позицию (updated_at, id) последнего изменения статей"""
+    return (
+        db.query(models.Article.updated_at, models.Article.id)
+        .order_by(models.Article.updated_at.desc(), models.Article.id.desc())
+        .first()
+    )
 
 def get_articles_by_status(db: Session, status: models.ArticleStatus, skip: int = 0, limit: int = 100) -> List[models.Article]:
-    """Получает список статей по статусу"""
-    return db.query(models.Article).filter(models.Article.status == status).order_by(models.Article.updated_at.desc()).offset(skip).limit(limit).all()
+    """Получает список статей по статусу (только колонки для списка)"""
+    return db.query(models.Article).options(load_only(*ARTICLE_SUMMARY_COLUMNS)).filter(models.Article.status == status).order_by(models.Article.updated_at.desc()).offset(skip).limit(limit).all()
 
 def get_pending_articles(db: Session) -> List[models.Article]:
     """Получает список статей, ожидающих генерации"""
     return db.query(models.Article).filter(models.Article.status == models.ArticleStatus.PENDING).all()
 
+def get_token_calibration_samples(db: Session, limit: int = 500) -> List[Tuple[str, int, int, str]]:
+    """Последние готовые статьи для калибровки знаков на токен: (model, токены текста статьи, длина статьи, начало текста).
+
+    Берутся только записи с article_completion_tokens: общий completion_tokens
+    включает структуру и описание стиля, а записи n8n - чужие вызовы.
+    """
+    return db.query(
+        models.OpenAIUsage.model,
+        models.OpenAIUsage.article_completion_tokens,
+        func.length(models.Article.article),
+        func.substr(models.Article.article, 1, 300)
+    ).join(models.Article, models.Article.id == models.OpenAIUsage.article_id).filter(
+        models.Article.status == models.ArticleStatus.COMPLETED,
+        models.Article.article.isnot(None),
+        models.OpenAIUsage.article_completion_tokens > 0
+    ).order_by(models.OpenAIUsage.created_at.desc()).limit(limit).all()
+
 def get_article_usage(db: Session, article_id: UUID) -> List[models.OpenAIUsage]:
     """Получает информацию об использовании OpenAI для статьи"""
     return db.query(models.OpenAIUsage).filter(models.OpenAIUsage.article_id == article_id).all()
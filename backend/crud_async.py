@@ -0,0 +1,221 @@
+from sqlalchemy import select, insert, delete, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, load_only
+from typing import List, Optional, Tuple
+from uuid import UUID, uuid4
+from datetime import datetime
+import models
+from crud import (
+    ARTICLE_SUMMARY_COLUMNS, CHANGES_HORIZON, ExpectedStatus, build_article_changes_query, build_article_update,
+    build_serp_cache_upsert, build_status_values, build_style_profile_insert, encode_change_cursor,
+    next_change_cursor, style_content_hash
+)
+
+# Асинхронные версии функций crud для обработчиков API (AsyncSession на asyncpg).
+# Фоновая генерация и очередь задач по-прежнему используют синхронный crud.
+
+async def get_or_create_style_profile(db: AsyncSession, content: str) -> UUID:
+    """Возвращает ID профиля стиля с таким текстом, создавая его при необходимости (без commit)"""
+    result = await db.execute(build_style_profile_insert(content))
+    profile_id = result.scalar_one_or_none()
+    if profile_id is None:
+        result = await db.execute(
+            select(models.StyleProfile.id).where(models.StyleProfile.content_hash == style_content_hash(content))
+        )
+        profile_id = result.scalar_one()
+    return profile_id
+
+async def _with_style_profile(db: AsyncSession, article_data: dict) -> dict:
+    """Заменяет текст style_examples ссылкой на дедуплицированный профиль стиля"""
+    article_data = dict(article_data)
+    style_examples = article_data.pop("style_examples", None)
+    if style_examples:
+        article_data["style_profile_id"] = await get_or_create_style_profile(db, style_examples)
+    return article_data
+
+async def create_style_profile(db: AsyncSession, content: str) -> models.StyleProfile:
+    """Сохраняет профиль стиля (или находит существующий с тем же текстом)"""
+    profile_id = await get_or_create_style_profile(db, content)
+    await db.commit()
+    return await db.get(models.StyleProfile, profile_id)
+
+async def get_style_profile(db: AsyncSession, profile_id: UUID) -> Optional[models.StyleProfile]:
+    """Получает профиль стиля по ID"""
+    return await db.get(models.StyleProfile, profile_id)
+
+async def create_article(db: AsyncSession, article_data: dict) -> models.Article:
+    """Создает новую статью; примеры стиля сохраняются один раз в style_profiles"""
+    db_article = models.Article(**(await _with_style_profile(db, article_data)))
+    db.add(db_article)
+    await db.commit()
+    await db.refresh(db_article)
+    return db_article
+
+async def create_articles_bulk(db: AsyncSession, articles_data: List[dict]) -> List[UUID]:
+    """Создает пакет статей одним многострочным INSERT ... RETURNING id"""
+    if not articles_data:
+        return []
+    
+    # Один профиль стиля на уникальный текст пакета (обычно это один и тот же образец)
+    profile_ids = {}
+    for data in articles_data:
+        style_examples = data.get("style_examples")
+        if style_examples and style_examples not in profile_ids:
+            profile_ids[style_examples] = await get_or_create_style_profile(db, style_examples)
+    
+    # Python-умолчания колонок (id, даты) задаем явно, чтобы у всех строк был одинаковый набор колонок
+    now = datetime.utcnow()
+    rows = []
+    for data in articles_data:
+        row = {key: value for key, value in data.items() if key != "style_examples"}
+        row.update({
+            "id": uuid4(),
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "style_profile_id": profile_ids.get(data.get("style_examples"))
+        })
+        rows.append(row)
+    result = await db.execute(insert(models.Article).values(rows).returning(models.Article.id))
+    article_ids = list(result.scalars().all())
+    await db.commit()
+    return article_ids
+
+async def update_article_status(db: AsyncSession, article_id: UUID, status: models.ArticleStatus, error_message: Optional[str] = None,
+                                expected_status: ExpectedStatus = None) -> Optional[datetime]:
+    """Обновляет статус статьи; возвращает новый updated_at или None, если строка не обновлена"""
+    result = await db.execute(build_article_update(article_id, build_status_values(status, error_message), expected_status))
+    updated_at = result.scalar_one_or_none()
+    await db.commit()
+    return updated_at
+
+async def update_article_content(db: AsyncSession, article_id: UUID, content_data: dict,
+                                 expected_status: ExpectedStatus = None) -> Optional[datetime]:
+    """Обновляет содержимое статьи; возвращает новый updated_at или None, если строка не обновлена"""
+    result = await db.execute(build_article_update(article_id, content_data, expected_status))
+    updated_at = result.scalar_one_or_none()
+    await db.commit()
+    return updated_at
+
+async def create_openai_usage(db: AsyncSession, usage_data: dict) -> models.OpenAIUsage:
+    """Создает запись об использовании OpenAI"""
+    db_usage = models.OpenAIUsage(**usage_data)
+    db.add(db_usage)
+    await db.commit()
+    await db.refresh(db_usage)
+    return db_usage
+
+async def get_article(db: AsyncSession, article_id: UUID) -> Optional[models.Article]:
+    """Получает статью по ID (вместе с профилем стиля)"""
+    result = await db.execute(
+        select(models.Article)
+        .options(joinedload(models.Article.style_profile))
+        .where(models.Article.id == article_id)
+    )
+    return result.scalars().first()
+
+async def get_article_status_info(db: AsyncSession, article_id: UUID):
+    """Получает статус статьи без загрузки текстов: (status, error_message, created_at, updated_at)"""
+    result = await db.execute(
+        select(
+            models.Article.status,
+            models.Article.error_message,
+            models.Article.created_at,
+            models.Article.updated_at
+        ).where(models.Article.id == article_id)
+    )
+    return result.first()
+
+async def get_article_stream_state(db: AsyncSession, article_id: UUID) -> Optional[Tuple[models.ArticleStatus, Optional[str], Optional[str]]]:
+    """Получает только статус, текущий текст и ошибку статьи для потоковой трансляции"""
+    result = await db.execute(
+        select(models.Article.status, models.Article.article, models.Article.error_message)
+        .where(models.Article.id == article_id)
+    )
+    return result.first()
+
+async def get_articles(db: AsyncSession, skip: int = 0, limit: int = 100,
+                       before: Optional[Tuple[datetime, Optional[UUID]]] = None) -> List[models.Article]:
+    """Получает список статей, отсортированный по дате обновления (keyset-пагинация по before)"""
+    query = select(models.Article).options(load_only(*ARTICLE_SUMMARY_COLUMNS))
+    if before is not None:
+        before_at, before_id = before
+        if before_id is None:
+            query = query.where(models.Article.updated_at < before_at)
+        else:
+            query = query.where(tuple_(models.Article.updated_at, models.Article.id) < tuple_(before_at, before_id))
+    elif skip:
+        query = query.offset(skip)
+
+    result = await db.execute(
+        query.order_by(models.Article.updated_at.desc(), models.Article.id.desc()).limit(limit)
+    )
+    return list(result.scalars().all())
+
+async def get_article_changes(db: AsyncSession, since_xid: int, since_id: Optional[UUID] = None, limit: int = 200) -> Tuple[list, str]:
+    """Получает статьи, изменившиеся после позиции (change_xid, id), и курсор следующего запроса"""
+    # Горизонт берем отдельным запросом до выборки: все, что ниже него, выборка уже увидит
+    horizon = (await db.execute(CHANGES_HORIZON)).scalar_one()
+    result = await db.execute(build_article_changes_query(since_xid, since_id, horizon, limit))
+    rows = list(result.all())
+    return rows, next_change_cursor(rows, horizon, limit)
+
+async def get_changes_cursor(db: AsyncSession) -> str:
+    """Курсор текущего момента: последующие запросы вернут изменения, не завершенные к этому моменту"""
+    return encode_change_cursor((await db.execute(CHANGES_HORIZON)).scalar_one())
+
+async def count_articles_by_status(db: AsyncSession, status: models.ArticleStatus) -> int:
+    """Количество статей с указанным статусом"""
+    result = await db.execute(
+        select(func.count()).select_from(models.Article).where(models.Article.status == status)
+    )
+    return result.scalar_one()
+
+async def get_article_usage(db: AsyncSession, article_id: UUID) -> List[models.OpenAIUsage]:
+    """Получает информацию об использовании OpenAI для статьи"""
+    result = await db.execute(
+        select(models.OpenAIUsage).where(models.OpenAIUsage.article_id == article_id)
+    )
+    return list(result.scalars().all())
+
+async def delete_article(db: AsyncSession, article_id: UUID) -> bool:
+    """Удаляет статью"""
+    article = await db.get(models.Article, article_id)
+    if article:
+        await db.delete(article)
+        await db.commit()
+        return True
+    return False
+
+async def delete_articles_by_status(db: AsyncSession, status: models.ArticleStatus) -> int:
+    """Удаляет все статьи с указанным статусом"""
+    try:
+        result = await db.execute(delete(models.Article).where(models.Article.status == status))
+        await db.commit()
+        return result.rowcount
+    except Exception as e:
+        await db.rollback()
+        raise e
+
+async def get_serp_cache(db: AsyncSession, cache_key: str) -> Optional[dict]:
+    """Получает непросроченные результаты поиска из общего кеша"""
+    result = await db.execute(
+        select(models.SerpCacheEntry.results).where(
+            models.SerpCacheEntry.cache_key == cache_key,
+            models.SerpCacheEntry.expires_at > datetime.utcnow()
+        )
+    )
+    return result.scalar_one_or_none()
+
+async def save_serp_cache(db: AsyncSession, cache_key: str, query: str, hl: str, gl: str, results: dict, ttl_seconds: int):
+    """Сохраняет результаты поиска в общий кеш (перезаписывая прежние)"""
+    await db.execute(build_serp_cache_upsert(cache_key, query, hl, gl, results, ttl_seconds))
+    await db.commit()
+
+async def delete_expired_serp_cache(db: AsyncSession) -> int:
+    """Удаляет просроченные записи общего кеша поиска"""
+    result = await db.execute(
+        delete(models.SerpCacheEntry).where(models.SerpCacheEntry.expires_at <= datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount
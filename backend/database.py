@@ -1,11 +1,102 @@
+import threading
+import time
+from typing import Any, Dict
+
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from config import settings
 
-engine = create_engine(settings.database_url_fixed)
+class PoolMetrics:
+    """Счетчики ожидания соединений из пула"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "avg_wait_ms": round(self.total_wait / attempts * 1000, 2) if attempts else 0.0,
+                "max_wait_ms": round(self.max_wait * 1000, 2)
+            }
+
+class _TimedPoolMixin:
+    """Замеряет время ожидания свободного соединения в пуле"""
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        started = time.monotonic()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.metrics.record(time.monotonic() - started, timed_out=True)
+            raise
+        self.metrics.record(time.monotonic() - started)
+        return connection
+
+class TimedQueuePool(_TimedPoolMixin, QueuePool):
+    metrics = PoolMetrics()
+
+class TimedAsyncQueuePool(_TimedPoolMixin, AsyncAdaptedQueuePool):
+    metrics = PoolMetrics()
+
+# Соединение LISTEN article_events держится вне пулов (одно на процесс)
+LISTEN_CONNECTIONS = 1
+
+def _check_connection_budget():
+    """Не дает процессу открыть больше DB_MAX_CONNECTIONS соединений с базой"""
+    total = (settings.DB_SYNC_POOL_SIZE + settings.DB_SYNC_MAX_OVERFLOW
+             + settings.DB_ASYNC_POOL_SIZE + settings.DB_ASYNC_MAX_OVERFLOW + LISTEN_CONNECTIONS)
+    if total > settings.DB_MAX_CONNECTIONS:
+        raise ValueError(
+            f"Пулы соединений с базой рассчитаны на {total} соединений при DB_MAX_CONNECTIONS={settings.DB_MAX_CONNECTIONS}: "
+            f"уменьшите DB_SYNC_*/DB_ASYNC_* или поднимите DB_MAX_CONNECTIONS"
+        )
+
+def _pool_options(pool_size: int, max_overflow: int) -> Dict[str, Any]:
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING
+    }
+
+# Синхронный движок: фоновая генерация, очередь задач и Alembic
+_check_connection_budget()
+
+engine = create_engine(
+    settings.database_url_fixed, poolclass=TimedQueuePool,
+    **_pool_options(settings.DB_SYNC_POOL_SIZE, settings.DB_SYNC_MAX_OVERFLOW)
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Асинхронный движок (asyncpg) для обработчиков API - запросы к базе не блокируют event loop
+async_engine = create_async_engine(
+    settings.async_database_url, poolclass=TimedAsyncQueuePool,
+    **_pool_options(settings.DB_ASYNC_POOL_SIZE, settings.DB_ASYNC_MAX_OVERFLOW)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 def get_db():
@@ -13,4 +104,26 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _describe_pool(pool, max_overflow: int) -> Dict[str, Any]:
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": max_overflow,
+        **pool.metrics.snapshot()
+    }
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Состояние пулов соединений процесса для /api/metrics"""
+    return {
+        "sync": _describe_pool(engine.pool, settings.DB_SYNC_MAX_OVERFLOW),
+        "async": _describe_pool(async_engine.sync_engine.pool, settings.DB_ASYNC_MAX_OVERFLOW),
+        "max_connections": settings.DB_MAX_CONNECTIONS
+    }
@@ -1,12 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from uuid import UUID
 import asyncio
 import logging
 import traceback
-import aiohttp
 import json
 from datetime import datetime
 
@@ -17,25 +17,41 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-from database import get_db, engine
+from database import get_async_db, get_pool_stats, AsyncSessionLocal
 from models import Base, ArticleStatus
 import models
 import crud
+import crud_async
 import schemas
-from services.serp_service import SERPService
+from services.serp_service import serp_service
 from services.ai_service import AIService  # Изменено на AIService для поддержки разных провайдеров
 from services.seo_service import SEOService
-from services.background_tasks import background_task_manager
+from services.background_tasks import background_task_manager, GenerationQueueFullError
+from services.article_stream import article_stream_hub
+from services.article_events import article_event_broker, publish_article_event_async
+from services.webhook_dispatcher import webhook_dispatcher
+from services.length_control import length_control_stats
+from services.token_budget import token_budget
 from config import settings
 
 # Создаем таблицы только при запуске приложения
 # Base.metadata.create_all(bind=engine)
 
 # Webhook configuration
-N8N_WEBHOOK_URL = "https://n8n.tech.ai-community.com/webhook/generate-article"
+N8N_WEBHOOK_URL = settings.N8N_WEBHOOK_URL
+
+def _webhook_article_fields(article_data: dict) -> dict:
+    """Краткие данные статьи для webhook n8n"""
+    thesis = article_data.get("thesis", "")
+    return {
+        "topic": article_data.get("topic"),
+        "thesis": thesis[:200] + "..." if len(thesis) > 200 else thesis,  # Обрезаем длинный тезис
+        "model_used": article_data.get("model_used"),
+        "character_count": article_data.get("character_count")
+    }
 
 async def send_webhook_to_n8n(article_id: str, article_data: dict = None):
-    """Отправляет webhook на n8n с Article ID и дополнительными данными"""
+    """Ставит webhook на n8n с Article ID и дополнительными данными в очередь доставки"""
     try:
         payload = {
             "article_id": article_id,
@@ -46,33 +62,33 @@ async def send_webhook_to_n8n(article_id: str, article_data: dict = None):
         
         # Добавляем дополнительную информацию о статье, если передана
         if article_data:
-            payload.update({
-                "topic": article_data.get("topic"),
-                "thesis": article_data.get("thesis", "")[:200] + "..." if len(article_data.get("thesis", "")) > 200 else article_data.get("thesis", ""),  # Обрезаем длинный тезис
-                "model_used": article_data.get("model_used"),
-                "character_count": article_data.get("character_count")
-            })
+            payload.update(_webhook_article_fields(article_data))
         
-        logger.info(f"🔗 Отправляем webhook на n8n для статьи {article_id}")
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                N8N_WEBHOOK_URL,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=aiohttp.ClientTimeout(total=10)  # 10 секунд таймаут
-            ) as response:
-                if response.status == 200:
-                    logger.info(f"✅ Webhook успешно отправлен на n8n для статьи {article_id}")
-                else:
-                    logger.warning(f"⚠️ Webhook вернул статус {response.status} для статьи {article_id}")
+        # Отправка и повторы выполняются в фоне - ответ API не ждет n8n
+        await webhook_dispatcher.enqueue(N8N_WEBHOOK_URL, payload)
+        logger.info(f"🔗 Webhook на n8n для статьи {article_id} поставлен в очередь доставки")
                     
-    except asyncio.TimeoutError:
-        logger.error(f"❌ Таймаут при отправке webhook на n8n для статьи {article_id}")
     except Exception as e:
-        logger.error(f"❌ Ошибка отправки webhook на n8n для статьи {article_id}: {str(e)}")
+        logger.error(f"❌ Ошибка постановки webhook на n8n для статьи {article_id}: {str(e)}")
         # Не прерываем выполнение, если webhook не работает
 
+async def send_batch_webhook_to_n8n(articles: List[dict]):
+    """Ставит в очередь доставки один webhook на весь пакет статей"""
+    try:
+        payload = {
+            "timestamp": asyncio.get_event_loop().time(),
+            "event": "articles_batch_created",
+            "status": "pending",
+            "count": len(articles),
+            "articles": articles
+        }
+        
+        await webhook_dispatcher.enqueue(N8N_WEBHOOK_URL, payload)
+        logger.info(f"🔗 Пакетный webhook на n8n ({len(articles)} статей) поставлен в очередь доставки")
+                    
+    except Exception as e:
+        logger.error(f"❌ Ошибка постановки пакетного webhook на n8n: {str(e)}")
+
 app = FastAPI(
     title="SEO Article Generator",
     description="API для генерации SEO-статей с помощью ИИ",
@@ -95,13 +111,50 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 # Инициализация сервисов
-serp_service = SERPService()
 ai_service = AIService()  # Изменено на AIService
 seo_service = SEOService()
 
+@app.on_event("startup")
+async def start_generation_pool():
+    """Запускает пул воркеров генерации в локальном режиме"""
+    if settings.GENERATION_MODE == "local":
+        await background_task_manager.start()
+
+@app.on_event("startup")
+async def start_article_events():
+    """Подписывается на события статей для push-уведомлений клиентов"""
+    article_event_broker.start()
+
+@app.on_event("startup")
+async def start_webhook_dispatcher():
+    """Запускает фоновую доставку webhook'ов (в том числе недоставленных до перезапуска)"""
+    if settings.GENERATION_MODE == "n8n":
+        await webhook_dispatcher.start()
+
+@app.on_event("shutdown")
+async def stop_webhook_dispatcher():
+    """Останавливает доставку webhook'ов и закрывает общую HTTP-сессию"""
+    await webhook_dispatcher.stop()
+
+@app.on_event("shutdown")
+async def stop_serp_service():
+    """Закрывает общую HTTP-сессию SERP-клиента"""
+    await serp_service.close()
+
+@app.on_event("shutdown")
+async def stop_generation_pool():
+    """Останавливает пул воркеров генерации"""
+    await background_task_manager.stop()
+
+@app.on_event("shutdown")
+async def stop_article_events():
+    """Останавливает подписку на события статей"""
+    await asyncio.to_thread(article_event_broker.stop)
+
 @app.get("/")
 async def root():
     return {"message": "SEO Article Generator API"}
@@ -116,11 +169,21 @@ async def options_generate_article_async():
     """Обработчик OPTIONS запросов для асинхронной генерации"""
     return {"message": "OK"}
 
+@app.options("/api/articles/generate-batch")
+async def options_generate_batch():
+    """Обработчик OPTIONS запросов для пакетной генерации"""
+    return {"message": "OK"}
+
 @app.options("/api/articles/{article_id}/status")
 async def options_article_status(article_id: str):
     """Обработчик OPTIONS запросов для статуса статьи"""
     return {"message": "OK"}
 
+@app.options("/api/articles/{article_id}/stream")
+async def options_article_stream(article_id: str):
+    """Обработчик OPTIONS запросов для потоковой трансляции статьи"""
+    return {"message": "OK"}
+
 @app.options("/api/articles/{article_id}/complete")
 async def options_complete_article(article_id: str):
     """Обработчик OPTIONS запросов для завершения статьи"""
@@ -165,12 +228,45 @@ async def options_health():
     """Обработчик OPTIONS запросов для health check"""
     return {"message": "OK"}
 
+async def _resolve_style_examples(db: AsyncSession, request: schemas.GenerationRequest) -> str:
+    """Примеры стиля из запроса: переданный текст или сохраненный профиль стиля"""
+    if not request.style_profile_id:
+        return request.style_examples or ""
+    
+    try:
+        profile = await crud_async.get_style_profile(db, UUID(request.style_profile_id))
+    except ValueError:
+        profile = None
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Профиль стиля не найден"
+        )
+    return profile.content
+
 @app.post("/api/articles/generate-async", response_model=schemas.AsyncGenerationResponse)
 async def generate_article_async(
     request: schemas.GenerationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Сохраняет параметры генерации статьи в базу данных со статусом 'pending' (асинхронный режим)"""
+    local_generation = settings.GENERATION_MODE == "local"
+    # В режиме worker генерирует отдельный процесс, API только ставит статью в очередь
+    queued_generation = settings.GENERATION_MODE in ("local", "worker")
+    
+    # Проверяем очередь до создания записи, чтобы не оставлять "висящих" статей
+    pending_count = None
+    if queued_generation and background_task_manager.is_durable:
+        pending_count = await crud_async.count_articles_by_status(db, ArticleStatus.PENDING)
+    if queued_generation and background_task_manager.is_full(pending_count):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Очередь генерации заполнена. Повторите запрос позже.",
+            headers={"Retry-After": "30"}
+        )
+    
+    style_examples = await _resolve_style_examples(db, request)
+    
     try:
         logger.info(f"💾 Сохраняем параметры генерации статьи (асинхронно) для темы: {request.topic}")
         
@@ -179,8 +275,9 @@ async def generate_article_async(
         article_data = {
             "topic": request.topic,
             "thesis": request.thesis,
-            "style_examples": request.style_examples or "",
+            "style_examples": style_examples,
             "character_count": request.character_count or 5000,
+            "parallel_sections": bool(request.parallel_sections),
             "model_used": request.model,
             "status": ArticleStatus.PENDING,  # Устанавливаем статус "pending"
             "keywords": None,
@@ -190,11 +287,41 @@ async def generate_article_async(
             "error_message": None
         }
         
-        db_article = crud.create_article(db, article_data)
+        db_article = await crud_async.create_article(db, article_data)
         logger.info(f"✅ Создана запись статьи с ID: {db_article.id}")
+        article_id_str = str(db_article.id)
+        await publish_article_event_async(db, db_article.id, "created", ArticleStatus.PENDING.value)
+        
+        if queued_generation:
+            if local_generation:
+                # Ставим генерацию в очередь пула воркеров
+                generation_params = {
+                    "topic": request.topic,
+                    "thesis": request.thesis,
+                    "style_examples": style_examples,
+                    "character_count": request.character_count or 5000,
+                    "parallel_sections": bool(request.parallel_sections),
+                    "model": request.model
+                }
+                try:
+                    await background_task_manager.start_article_generation(db_article.id, generation_params)
+                except GenerationQueueFullError as e:
+                    await crud_async.update_article_status(db, db_article.id, ArticleStatus.FAILED, str(e))
+                    await publish_article_event_async(db, db_article.id, "status", ArticleStatus.FAILED.value, str(e))
+                    raise HTTPException(
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        detail="Очередь генерации заполнена. Повторите запрос позже.",
+                        headers={"Retry-After": "30"}
+                    )
+            
+            return schemas.AsyncGenerationResponse(
+                article_id=article_id_str,
+                status="pending",
+                message="Статья поставлена в очередь генерации.",
+                estimated_time=background_task_manager.estimate_wait_seconds() if local_generation else None
+            )
         
         # Отправляем webhook на n8n с Article ID и данными статьи
-        article_id_str = str(db_article.id)
         await send_webhook_to_n8n(article_id_str, article_data)
         
         # Возвращаем ответ с информацией о сохраненной статье
@@ -205,6 +332,8 @@ async def generate_article_async(
             estimated_time=None  # Нет оценки времени, так как генерация не запущена
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка сохранения параметров генерации (асинхронно): {traceback.format_exc()}")
         raise HTTPException(
@@ -212,13 +341,117 @@ async def generate_article_async(
             detail=f"Ошибка сохранения параметров генерации: {str(e)}"
         )
 
+@app.post("/api/articles/generate-batch", response_model=schemas.BatchGenerationResponse)
+async def generate_articles_batch(
+    request: schemas.BatchGenerationRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Ставит в очередь пакет статей (контент-план) одним INSERT и одним webhook"""
+    if not request.items:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Пакет не содержит тем"
+        )
+    if len(request.items) > settings.GENERATION_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"В пакете не более {settings.GENERATION_BATCH_MAX} тем"
+        )
+    
+    local_generation = settings.GENERATION_MODE == "local"
+    queued_generation = settings.GENERATION_MODE in ("local", "worker")
+    
+    # Пакет принимаем целиком или не принимаем вовсе
+    if queued_generation:
+        pending_count = None
+        if background_task_manager.is_durable:
+            pending_count = await crud_async.count_articles_by_status(db, ArticleStatus.PENDING)
+        if not background_task_manager.has_capacity(len(request.items), pending_count):
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Очередь генерации не вместит пакет. Повторите запрос позже или уменьшите пакет.",
+                headers={"Retry-After": "60"}
+            )
+    
+    # Контент-план обычно ссылается на один профиль стиля - читаем каждый профиль один раз
+    profile_texts = {}
+    style_texts = []
+    for item in request.items:
+        if item.style_profile_id and item.style_profile_id not in profile_texts:
+            profile_texts[item.style_profile_id] = await _resolve_style_examples(db, item)
+        style_texts.append(profile_texts[item.style_profile_id] if item.style_profile_id else item.style_examples or "")
+    
+    try:
+        logger.info(f"💾 Сохраняем пакет из {len(request.items)} статей")
+        articles_data = [
+            {
+                "topic": item.topic,
+                "thesis": item.thesis,
+                "style_examples": style_text,
+                "character_count": item.character_count or 5000,
+                "parallel_sections": bool(item.parallel_sections),
+                "model_used": item.model,
+                "status": ArticleStatus.PENDING,
+                "keywords": None,
+                "structure": None,
+                "article": None,
+                "seo_score": None,
+                "error_message": None
+            }
+            for item, style_text in zip(request.items, style_texts)
+        ]
+        article_ids = await crud_async.create_articles_bulk(db, articles_data)
+        logger.info(f"✅ Создано {len(article_ids)} статей одним запросом")
+        # Одно событие на пакет - клиенты догрузят изменения списка
+        await publish_article_event_async(db, None, "bulk_created", ArticleStatus.PENDING.value)
+        
+        rejected_ids = []
+        if local_generation:
+            jobs = [
+                (article_id, {
+                    "topic": data["topic"],
+                    "thesis": data["thesis"],
+                    "style_examples": data["style_examples"],
+                    "character_count": data["character_count"],
+                    "parallel_sections": data["parallel_sections"],
+                    "model": data["model_used"]
+                })
+                for article_id, data in zip(article_ids, articles_data)
+            ]
+            rejected_ids = await background_task_manager.start_batch_generation(jobs)
+            for article_id in rejected_ids:
+                await crud_async.update_article_status(db, article_id, ArticleStatus.FAILED, "Очередь генерации заполнена")
+            if rejected_ids:
+                await publish_article_event_async(db, None, "bulk_updated", ArticleStatus.FAILED.value)
+        elif not queued_generation:
+            await send_batch_webhook_to_n8n([
+                {"article_id": str(article_id), **_webhook_article_fields(data)}
+                for article_id, data in zip(article_ids, articles_data)
+            ])
+        
+        return schemas.BatchGenerationResponse(
+            article_ids=[str(article_id) for article_id in article_ids],
+            status="pending",
+            message=f"В очередь генерации поставлено статей: {len(article_ids) - len(rejected_ids)}",
+            rejected_ids=[str(article_id) for article_id in rejected_ids]
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Ошибка пакетного сохранения статей: {traceback.format_exc()}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Ошибка пакетного сохранения статей: {str(e)}"
+        )
+
 @app.get("/api/articles/{article_id}/status", response_model=schemas.ArticleStatusResponse)
 async def get_article_status(
     article_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получает статус генерации статьи"""
-    article = crud.get_article(db, article_id)
+    article = await crud_async.get_article_status_info(db, article_id)
     if not article:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -242,18 +475,129 @@ async def get_article_status(
         updated_at=article.updated_at.isoformat() if article.updated_at else None
     )
 
+def _sse_event(event: str, data: dict) -> str:
+    """Форматирует событие Server-Sent Events"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _read_stream_state(article_id: UUID):
+    """Читает статус и частичный текст статьи в короткой сессии"""
+    async with AsyncSessionLocal() as db:
+        return await crud_async.get_article_stream_state(db, article_id)
+
+async def _wait_article_event(queue: asyncio.Queue, task_id: str, timeout: float) -> bool:
+    """Ждет события этой статьи (или массового изменения) из LISTEN article_events не дольше timeout"""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            return False
+        try:
+            event = await asyncio.wait_for(queue.get(), timeout=remaining)
+        except asyncio.TimeoutError:
+            return False
+        if event.get("article_id") in (task_id, None):
+            return True
+
+@app.get("/api/articles/{article_id}/stream")
+async def stream_article(article_id: UUID):
+    """Потоково отдает текст статьи по мере генерации (Server-Sent Events)"""
+    state = await _read_stream_state(article_id)
+    if not state:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Статья не найдена"
+        )
+    
+    task_id = str(article_id)
+    
+    async def event_stream():
+        # Статья генерируется в этом процессе - отдаем фрагменты напрямую от провайдера
+        if article_stream_hub.is_active(task_id):
+            async for event in article_stream_hub.subscribe(task_id):
+                yield _sse_event(event.pop("event"), event)
+            return
+        
+        # Иначе (отдельный worker.py или генерация еще не началась) следим за частичным текстом в базе.
+        # Событие отправляется только при изменении статуса или текста; пока изменений нет,
+        # опрос реже (до STREAM_POLL_MAX_SECONDS), а смена статуса через NOTIFY будит сразу
+        queue = article_event_broker.register()
+        try:
+            async for chunk in poll_stream(queue):
+                yield chunk
+        finally:
+            article_event_broker.unregister(queue)
+    
+    async def poll_stream(queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        sent_text = ""
+        sent_status = None
+        sent_at = loop.time()
+        poll_seconds = settings.STREAM_POLL_SECONDS
+        while True:
+            article_status, article_text, error_message = await _read_stream_state(article_id) or (None, None, None)
+            article_text = article_text or ""
+            
+            if article_status is None:
+                yield _sse_event("error", {"message": "Статья не найдена"})
+                return
+            if article_status == ArticleStatus.FAILED:
+                yield _sse_event("error", {"message": error_message or "Ошибка при генерации"})
+                return
+            if article_status == ArticleStatus.COMPLETED:
+                yield _sse_event("done", {"article": article_text})
+                return
+            
+            if article_status == ArticleStatus.GENERATING and article_stream_hub.is_active(task_id):
+                # Генерацию подхватил воркер этого процесса - переключаемся на прямую трансляцию
+                async for event in article_stream_hub.subscribe(task_id):
+                    yield _sse_event(event.pop("event"), event)
+                return
+            
+            changed = True
+            if article_text.startswith(sent_text) and len(article_text) > len(sent_text):
+                yield _sse_event("delta", {"text": article_text[len(sent_text):]})
+                sent_text = article_text
+            elif article_text and not article_text.startswith(sent_text):
+                yield _sse_event("replace", {"article": article_text})
+                sent_text = article_text
+            elif article_status != sent_status:
+                yield _sse_event("status", {"stage": article_status.value})
+            else:
+                changed = False
+            sent_status = article_status
+            
+            if changed:
+                poll_seconds = settings.STREAM_POLL_SECONDS
+                sent_at = loop.time()
+            else:
+                poll_seconds = min(poll_seconds * 2, settings.STREAM_POLL_MAX_SECONDS)
+                if loop.time() - sent_at >= 15:
+                    # Heroku закрывает соединения без трафика через 55 секунд
+                    yield ": ping\n\n"
+                    sent_at = loop.time()
+            
+            if await _wait_article_event(queue, task_id, poll_seconds):
+                poll_seconds = settings.STREAM_POLL_SECONDS
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.put("/api/articles/{article_id}/complete", response_model=schemas.ArticleCompletionResponse)
 async def complete_article(
     article_id: UUID,
     request: schemas.ArticleCompletionRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Завершает статью готовым контентом и устанавливает статус 'completed'"""
     try:
         logger.info(f"📝 Завершаем статью {article_id} готовым контентом")
         
         # Проверяем, существует ли статья
-        article = crud.get_article(db, article_id)
+        article = await crud_async.get_article(db, article_id)
         if not article:
             logger.error(f"❌ Статья {article_id} не найдена")
             raise HTTPException(
@@ -268,12 +612,11 @@ async def complete_article(
             "article": request.article,
             "seo_score": request.seo_score,
             "status": ArticleStatus.COMPLETED,
-            "error_message": None,
-            "updated_at": asyncio.get_event_loop().time()
+            "error_message": None
         }
         
         # Обновляем статью
-        success = crud.update_article_content(db, article_id, content_data)
+        success = await crud_async.update_article_content(db, article_id, content_data)
         if not success:
             logger.error(f"❌ Не удалось обновить статью {article_id}")
             raise HTTPException(
@@ -281,6 +624,8 @@ async def complete_article(
                 detail="Не удалось обновить статью"
             )
         
+        await publish_article_event_async(db, article_id, "status", ArticleStatus.COMPLETED.value)
+        
         # Сохраняем информацию об использовании токенов, если передана
         if request.usage:
             try:
@@ -290,9 +635,10 @@ async def complete_article(
                     "prompt_tokens": request.usage.get("prompt_tokens", 0),
                     "completion_tokens": request.usage.get("completion_tokens", 0),
                     "total_tokens": request.usage.get("total_tokens", 0),
+                    "cached_tokens": request.usage.get("cached_tokens", 0),
                     "cost_usd": request.usage.get("cost_usd", 0.0)
                 }
-                crud.create_openai_usage(db, usage_data)
+                await crud_async.create_openai_usage(db, usage_data)
                 logger.info(f"💰 Сохранена информация об использовании токенов для статьи {article_id}")
             except Exception as e:
                 logger.warning(f"⚠️ Не удалось сохранить информацию об использовании: {str(e)}")
@@ -318,9 +664,11 @@ async def complete_article(
 @app.post("/api/articles/generate", response_model=schemas.GenerationResponse)
 async def generate_article(
     request: schemas.GenerationRequest,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Сохраняет параметры генерации статьи в базу данных со статусом 'pending'"""
+    style_examples = await _resolve_style_examples(db, request)
+    
     try:
         logger.info(f"💾 Сохраняем параметры генерации статьи для темы: {request.topic}")
         logger.info(f"📊 Параметры запроса: модель={request.model}, тезис={request.thesis}")
@@ -330,8 +678,9 @@ async def generate_article(
         article_data = {
             "topic": request.topic,
             "thesis": request.thesis,
-            "style_examples": request.style_examples or "",
+            "style_examples": style_examples,
             "character_count": request.character_count or 5000,
+            "parallel_sections": bool(request.parallel_sections),
             "model_used": request.model,
             "status": ArticleStatus.PENDING,  # Устанавливаем статус "pending"
             "keywords": None,
@@ -341,8 +690,9 @@ async def generate_article(
             "error_message": None
         }
         
-        db_article = crud.create_article(db, article_data)
+        db_article = await crud_async.create_article(db, article_data)
         logger.info(f"✅ Создана запись статьи с ID: {db_article.id}")
+        await publish_article_event_async(db, db_article.id, "created", ArticleStatus.PENDING.value)
         
         # Формируем ответ
         logger.info("📤 Формируем ответ...")
@@ -351,7 +701,8 @@ async def generate_article(
                 article_id=str(db_article.id),
                 topic=db_article.topic,
                 thesis=db_article.thesis,
-                style_examples=db_article.style_examples,
+                style_examples=style_examples,
+                style_profile_id=str(db_article.style_profile_id) if db_article.style_profile_id else None,
                 character_count=db_article.character_count,
                 keywords=db_article.keywords,
                 structure=db_article.structure,
@@ -378,21 +729,111 @@ async def generate_article(
 
 @app.get("/api/articles", response_model=List[schemas.ArticleListResponse])
 async def get_articles(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Получает список всех статей"""
-    articles = crud.get_articles(db, skip=skip, limit=limit)
+    """Получает список статей.
+
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor и
+    передается в параметре cursor; skip поддерживается для старых клиентов.
+    """
+    before = None
+    if cursor:
+        try:
+            before = crud.decode_cursor(cursor)
+        except (ValueError, UnicodeDecodeError):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Некорректный параметр cursor"
+            )
+    
+    # Берем на одну статью больше, чтобы понять, есть ли следующая страница
+    articles = await crud_async.get_articles(db, skip=skip, limit=limit + 1, before=before)
+    if len(articles) > limit:
+        articles = articles[:limit]
+        response.headers["X-Next-Cursor"] = crud.encode_cursor(articles[-1].updated_at, articles[-1].id)
+    
     return [schemas.ArticleListResponse.from_orm(article) for article in articles]
 
+@app.options("/api/articles/changes")
+async def options_article_changes():
+    """Обработчик OPTIONS запросов для изменений статей"""
+    return {"message": "OK"}
+
+@app.get("/api/articles/changes", response_model=schemas.ArticleChangesResponse)
+async def get_article_changes(
+    since: Optional[str] = None,
+    limit: int = 200,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Получает статьи, изменившиеся после курсора since (без текстов статей).
+
+    since - курсор из предыдущего ответа. Курсор идет по номеру транзакции,
+    выставленному базой (change_xid), поэтому поздно закоммиченные изменения
+    не теряются. Без since возвращает только текущий курсор - его стоит
+    запросить до загрузки списка, чтобы не пропустить изменения между ними.
+    """
+    limit = max(1, min(limit, 500))
+    
+    if not since:
+        return schemas.ArticleChangesResponse(items=[], cursor=await crud_async.get_changes_cursor(db))
+    
+    try:
+        since_xid, since_id = crud.decode_change_cursor(since)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Некорректный параметр since"
+        )
+    
+    rows, cursor = await crud_async.get_article_changes(db, since_xid, since_id, limit=limit)
+    return schemas.ArticleChangesResponse(
+        items=[schemas.ArticleListResponse.from_orm(row) for row in rows],
+        cursor=cursor,
+        has_more=len(rows) == limit
+    )
+
+@app.options("/api/articles/events")
+async def options_article_events():
+    """Обработчик OPTIONS запросов для событий статей"""
+    return {"message": "OK"}
+
+@app.get("/api/articles/events")
+async def article_events():
+    """Push-канал изменений статусов статей (Server-Sent Events) вместо опроса списка"""
+    
+    async def event_stream():
+        # Сразу отправляем комментарий, чтобы прокси открыли поток
+        yield ": connected\n\n"
+        queue = article_event_broker.register()
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # Heroku закрывает соединения без трафика через 55 секунд
+                    yield ": ping\n\n"
+                    continue
+                yield _sse_event("article", event)
+        finally:
+            article_event_broker.unregister(queue)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/api/articles/{article_id}", response_model=schemas.GenerationResponse)
 async def get_article(
     article_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получает статью по ID"""
-    article = crud.get_article(db, article_id)
+    article = await crud_async.get_article(db, article_id)
     if not article:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -405,7 +846,7 @@ async def get_article(
     # Получаем информацию об использовании, если статья завершена
     usage_response = None
     if article.status == ArticleStatus.COMPLETED:
-        usage_records = crud.get_article_usage(db, article_id)
+        usage_records = await crud_async.get_article_usage(db, article_id)
         if usage_records:
             usage_response = schemas.OpenAIUsageResponse.from_orm(usage_records[0])
     
@@ -428,6 +869,7 @@ async def get_article(
         topic=article_response.topic,
         thesis=article_response.thesis,
         style_examples=article_response.style_examples,
+        style_profile_id=article_response.style_profile_id,
         character_count=article_response.character_count,
         keywords=article_response.keywords,
         structure=article_response.structure,
@@ -444,10 +886,10 @@ async def get_article(
 @app.get("/api/articles/{article_id}/generation-params", response_model=schemas.GenerationParamsResponse)
 async def get_article_generation_params(
     article_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получает параметры генерации статьи по ID"""
-    article = crud.get_article(db, article_id)
+    article = await crud_async.get_article(db, article_id)
     if not article:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -458,8 +900,10 @@ async def get_article_generation_params(
         article_id=str(article_id),
         topic=article.topic,
         thesis=article.thesis,
-        style_examples=article.style_examples or "",
+        style_examples=article.style_text,
+        style_profile_id=str(article.style_profile_id) if article.style_profile_id else None,
         character_count=article.character_count or 5000,
+        parallel_sections=bool(article.parallel_sections),
         model_used=article.model_used,
         status=article.status.value,
         created_at=article.created_at.isoformat() if article.created_at else None,
@@ -469,28 +913,32 @@ async def get_article_generation_params(
 @app.delete("/api/articles/{article_id}")
 async def delete_article(
     article_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Удаляет статью"""
     # Отменяем фоновую задачу, если она запущена
     background_task_manager.cancel_task(article_id)
     
-    success = crud.delete_article(db, article_id)
+    success = await crud_async.delete_article(db, article_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Статья не найдена"
         )
+    await publish_article_event_async(db, article_id, "deleted")
     return {"message": "Статья успешно удалена"}
 
 @app.delete("/api/articles/cleanup/pending")
 async def cleanup_pending_articles(
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Удаляет все статьи в статусе ожидания"""
     try:
-        deleted_count = crud.delete_articles_by_status(db, models.ArticleStatus.PENDING)
+        deleted_count = await crud_async.delete_articles_by_status(db, models.ArticleStatus.PENDING)
         logger.info(f"🧹 Удалено {deleted_count} статей в статусе ожидания")
+        if deleted_count:
+            # Массовое удаление без списка ID - клиенты перечитают список
+            await publish_article_event_async(db, None, "bulk_deleted", ArticleStatus.PENDING.value)
         return {
             "message": f"Удалено {deleted_count} статей в статусе ожидания",
             "deleted_count": deleted_count
@@ -505,10 +953,10 @@ async def cleanup_pending_articles(
 @app.get("/api/articles/{article_id}/seo-recommendations")
 async def get_seo_recommendations(
     article_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Получает SEO-рекомендации для статьи"""
-    article = crud.get_article(db, article_id)
+    article = await crud_async.get_article(db, article_id)
     if not article:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -534,6 +982,67 @@ async def get_seo_recommendations(
         "recommendations": recommendations
     }
 
+@app.options("/api/style-profiles")
+async def options_style_profiles():
+    """Обработчик OPTIONS запросов для профилей стиля"""
+    return {"message": "OK"}
+
+@app.options("/api/style-profiles/{profile_id}")
+async def options_style_profile(profile_id: str):
+    """Обработчик OPTIONS запросов для профиля стиля"""
+    return {"message": "OK"}
+
+@app.post("/api/style-profiles", response_model=schemas.StyleProfileResponse)
+async def create_style_profile(
+    request: schemas.StyleProfileCreate,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Сохраняет примеры стиля; одинаковый текст всегда получает один и тот же ID"""
+    if not request.content.strip():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Примеры стиля не могут быть пустыми"
+        )
+    profile = await crud_async.create_style_profile(db, request.content)
+    return schemas.StyleProfileResponse.from_orm(profile)
+
+@app.get("/api/style-profiles/{profile_id}", response_model=schemas.StyleProfileResponse)
+async def get_style_profile(
+    profile_id: UUID,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Получает сохраненные примеры стиля по ID"""
+    profile = await crud_async.get_style_profile(db, profile_id)
+    if not profile:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Профиль стиля не найден"
+        )
+    return schemas.StyleProfileResponse.from_orm(profile)
+
+@app.options("/api/metrics")
+async def options_metrics():
+    """Обработчик OPTIONS запросов для метрик"""
+    return {"message": "OK"}
+
+@app.get("/api/metrics")
+async def get_metrics(db: AsyncSession = Depends(get_async_db)):
+    """Метрики очереди генерации для подбора количества воркеров и дино"""
+    metrics = {
+        "generation_mode": settings.GENERATION_MODE,
+        "generation_queue": background_task_manager.get_stats(),
+        "event_subscribers": article_event_broker.subscriber_count,
+        "db_pools": get_pool_stats(),
+        "webhooks": webhook_dispatcher.get_stats(),
+        "length_control": length_control_stats.get_stats(),
+        "token_budget": token_budget.get_stats(),
+        "serp": serp_service.get_stats()
+    }
+    # Общая очередь в Postgres видна всем процессам, в том числе отдельным воркерам
+    if background_task_manager.is_durable:
+        metrics["pending_articles"] = await crud_async.count_articles_by_status(db, ArticleStatus.PENDING)
+    return metrics
+
 @app.get("/api/health")
 async def health_check():
     """Проверка здоровья API"""
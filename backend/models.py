@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Text, Float, Integer, DateTime, ForeignKey, DECIMAL, Enum
+from sqlalchemy import BigInteger, Boolean, Column, FetchedValue, String, Text, Float, Integer, DateTime, ForeignKey, DECIMAL, Enum
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -20,8 +20,10 @@ class Article(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     topic = Column(Text, nullable=False)
     thesis = Column(Text, nullable=False)
-    style_examples = Column(Text, nullable=True)  # Новое поле для примеров стиля
+    style_examples = Column(Text, nullable=True)  # Примеры стиля статей, созданных до style_profiles
+    style_profile_id = Column(UUID(as_uuid=True), ForeignKey("style_profiles.id"), nullable=True)  # Примеры стиля (дедуплицированы)
     character_count = Column(Integer, nullable=True, default=5000)  # Новое поле для количества знаков
+    parallel_sections = Column(Boolean, nullable=False, default=False)  # Генерировать разделы статьи параллельно
     keywords = Column(JSONB, nullable=True)  # Делаем nullable для асинхронной генерации
     structure = Column(Text, nullable=True)  # Делаем nullable для асинхронной генерации
     article = Column(Text, nullable=True)  # Делаем nullable для асинхронной генерации
@@ -29,11 +31,49 @@ class Article(Base):
     model_used = Column(String(50), nullable=False, default="unknown")
     status = Column(Enum(ArticleStatus), nullable=False, default=ArticleStatus.PENDING)
     error_message = Column(Text, nullable=True)
+    locked_by = Column(String(100), nullable=True)  # Воркер, который генерирует статью
+    lease_expires_at = Column(DateTime, nullable=True)  # Срок аренды задачи воркером
+    attempts = Column(Integer, nullable=False, default=0)  # Количество попыток генерации
+    pipeline_timings = Column(JSONB, nullable=True)  # Времена этапов генерации и критический путь
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Транзакция последнего изменения (txid_current, ставит триггер) - курсор /api/articles/changes
+    # NULL - статья не менялась с момента появления ленты изменений (раньше любого курсора)
+    change_xid = Column(BigInteger, nullable=True, server_default=FetchedValue(), server_onupdate=FetchedValue())
     
     # Relationship
     openai_usage = relationship("OpenAIUsage", back_populates="article")
+    style_profile = relationship("StyleProfile")
+    
+    @property
+    def style_text(self) -> str:
+        """Примеры стиля статьи: из профиля или, для старых статей, из самой строки"""
+        if self.style_profile is not None:
+            return self.style_profile.content
+        return self.style_examples or ""
+
+class StyleProfile(Base):
+    __tablename__ = "style_profiles"
+    __table_args__ = {'extend_existing': True}
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    content_hash = Column(String(64), nullable=False, unique=True)  # sha256 текста примеров
+    content = Column(Text, nullable=False)
+    digest = Column(Text, nullable=True)  # Сжатое описание стиля для промпта статьи ("" - описание не дает экономии)
+    digest_model = Column(String(50), nullable=True)  # Модель, составившая описание
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class SerpCacheEntry(Base):
+    __tablename__ = "serp_cache"
+    __table_args__ = {'extend_existing': True}
+    
+    cache_key = Column(String(64), primary_key=True)  # sha256 нормализованного запроса и hl/gl
+    query = Column(Text, nullable=False)
+    hl = Column(String(10), nullable=False)
+    gl = Column(String(10), nullable=False)
+    results = Column(JSONB, nullable=False)  # Выдача: results (title, link, snippet), related_questions, related_searches
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False)
 
 class OpenAIUsage(Base):
     __tablename__ = "openai_usage"
@@ -45,8 +85,26 @@ class OpenAIUsage(Base):
     prompt_tokens = Column(Integer, nullable=False)
     completion_tokens = Column(Integer, nullable=False)
     total_tokens = Column(Integer, nullable=False)
+    # Входные токены, прочитанные из кеша промпта провайдера (часть prompt_tokens)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+    # Выходные токены только текста статьи (часть completion_tokens) - для калибровки знаков на токен
+    article_completion_tokens = Column(Integer, nullable=True)
     cost_usd = Column(DECIMAL(10, 6), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship
-    article = relationship("Article", back_populates="openai_usage") 
\ No newline at end of file
+    article = relationship("Article", back_populates="openai_usage")
+
+class WebhookDelivery(Base):
+    __tablename__ = "webhook_deliveries"
+    __table_args__ = {'extend_existing': True}
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    url = Column(Text, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String(20), nullable=False, default="pending")  # pending, delivered, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)  # Когда повторить доставку
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    delivered_at = Column(DateTime, nullable=True)
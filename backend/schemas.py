@@ -15,6 +15,7 @@ class ArticleResponse(BaseModel):
     topic: str
     thesis: str
     style_examples: Optional[str] = ""
+    style_profile_id: Optional[str] = None
     character_count: Optional[int] = 5000
     keywords: Optional[List[str]] = None  # Может быть None до завершения генерации
     structure: Optional[str] = None       # Может быть None до завершения генерации
@@ -23,6 +24,7 @@ class ArticleResponse(BaseModel):
     model_used: str = "unknown"
     status: str = "pending"               # Новое поле статуса
     error_message: Optional[str] = None   # Новое поле для сообщений об ошибках
+    pipeline_timings: Optional[dict] = None  # Времена этапов генерации и критический путь
     created_at: str
     updated_at: Optional[str] = None      # Новое поле времени обновления
     
@@ -37,7 +39,8 @@ class ArticleResponse(BaseModel):
             'id': str(obj.id),
             'topic': obj.topic,
             'thesis': obj.thesis,
-            'style_examples': obj.style_examples,
+            'style_examples': obj.style_text,
+            'style_profile_id': str(obj.style_profile_id) if obj.style_profile_id else None,
             'character_count': obj.character_count,
             'keywords': obj.keywords,
             'structure': obj.structure,
@@ -46,16 +49,17 @@ class ArticleResponse(BaseModel):
             'model_used': obj.model_used or 'unknown',
             'status': obj.status.value if obj.status else 'pending',
             'error_message': obj.error_message,
+            'pipeline_timings': obj.pipeline_timings,
             'created_at': obj.created_at.isoformat() if obj.created_at else None,
             'updated_at': obj.updated_at.isoformat() if obj.updated_at else None
         }
         return cls(**data)
 
 class ArticleListResponse(BaseModel):
+    """Краткая информация о статье для списков - без текстов статьи и примеров стиля"""
     id: str
     topic: str
     thesis: str
-    style_examples: Optional[str] = ""
     character_count: Optional[int] = 5000
     seo_score: Optional[float] = None     # Может быть None до завершения генерации
     model_used: str = "unknown"
@@ -70,12 +74,11 @@ class ArticleListResponse(BaseModel):
         
     @classmethod
     def from_orm(cls, obj):
-        # Преобразуем UUID и datetime в строки
+        # obj - статья с загруженными crud.ARTICLE_SUMMARY_COLUMNS или строка такой проекции
         data = {
             'id': str(obj.id),
             'topic': obj.topic,
             'thesis': obj.thesis,
-            'style_examples': obj.style_examples,
             'character_count': obj.character_count,
             'seo_score': obj.seo_score,
             'model_used': obj.model_used or 'unknown',
@@ -86,6 +89,12 @@ class ArticleListResponse(BaseModel):
         }
         return cls(**data)
 
+class ArticleChangesResponse(BaseModel):
+    """Изменения статей после курсора"""
+    items: List[ArticleListResponse]
+    cursor: Optional[str] = None          # Передать в since при следующем запросе
+    has_more: bool = False                # Есть ли еще изменения после cursor
+
 class OpenAIUsageResponse(BaseModel):
     id: str
     article_id: str
@@ -93,6 +102,7 @@ class OpenAIUsageResponse(BaseModel):
     prompt_tokens: int
     completion_tokens: int
     total_tokens: int
+    cached_tokens: int = 0
     cost_usd: str
     created_at: str
     
@@ -109,6 +119,7 @@ class OpenAIUsageResponse(BaseModel):
             'prompt_tokens': obj.prompt_tokens,
             'completion_tokens': obj.completion_tokens,
             'total_tokens': obj.total_tokens,
+            'cached_tokens': obj.cached_tokens or 0,
             'cost_usd': str(obj.cost_usd),
             'created_at': obj.created_at.isoformat() if obj.created_at else None
         }
@@ -118,14 +129,17 @@ class GenerationRequest(BaseModel):
     topic: str
     thesis: str
     style_examples: Optional[str] = ""
+    style_profile_id: Optional[str] = None  # Вместо style_examples можно передать ID сохраненного профиля стиля
     character_count: Optional[int] = 5000
     model: str = "gpt-4o-mini"  # Изменен дефолт на самую быструю модель
+    parallel_sections: Optional[bool] = False  # Разделы H2 генерируются одновременно (быстрее для длинных статей)
 
 class GenerationResponse(BaseModel):
     article_id: str
     topic: str
     thesis: str
     style_examples: Optional[str] = ""
+    style_profile_id: Optional[str] = None
     character_count: Optional[int] = 5000
     keywords: Optional[List[str]] = None  # Может быть None до завершения генерации
     structure: Optional[str] = None       # Может быть None до завершения генерации
@@ -146,6 +160,17 @@ class AsyncGenerationResponse(BaseModel):
     message: str
     estimated_time: Optional[int] = None  # Примерное время генерации в секундах
 
+class BatchGenerationRequest(BaseModel):
+    """Пакет тем для генерации (контент-план)"""
+    items: List[GenerationRequest]
+
+class BatchGenerationResponse(BaseModel):
+    """Ответ на пакетную постановку статей в очередь"""
+    article_ids: List[str]
+    status: str
+    message: str
+    rejected_ids: List[str] = []          # Статьи, не поместившиеся в очередь (помечены failed)
+
 class ArticleStatusResponse(BaseModel):
     """Ответ для проверки статуса генерации статьи"""
     article_id: str
@@ -155,6 +180,26 @@ class ArticleStatusResponse(BaseModel):
     created_at: str
     updated_at: Optional[str] = None
 
+class StyleProfileCreate(BaseModel):
+    """Запрос на сохранение примеров стиля"""
+    content: str
+
+class StyleProfileResponse(BaseModel):
+    """Сохраненные примеры стиля (один профиль на уникальный текст)"""
+    id: str
+    content_hash: str
+    content: str
+    created_at: Optional[str] = None
+    
+    @classmethod
+    def from_orm(cls, obj):
+        return cls(
+            id=str(obj.id),
+            content_hash=obj.content_hash,
+            content=obj.content,
+            created_at=obj.created_at.isoformat() if obj.created_at else None
+        )
+
 class ModelInfo(BaseModel):
     id: str
     name: str
@@ -171,7 +216,9 @@ class GenerationParamsResponse(BaseModel):
     topic: str
     thesis: str
     style_examples: str = ""
+    style_profile_id: Optional[str] = None
     character_count: int = 5000
+    parallel_sections: bool = False
     model_used: str
     status: str
     created_at: Optional[str] = None
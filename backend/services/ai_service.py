@@ -1,9 +1,10 @@
-from typing import Dict, List, Tuple, Optional
+from typing import Awaitable, Callable, Dict, List, Tuple, Optional
 from decimal import Decimal
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
+from services.section_generation import SectionGenerationError, generate_article_by_sections, sum_usage
 
 class AIService:
     def __init__(self):
@@ -87,6 +88,55 @@ class AIService:
         service = self.get_service_for_model(model)
         return service.generate_article(topic, thesis, structure, keywords, style_examples, character_count, model)
     
+    async def generate_structure_async(self, topic: str, thesis: str, keywords: List[str], 
+                                       questions: List[str], model: str = "gpt-4o-mini") -> Tuple[str, Dict]:
+        """Асинхронно генерирует структуру статьи, не блокируя event loop"""
+        service = self.get_service_for_model(model)
+        return await service.generate_structure_async(topic, thesis, keywords, questions, model)
+    
+    async def generate_article_async(self, topic: str, thesis: str, structure: str, 
+                                     keywords: List[str], style_examples: str = "", 
+                                     character_count: int = 5000, model: str = "gpt-4o-mini",
+                                     on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+                                     style_digest: Optional[str] = None,
+                                     parallel_sections: bool = False) -> Tuple[str, Dict]:
+        """Асинхронно генерирует полный текст статьи, не блокируя event loop (on_delta - потоковый режим).
+
+        parallel_sections - разделы H2 из структуры генерируются одновременно и склеиваются.
+        """
+        service = self.get_service_for_model(model)
+        if parallel_sections:
+            try:
+                result = await generate_article_by_sections(
+                    service, topic, thesis, structure, keywords, style_examples, character_count, model,
+                    on_delta=on_delta, style_digest=style_digest
+                )
+                if result:
+                    article, usage_info = result
+                    return await service.adjust_article_length_async(article, character_count, model), usage_info
+            except Exception as e:
+                print(f"Error generating article by sections, falling back to single request: {e}")
+                # Часть разделов могла уже уйти в трансляцию - итоговый текст придет при завершении
+                on_delta = None
+                # Токены завершившихся разделов учитываем вместе с запросом целиком
+                partial_usage = e.usage if isinstance(e, SectionGenerationError) else None
+                article, usage_info = await service.generate_article_async(
+                    topic, thesis, structure, keywords, style_examples, character_count, model,
+                    on_delta=on_delta, style_digest=style_digest
+                )
+                if partial_usage:
+                    usage_info = sum_usage([usage_info, partial_usage])
+                return article, usage_info
+        return await service.generate_article_async(
+            topic, thesis, structure, keywords, style_examples, character_count, model,
+            on_delta=on_delta, style_digest=style_digest
+        )
+    
+    async def generate_style_digest_async(self, style_examples: str, model: str = "gpt-4o-mini") -> Tuple[str, Dict]:
+        """Сжимает примеры стиля в компактное описание, автоматически выбирая провайдера"""
+        service = self.get_service_for_model(model)
+        return await service.generate_style_digest_async(style_examples, model)
+    
     def calculate_cost(self, usage_info: Dict, model: str) -> Decimal:
         """Рассчитывает стоимость использования API"""
         service = self.get_service_for_model(model)
@@ -0,0 +1,154 @@
+import asyncio
+import json
+import logging
+import select
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Set
+from uuid import UUID
+
+import psycopg2
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Канал Postgres NOTIFY для изменений статусов статей
+ARTICLE_EVENTS_CHANNEL = "article_events"
+
+
+def _event_payload(article_id: Optional[UUID], event: str, status: Optional[str],
+                   error_message: Optional[str]) -> str:
+    payload = {
+        "event": event,
+        "article_id": str(article_id) if article_id else None,
+        "status": status,
+        "updated_at": datetime.utcnow().isoformat()
+    }
+    if error_message:
+        # Payload NOTIFY ограничен 8000 байт
+        payload["error_message"] = error_message[:500]
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def publish_article_event(db: Session, article_id: Optional[UUID], event: str, status: Optional[str] = None,
+                          error_message: Optional[str] = None):
+    """Публикует изменение статьи через pg_notify.
+
+    Уведомление доставляется всем процессам, слушающим канал (веб-дино), поэтому
+    событие из отдельного worker.py тоже дойдет до подписчиков. Ошибка публикации
+    не должна ломать генерацию - только пишем в лог.
+    """
+    try:
+        db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": ARTICLE_EVENTS_CHANNEL, "payload": _event_payload(article_id, event, status, error_message)}
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning(f"⚠️ Не удалось опубликовать событие статьи {article_id}: {str(e)}")
+
+
+async def publish_article_event_async(db: AsyncSession, article_id: Optional[UUID], event: str,
+                                      status: Optional[str] = None, error_message: Optional[str] = None):
+    """Публикует изменение статьи через pg_notify из асинхронной сессии API"""
+    try:
+        await db.execute(
+            text("SELECT pg_notify(:channel, :payload)"),
+            {"channel": ARTICLE_EVENTS_CHANNEL, "payload": _event_payload(article_id, event, status, error_message)}
+        )
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        logger.warning(f"⚠️ Не удалось опубликовать событие статьи {article_id}: {str(e)}")
+
+
+class ArticleEventBroker:
+    """Раздает события статей SSE-подписчикам веб-процесса.
+
+    Фоновый поток держит отдельное соединение с LISTEN article_events и
+    передает уведомления в event loop. Неактивные клиенты не создают нагрузки
+    на базу: один LISTEN на процесс вместо опроса списка статей.
+    """
+
+    def __init__(self):
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def start(self):
+        """Запускает поток LISTEN (вызывается из работающего event loop)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, name="article-events-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def register(self) -> asyncio.Queue:
+        """Регистрирует подписчика на события всех статей"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1000)
+        self._subscribers.add(queue)
+        return queue
+
+    def unregister(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def publish_local(self, event: Dict):
+        """Рассылает событие подписчикам этого процесса"""
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Медленный клиент: пропускаем событие, при переподключении он перечитает список
+                logger.warning("⚠️ Очередь SSE-подписчика переполнена, событие пропущено")
+
+    def _listen(self):
+        """Цикл LISTEN в отдельном потоке с переподключением при ошибках"""
+        while not self._stop.is_set():
+            connection = None
+            try:
+                connection = psycopg2.connect(settings.database_url_fixed)
+                connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                cursor = connection.cursor()
+                cursor.execute(f"LISTEN {ARTICLE_EVENTS_CHANNEL};")
+                logger.info(f"👂 Подписались на канал {ARTICLE_EVENTS_CHANNEL}")
+
+                while not self._stop.is_set():
+                    if select.select([connection], [], [], 1.0) == ([], [], []):
+                        continue
+                    connection.poll()
+                    while connection.notifies:
+                        notify = connection.notifies.pop(0)
+                        try:
+                            event = json.loads(notify.payload)
+                        except ValueError:
+                            continue
+                        self._loop.call_soon_threadsafe(self.publish_local, event)
+            except Exception as e:
+                logger.error(f"❌ Ошибка LISTEN {ARTICLE_EVENTS_CHANNEL}: {str(e)}")
+                self._stop.wait(5)
+            finally:
+                if connection is not None:
+                    connection.close()
+
+# Глобальный брокер событий статей
+article_event_broker = ArticleEventBroker()
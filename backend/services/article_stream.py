@@ -0,0 +1,72 @@
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+class ArticleStreamHub:
+    """Раздает частичный текст генерируемых статей подписчикам SSE внутри процесса.
+
+    Генерация публикует фрагменты текста, подписчики получают сначала уже
+    накопленный текст, затем новые фрагменты и финальное событие. Если статья
+    генерируется в другом процессе (worker.py), хаб о ней не знает и endpoint
+    читает частичный текст из базы.
+    """
+
+    def __init__(self):
+        self._buffers: Dict[str, List[str]] = {}
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    def open(self, article_id: str):
+        """Начинает трансляцию статьи"""
+        self._buffers[article_id] = []
+        self._subscribers.setdefault(article_id, set())
+
+    def is_active(self, article_id: str) -> bool:
+        return article_id in self._buffers
+
+    def get_text(self, article_id: str) -> str:
+        return "".join(self._buffers.get(article_id, []))
+
+    def publish_status(self, article_id: str, stage: str):
+        """Сообщает подписчикам о смене этапа генерации"""
+        self._broadcast(article_id, {"event": "status", "stage": stage})
+
+    def publish(self, article_id: str, text: str):
+        """Публикует очередной фрагмент текста"""
+        if article_id not in self._buffers:
+            return
+        self._buffers[article_id].append(text)
+        self._broadcast(article_id, {"event": "delta", "text": text})
+
+    def finish(self, article_id: str, article: Optional[str] = None, error: Optional[str] = None):
+        """Завершает трансляцию финальным текстом или ошибкой"""
+        if error is not None:
+            self._broadcast(article_id, {"event": "error", "message": error})
+        else:
+            self._broadcast(article_id, {"event": "done", "article": article if article is not None else self.get_text(article_id)})
+        self._buffers.pop(article_id, None)
+        self._subscribers.pop(article_id, None)
+
+    async def subscribe(self, article_id: str) -> AsyncIterator[Dict]:
+        """Подписывается на трансляцию: уже накопленный текст, затем новые события до завершения"""
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(article_id, set()).add(queue)
+        try:
+            buffered = self.get_text(article_id)
+            if buffered:
+                yield {"event": "delta", "text": buffered}
+
+            while True:
+                event = await queue.get()
+                yield event
+                if event["event"] in ("done", "error"):
+                    return
+        finally:
+            subscribers = self._subscribers.get(article_id)
+            if subscribers:
+                subscribers.discard(queue)
+
+    def _broadcast(self, article_id: str, event: Dict):
+        for queue in self._subscribers.get(article_id, ()):
+            queue.put_nowait(event)
+
+# Глобальный хаб трансляций
+article_stream_hub = ArticleStreamHub()
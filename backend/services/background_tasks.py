@@ -1,165 +1,585 @@
 import asyncio
 import logging
-from typing import Dict, Any
+import os
+import socket
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Set, Tuple
 from uuid import UUID
 from sqlalchemy.orm import Session
 from datetime import datetime
 
-from database import get_db
-from models import Article, ArticleStatus
+from database import SessionLocal
+from models import ArticleStatus
 import crud
-from services.serp_service import SERPService
+from config import settings
+from services.serp_service import serp_service
 from services.ai_service import AIService
 from services.seo_service import SEOService
+from services.job_queue import ArticleJobQueue
+from services.style_digest import StyleDigestService
+from services.token_budget import token_budget
+from services.pipeline import StagePipeline
+from services.article_stream import article_stream_hub
+from services.article_events import publish_article_event
 
 logger = logging.getLogger(__name__)
 
+class GenerationQueueFullError(Exception):
+    """Очередь генерации заполнена, новая задача не может быть принята"""
+    pass
+
 class BackgroundTaskManager:
     """Менеджер для управления фоновыми задачами генерации статей"""
     
-    def __init__(self):
-        self.serp_service = SERPService()
+    def __init__(self, max_workers: Optional[int] = None, max_queue_size: Optional[int] = None):
+        self.serp_service = serp_service
         self.ai_service = AIService()
         self.seo_service = SEOService()
+        self.style_digest_service = StyleDigestService(self.ai_service)
         self.running_tasks: Dict[str, asyncio.Task] = {}
+        
+        # Пул воркеров с ограниченной очередью
+        self.max_workers = max_workers or settings.GENERATION_WORKERS
+        self.max_queue_size = max_queue_size or settings.GENERATION_QUEUE_SIZE
+        self.queue: Optional[asyncio.Queue] = None
+        self.workers: list = []
+        self.queued_ids: Set[str] = set()
+        self.cancelled_ids: Set[str] = set()
+        self.active_workers = 0
+        self._stopping = False
+        
+        # Долговременная очередь в Postgres: статьи захватываются с арендой
+        self.queue_backend = settings.GENERATION_QUEUE_BACKEND
+        self.job_queue = ArticleJobQueue()
+        self.worker_id = f"{os.getenv('DYNO') or socket.gethostname()}:{os.getpid()}"
+        self.leased_ids: Set[str] = set()
+        self.service_tasks: list = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.total_requeued = 0
+        
+        # Счетчики для подбора размера пула
+        self.total_enqueued = 0
+        self.total_rejected = 0
+        self.total_completed = 0
+        self.total_failed = 0
+        self.recent_wait_times = deque(maxlen=100)
+        self.recent_durations = deque(maxlen=100)
+        self.recent_pipeline_timings = deque(maxlen=100)
+    
+    @property
+    def is_running(self) -> bool:
+        return bool(self.workers)
+    
+    @property
+    def is_durable(self) -> bool:
+        return self.queue_backend == "postgres"
+    
+    async def start(self):
+        """Запускает пул воркеров генерации"""
+        if self.is_running:
+            return
+        
+        # Очередь создаем здесь, чтобы она была привязана к работающему event loop
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self.workers = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.max_workers)
+        ]
+        
+        if self.is_durable:
+            self.service_tasks = [
+                asyncio.create_task(self._claim_loop()),
+                asyncio.create_task(self._heartbeat_loop())
+            ]
+        
+        logger.info(
+            f"🧵 Запущен пул генерации ({self.queue_backend}, {self.worker_id}): "
+            f"воркеров {self.max_workers}, глубина очереди {self.max_queue_size}"
+        )
+    
+    async def stop(self):
+        """Останавливает пул воркеров и отменяет текущие генерации"""
+        if not self.is_running:
+            return
+        
+        self._stopping = True
+        for task in self.service_tasks + self.workers:
+            task.cancel()
+        await asyncio.gather(*self.service_tasks, *self.workers, return_exceptions=True)
+        self.service_tasks = []
+        self.workers = []
+        
+        # Сразу возвращаем незавершенные статьи в очередь, не дожидаясь истечения аренды
+        if self.is_durable and self.leased_ids:
+            article_ids = [UUID(task_id) for task_id in self.leased_ids]
+            released = await asyncio.to_thread(self._with_session, self.job_queue.release, article_ids, self.worker_id)
+            self.leased_ids.clear()
+            logger.info(f"↩️ Возвращено в очередь статей: {released}")
+        
+        logger.info("🛑 Пул генерации остановлен")
+    
+    def _with_session(self, func, *args):
+        """Выполняет операцию очереди в отдельной короткой сессии"""
+        db = SessionLocal()
+        try:
+            return func(db, *args)
+        finally:
+            db.close()
+    
+    async def _claim_loop(self):
+        """Забирает статьи из Postgres-очереди, пока есть свободные воркеры"""
+        last_requeue = 0.0
+        while True:
+            # Сбрасываем сигнал до захвата, чтобы не потерять пробуждение во время опроса базы
+            self._wakeup.clear()
+            try:
+                # Периодически возвращаем в очередь статьи упавших воркеров
+                if time.monotonic() - last_requeue >= self.job_queue.lease_seconds / 2:
+                    requeued, failed = await asyncio.to_thread(self._with_session, self.job_queue.requeue_expired)
+                    last_requeue = time.monotonic()
+                    if requeued or failed:
+                        self.total_requeued += requeued
+                        logger.warning(f"⏰ Истекла аренда: возвращено в очередь {requeued}, помечено failed {failed}")
+                
+                claimed = 0
+                free_slots = self.max_workers - self.active_workers - self.queue.qsize()
+                while free_slots > 0:
+                    job = await asyncio.to_thread(self._with_session, self.job_queue.claim, self.worker_id)
+                    if not job:
+                        break
+                    
+                    article_id, params = job
+                    self.leased_ids.add(str(article_id))
+                    self.queued_ids.add(str(article_id))
+                    self.queue.put_nowait((article_id, params, time.monotonic()))
+                    self.total_enqueued += 1
+                    free_slots -= 1
+                    claimed += 1
+                
+                if claimed:
+                    logger.info(f"📥 Захвачено статей из очереди: {claimed}")
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка при захвате задач из очереди: {str(e)}")
+            
+            # Ждем новую задачу, освобождения воркера или следующего опроса
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.GENERATION_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _heartbeat_loop(self):
+        """Продлевает аренду статей, которые генерирует этот процесс"""
+        while True:
+            await asyncio.sleep(settings.GENERATION_HEARTBEAT_SECONDS)
+            if not self.leased_ids:
+                continue
+            try:
+                article_ids = [UUID(task_id) for task_id in self.leased_ids]
+                await asyncio.to_thread(self._with_session, self.job_queue.heartbeat, article_ids, self.worker_id)
+            except Exception as e:
+                logger.error(f"❌ Ошибка продления аренды: {str(e)}")
+    
+    def is_full(self, pending_count: Optional[int] = None) -> bool:
+        """Проверяет, заполнена ли очередь генерации"""
+        return not self.has_capacity(1, pending_count)
+    
+    def has_capacity(self, count: int, pending_count: Optional[int] = None) -> bool:
+        """Проверяет, поместится ли в очередь еще count статей"""
+        if self.is_durable:
+            # Очередь общая для всех дино - pending_count статей в статусе pending считает вызывающий
+            return pending_count is None or pending_count + count <= self.max_queue_size
+        queued = self.queue.qsize() if self.queue is not None else 0
+        return queued + count <= self.max_queue_size
     
     async def start_article_generation(self, article_id: UUID, generation_params: Dict[str, Any]):
-        """Запускает фоновую задачу генерации статьи"""
+        """Ставит генерацию статьи в очередь пула воркеров"""
         task_id = str(article_id)
         
         # Проверяем, не запущена ли уже задача для этой статьи
-        if task_id in self.running_tasks and not self.running_tasks[task_id].done():
+        if task_id in self.queued_ids or (task_id in self.running_tasks and not self.running_tasks[task_id].done()):
             logger.warning(f"Задача генерации для статьи {article_id} уже запущена")
             return
         
-        # Создаем и запускаем задачу
-        task = asyncio.create_task(self._generate_article_async(article_id, generation_params))
-        self.running_tasks[task_id] = task
+        if not self.is_running:
+            await self.start()
         
-        logger.info(f"Запущена фоновая задача генерации для статьи {article_id}")
-        return task
+        if self.is_durable:
+            # Статья уже сохранена в статусе pending - будим цикл захвата задач
+            self._wakeup.set()
+            return
+        
+        try:
+            self.queue.put_nowait((article_id, generation_params, time.monotonic()))
+        except asyncio.QueueFull:
+            self.total_rejected += 1
+            logger.warning(f"⛔ Очередь генерации заполнена ({self.max_queue_size}), статья {article_id} отклонена")
+            raise GenerationQueueFullError(f"Очередь генерации заполнена ({self.max_queue_size} задач)")
+        
+        self.queued_ids.add(task_id)
+        self.total_enqueued += 1
+        logger.info(f"Статья {article_id} поставлена в очередь генерации (в очереди: {self.queue.qsize()})")
+    
+    async def start_batch_generation(self, jobs: List[Tuple[UUID, Dict[str, Any]]]) -> List[UUID]:
+        """Ставит в очередь пакет статей; возвращает ID статей, не поместившихся в очередь"""
+        if not self.is_running:
+            await self.start()
+        
+        if self.is_durable:
+            # Все статьи уже сохранены в статусе pending - достаточно одного пробуждения
+            self._wakeup.set()
+            return []
+        
+        rejected = []
+        for article_id, generation_params in jobs:
+            try:
+                await self.start_article_generation(article_id, generation_params)
+            except GenerationQueueFullError:
+                rejected.append(article_id)
+        return rejected
+    
+    async def _worker(self, worker_id: int):
+        """Воркер пула: берет задачи из очереди и выполняет генерацию"""
+        while True:
+            article_id, params, enqueued_at = await self.queue.get()
+            task_id = str(article_id)
+            self.queued_ids.discard(task_id)
+            
+            try:
+                if task_id in self.cancelled_ids:
+                    self.cancelled_ids.discard(task_id)
+                    logger.info(f"Задача для статьи {article_id} отменена до начала генерации")
+                    continue
+                
+                self.recent_wait_times.append(time.monotonic() - enqueued_at)
+                self.active_workers += 1
+                started_at = time.monotonic()
+                
+                task = asyncio.create_task(self._generate_article_async(article_id, params))
+                self.running_tasks[task_id] = task
+                logger.info(f"Воркер {worker_id} начал генерацию статьи {article_id}")
+                
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    # Останавливается весь пул - пробрасываем отмену дальше
+                    if self._stopping:
+                        raise
+                    logger.info(f"Генерация статьи {article_id} отменена")
+                finally:
+                    self.active_workers -= 1
+                    self.recent_durations.append(time.monotonic() - started_at)
+            finally:
+                if not self._stopping:
+                    self.leased_ids.discard(task_id)
+                if self._wakeup:
+                    self._wakeup.set()
+                self.queue.task_done()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Возвращает метрики пула генерации для подбора размера дино"""
+        wait_times = list(self.recent_wait_times)
+        durations = list(self.recent_durations)
+        return {
+            "workers": self.max_workers if self.is_running else 0,
+            "active_workers": self.active_workers,
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "max_queue_size": self.max_queue_size,
+            "avg_wait_seconds": round(sum(wait_times) / len(wait_times), 3) if wait_times else 0.0,
+            "max_wait_seconds": round(max(wait_times), 3) if wait_times else 0.0,
+            "avg_generation_seconds": round(sum(durations) / len(durations), 3) if durations else 0.0,
+            "total_enqueued": self.total_enqueued,
+            "total_rejected": self.total_rejected,
+            "total_completed": self.total_completed,
+            "total_failed": self.total_failed,
+            "queue_backend": self.queue_backend,
+            "worker_id": self.worker_id,
+            "leased": len(self.leased_ids),
+            "total_requeued": self.total_requeued,
+            "style_digest": self.style_digest_service.get_stats(),
+            "pipeline": self._pipeline_stats()
+        }
+    
+    def _pipeline_stats(self) -> Dict[str, Any]:
+        """Средняя длительность этапов и как часто этап попадал на критический путь (последние генерации)"""
+        durations: Dict[str, list] = {}
+        critical_counts: Dict[str, int] = {}
+        for timings in self.recent_pipeline_timings:
+            for name, stage in timings.get("stages", {}).items():
+                if "duration_ms" in stage:
+                    durations.setdefault(name, []).append(stage["duration_ms"])
+            for name in timings.get("critical_path", []):
+                critical_counts[name] = critical_counts.get(name, 0) + 1
+        return {
+            "samples": len(self.recent_pipeline_timings),
+            "avg_stage_ms": {name: int(sum(values) / len(values)) for name, values in durations.items()},
+            "critical_path_counts": critical_counts
+        }
+    
+    def estimate_wait_seconds(self) -> Optional[int]:
+        """Оценивает время до завершения новой задачи по средней длительности генерации"""
+        if not self.recent_durations:
+            return None
+        
+        avg_duration = sum(self.recent_durations) / len(self.recent_durations)
+        queue_depth = self.queue.qsize() if self.queue else 0
+        # Задачи из очереди разбираются параллельно всеми воркерами
+        rounds = queue_depth // max(self.max_workers, 1) + 1
+        return int(avg_duration * rounds)
     
     async def _generate_article_async(self, article_id: UUID, params: Dict[str, Any]):
-        """Асинхронная генерация статьи"""
-        db = next(get_db())
+        """Асинхронная генерация статьи.
+
+        Этапы описаны графом зависимостей (StagePipeline): перевод в generating,
+        калибровка бюджета токенов, SERP и описание стиля идут одновременно,
+        статья ждет только то, что ей действительно нужно. Времена этапов
+        сохраняются в pipeline_timings. Соединение с базой не держится всю
+        генерацию: каждая запись открывает короткую сессию.
+        """
+        task_id = str(article_id)
+        article_stream_hub.open(task_id)
+        pipeline = StagePipeline()
+        results = pipeline.results
         
-        try:
+        async def start_generation():
             # Обновляем статус на "generating"
-            await self._update_article_status(db, article_id, ArticleStatus.GENERATING)
-            
-            logger.info(f"🚀 Начинаем асинхронную генерацию статьи {article_id}")
-            
-            # 1. Анализ SERP
+            await self._update_article_status(article_id, ArticleStatus.GENERATING)
+        
+        async def calibrate_token_budget():
+            # Калибровка знаков на токен (раз в TOKEN_BUDGET_REFRESH_SECONDS) для расчета max_tokens статьи
+            if token_budget.needs_refresh():
+                try:
+                    await asyncio.to_thread(self._with_session, token_budget.refresh)
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось откалибровать бюджет токенов: {str(e)}")
+        
+        async def analyze_serp():
             logger.info("🔎 Этап 1: Анализ SERP...")
-            serp_data = self.serp_service.analyze_topic(params['topic'])
-            keywords = serp_data["keywords"]
-            questions = serp_data["questions"]
-            logger.info(f"✅ SERP анализ завершен. Ключевых слов: {len(keywords)}, вопросов: {len(questions)}")
-            
-            # 2. Генерация структуры статьи
+            article_stream_hub.publish_status(task_id, "serp")
+            serp_data = await self.serp_service.analyze_topic(params['topic'])
+            logger.info(f"✅ SERP анализ завершен. Ключевых слов: {len(serp_data['keywords'])}, вопросов: {len(serp_data['questions'])}")
+            return serp_data
+        
+        async def prepare_style_digest():
+            # Описание стиля (обычно уже в кеше) готовится параллельно с SERP и структурой
+            return await self.style_digest_service.get_digest(params.get('style_examples', ''), params['model'])
+        
+        async def generate_structure():
             logger.info("📋 Этап 2: Генерация структуры статьи...")
-            structure, structure_usage = self.ai_service.generate_structure(
+            article_stream_hub.publish_status(task_id, "structure")
+            structure, structure_usage = await self.ai_service.generate_structure_async(
                 params['topic'], 
                 params['thesis'], 
-                keywords, 
-                questions, 
+                results["serp"]["keywords"], 
+                results["serp"]["questions"], 
                 params['model']
             )
             logger.info(f"✅ Структура сгенерирована. Токенов использовано: {structure_usage.get('total_tokens', 0)}")
-            
-            # 3. Генерация полной статьи
+            return structure, structure_usage
+        
+        async def generate_article():
             logger.info("📝 Этап 3: Генерация полной статьи...")
-            article_text, article_usage = self.ai_service.generate_article(
+            article_stream_hub.publish_status(task_id, "article")
+            article_text, article_usage = await self.ai_service.generate_article_async(
                 params['topic'],
                 params['thesis'],
-                structure,
-                keywords,
+                results["structure"][0],
+                results["serp"]["keywords"],
                 params.get('style_examples', ''),
                 params.get('character_count', 5000),
-                params['model']
+                params['model'],
+                on_delta=self._make_stream_callback(article_id),
+                style_digest=results["style_digest"][0],
+                parallel_sections=params.get('parallel_sections', False)
             )
             logger.info(f"✅ Статья сгенерирована. Длина: {len(article_text)} символов")
-            
-            # 4. Расчет SEO-оценки
+            return article_text, article_usage
+        
+        async def calculate_seo():
             logger.info("📈 Этап 4: Расчет SEO-оценки...")
-            seo_score = self.seo_service.calculate_seo_score(article_text, keywords)
+            article_stream_hub.publish_status(task_id, "seo")
+            seo_score = self.seo_service.calculate_seo_score(results["article"][0], results["serp"]["keywords"])
             logger.info(f"✅ SEO-оценка рассчитана: {seo_score}")
-            
-            # 5. Обновление статьи в базе данных
-            logger.info("💾 Этап 5: Сохранение результатов...")
-            article_data = {
-                'keywords': keywords,
-                'structure': structure,
-                'article': article_text,
-                'seo_score': seo_score,
-                'status': ArticleStatus.COMPLETED,
-                'error_message': None,
-                'updated_at': datetime.utcnow()
-            }
-            
-            await self._update_article_data(db, article_id, article_data)
-            
-            # 6. Сохранение информации об использовании
-            logger.info("💰 Этап 6: Сохранение статистики использования...")
+            return seo_score
+        
+        async def save_usage():
+            logger.info("💰 Сохранение статистики использования...")
+            structure_usage = results["structure"][1]
+            article_usage = results["article"][1]
             total_usage = {
                 "prompt_tokens": structure_usage["prompt_tokens"] + article_usage["prompt_tokens"],
                 "completion_tokens": structure_usage["completion_tokens"] + article_usage["completion_tokens"],
-                "total_tokens": structure_usage["total_tokens"] + article_usage["total_tokens"]
+                "total_tokens": structure_usage["total_tokens"] + article_usage["total_tokens"],
+                "cached_tokens": structure_usage.get("cached_tokens", 0) + article_usage.get("cached_tokens", 0),
+                "cache_write_tokens": structure_usage.get("cache_write_tokens", 0) + article_usage.get("cache_write_tokens", 0)
             }
             
             cost = self.ai_service.calculate_cost(total_usage, params['model'])
             
+            # Описание стиля составлено для этой статьи - его токены тоже на ее счету (по цене модели описания)
+            digest_usage = results["style_digest"][1]
+            if digest_usage:
+                for key in total_usage:
+                    total_usage[key] += digest_usage.get(key, 0)
+                cost += self.ai_service.calculate_cost(digest_usage, digest_usage["model"])
+            
             usage_data = {
                 "article_id": article_id,
                 "model": params['model'],
                 "prompt_tokens": total_usage["prompt_tokens"],
                 "completion_tokens": total_usage["completion_tokens"],
                 "total_tokens": total_usage["total_tokens"],
+                "cached_tokens": total_usage["cached_tokens"],
+                "article_completion_tokens": article_usage["completion_tokens"],
                 "cost_usd": cost
             }
             
-            crud.create_openai_usage(db, usage_data)
+            await asyncio.to_thread(self._with_session, crud.create_openai_usage, usage_data)
+        
+        async def save_article():
+            logger.info("💾 Этап 5: Сохранение результатов...")
+            article_text = results["article"][0]
+            article_data = {
+                'keywords': results["serp"]["keywords"],
+                'structure': results["structure"][0],
+                'article': article_text,
+                'seo_score': results["seo"],
+                'status': ArticleStatus.COMPLETED,
+                'error_message': None,
+                'locked_by': None,
+                'lease_expires_at': None,
+                'updated_at': datetime.utcnow()
+            }
+            
+            saved = await self._update_article_data(article_id, article_data)
+            article_stream_hub.finish(task_id, article=article_text)
+            return saved
+        
+        pipeline.add("start", start_generation)
+        pipeline.add("token_budget", calibrate_token_budget)
+        pipeline.add("serp", analyze_serp)
+        pipeline.add("style_digest", prepare_style_digest)
+        pipeline.add("structure", generate_structure, depends_on=["serp"])
+        pipeline.add("article", generate_article, depends_on=["start", "token_budget", "structure", "style_digest"])
+        pipeline.add("seo", calculate_seo, depends_on=["article"])
+        pipeline.add("usage", save_usage, depends_on=["article"])
+        pipeline.add("save", save_article, depends_on=["seo", "usage"])
+        
+        try:
+            logger.info(f"🚀 Начинаем асинхронную генерацию статьи {article_id}")
+            await pipeline.run()
             
-            logger.info(f"🎉 Статья {article_id} успешно сгенерирована асинхронно!")
+            # Времена пишем после завершения графа, чтобы в них был и сам этап save
+            timings = pipeline.timings()
+            if results["save"]:
+                await self._save_pipeline_timings(article_id, timings)
+            self.total_completed += 1
+            self.recent_pipeline_timings.append(timings)
+            logger.info(f"🎉 Статья {article_id} успешно сгенерирована асинхронно! Критический путь: {' → '.join(pipeline.critical_path())}")
             
         except Exception as e:
+            self.total_failed += 1
             logger.error(f"❌ Ошибка при генерации статьи {article_id}: {str(e)}")
             
+            if "start" not in pipeline.results:
+                # Ошибка случилась до перевода в generating: завершаем переход, чтобы статья не осталась в pending
+                await self._update_article_status(article_id, ArticleStatus.GENERATING)
+            
             # Обновляем статус на "failed" и сохраняем ошибку
             error_data = {
                 'status': ArticleStatus.FAILED,
                 'error_message': str(e),
+                'locked_by': None,
+                'lease_expires_at': None,
+                'pipeline_timings': pipeline.timings(),
                 'updated_at': datetime.utcnow()
             }
-            await self._update_article_data(db, article_id, error_data)
+            await self._update_article_data(article_id, error_data)
+            article_stream_hub.finish(task_id, error=str(e))
             
         finally:
+            # Трансляция могла остаться открытой при отмене задачи
+            if article_stream_hub.is_active(task_id):
+                article_stream_hub.finish(task_id, error="Генерация отменена")
+            
             # Удаляем задачу из списка активных
-            task_id = str(article_id)
             if task_id in self.running_tasks:
                 del self.running_tasks[task_id]
+    
+    def _make_stream_callback(self, article_id: UUID):
+        """Создает callback для потоковой генерации: раздает фрагменты подписчикам и периодически пишет текст в базу"""
+        task_id = str(article_id)
+        last_flush = time.monotonic()
+        
+        async def on_delta(text: str):
+            nonlocal last_flush
+            article_stream_hub.publish(task_id, text)
             
-            db.close()
+            # Частичный текст нужен SSE-клиентам других процессов (веб при отдельном worker.py)
+            if time.monotonic() - last_flush >= settings.STREAM_FLUSH_SECONDS:
+                last_flush = time.monotonic()
+                partial = article_stream_hub.get_text(task_id)
+                try:
+                    await asyncio.to_thread(
+                        self._with_session, crud.update_article_content, article_id, {"article": partial},
+                        ArticleStatus.GENERATING, self._lease_owner, False
+                    )
+                except Exception as e:
+                    logger.warning(f"⚠️ Не удалось сохранить частичный текст статьи {article_id}: {str(e)}")
+        
+        return on_delta
+    
+    async def _update_article_status(self, article_id: UUID, status: ArticleStatus):
+        """Обновляет статус статьи в короткой сессии"""
+        await asyncio.to_thread(self._with_session, self._write_article_status, article_id, status)
+    
+    async def _update_article_data(self, article_id: UUID, data: Dict[str, Any]) -> bool:
+        """Обновляет данные статьи в короткой сессии; False, если статья уже не наша"""
+        return await asyncio.to_thread(self._with_session, self._write_article_data, article_id, data)
+    
+    async def _save_pipeline_timings(self, article_id: UUID, timings: Dict[str, Any]):
+        """Дописывает времена этапов в готовую статью (без сдвига updated_at - это не изменение статьи)"""
+        try:
+            await asyncio.to_thread(
+                self._with_session, crud.update_article_content, article_id, {"pipeline_timings": timings},
+                ArticleStatus.COMPLETED, None, False
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить времена этапов статьи {article_id}: {str(e)}")
+    
+    @property
+    def _lease_owner(self) -> Optional[str]:
+        """Владелец аренды для записей в статью: в Postgres-очереди пишет только захвативший ее воркер"""
+        return self.worker_id if self.is_durable else None
     
-    async def _update_article_status(self, db: Session, article_id: UUID, status: ArticleStatus):
-        """Обновляет статус статьи"""
-        article = db.query(Article).filter(Article.id == article_id).first()
-        if article:
-            article.status = status
-            article.updated_at = datetime.utcnow()
-            db.commit()
-    
-    async def _update_article_data(self, db: Session, article_id: UUID, data: Dict[str, Any]):
-        """Обновляет данные статьи"""
-        article = db.query(Article).filter(Article.id == article_id).first()
-        if article:
-            for key, value in data.items():
-                setattr(article, key, value)
-            db.commit()
+    def _write_article_status(self, db: Session, article_id: UUID, status: ArticleStatus):
+        # Генерацию начинаем только для статьи в очереди (или уже захваченной этим воркером)
+        if crud.update_article_status(db, article_id, status, expected_status=(ArticleStatus.PENDING, ArticleStatus.GENERATING),
+                                      locked_by=self._lease_owner):
+            publish_article_event(db, article_id, "status", status.value)
+    
+    def _write_article_data(self, db: Session, article_id: UUID, data: Dict[str, Any]):
+        # Результат записываем, только пока статья генерируется и аренда у этого воркера: удаленную,
+        # очищенную или переданную другому воркеру после истечения аренды статью не затираем
+        if not crud.update_article_content(db, article_id, data, expected_status=ArticleStatus.GENERATING,
+                                           locked_by=self._lease_owner):
+            logger.warning(f"⚠️ Статья {article_id} больше не генерируется этим воркером, результат не сохранен")
+            return False
+        if 'status' in data:
+            publish_article_event(db, article_id, "status", data['status'].value, data.get('error_message'))
+        return True
     
     def get_task_status(self, article_id: UUID) -> str:
         """Получает статус задачи генерации"""
         task_id = str(article_id)
+        if task_id in self.queued_ids:
+            return "queued"
+        
         if task_id not in self.running_tasks:
             return "not_found"
         
@@ -173,6 +593,11 @@ class BackgroundTaskManager:
     def cancel_task(self, article_id: UUID) -> bool:
         """Отменяет задачу генерации"""
         task_id = str(article_id)
+        if task_id in self.queued_ids:
+            # Задача еще в очереди - воркер пропустит ее
+            self.cancelled_ids.add(task_id)
+            return True
+        
         if task_id in self.running_tasks:
             task = self.running_tasks[task_id]
             if not task.done():
@@ -181,4 +606,4 @@ class BackgroundTaskManager:
         return False
 
 # Глобальный экземпляр менеджера задач
-background_task_manager = BackgroundTaskManager() 
\ No newline at end of file
+background_task_manager = BackgroundTaskManager() 
@@ -0,0 +1,157 @@
+from typing import Dict, Any, List, Optional, Tuple
+from uuid import UUID
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from models import Article, ArticleStatus
+from services.article_events import publish_article_event
+
+class ArticleJobQueue:
+    """Долговременная очередь генерации поверх таблицы articles.
+
+    Задачей является статья в статусе pending. Воркер забирает ее через
+    SELECT ... FOR UPDATE SKIP LOCKED, переводит в generating и держит аренду,
+    продлевая ее heartbeat'ом. Статьи с истекшей арендой (упавший или
+    перезапущенный дино) возвращаются в pending и достаются другим воркерам.
+    """
+
+    def __init__(self, lease_seconds: Optional[int] = None, max_attempts: Optional[int] = None):
+        self.lease_seconds = lease_seconds or settings.GENERATION_LEASE_SECONDS
+        self.max_attempts = max_attempts or settings.GENERATION_MAX_ATTEMPTS
+
+    def _lease_deadline(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_seconds)
+
+    def claim(self, db: Session, worker_id: str) -> Optional[Tuple[UUID, Dict[str, Any]]]:
+        """Захватывает самую старую статью в статусе pending и возвращает параметры генерации"""
+        article = (
+            db.query(Article)
+            .filter(Article.status == ArticleStatus.PENDING)
+            .order_by(Article.created_at)
+            .with_for_update(skip_locked=True)
+            .limit(1)
+            .first()
+        )
+        if not article:
+            db.rollback()
+            return None
+
+        # Параметры собираем до commit, пока атрибуты не сброшены
+        article_id = article.id
+        params = {
+            "topic": article.topic,
+            "thesis": article.thesis,
+            "style_examples": article.style_text,
+            "character_count": article.character_count or 5000,
+            "parallel_sections": bool(article.parallel_sections),
+            "model": article.model_used
+        }
+
+        article.status = ArticleStatus.GENERATING
+        article.locked_by = worker_id
+        article.lease_expires_at = self._lease_deadline()
+        article.attempts = (article.attempts or 0) + 1
+        article.updated_at = datetime.utcnow()
+        db.commit()
+        publish_article_event(db, article_id, "status", ArticleStatus.GENERATING.value)
+
+        return article_id, params
+
+    def heartbeat(self, db: Session, article_ids: List[UUID], worker_id: str) -> int:
+        """Продлевает аренду статей, которые генерирует воркер"""
+        if not article_ids:
+            return 0
+
+        updated = (
+            db.query(Article)
+            .filter(
+                Article.id.in_(article_ids),
+                Article.locked_by == worker_id,
+                Article.status == ArticleStatus.GENERATING
+            )
+            .update({
+                Article.lease_expires_at: self._lease_deadline(),
+                # Продление аренды - не изменение статьи: явное старое значение отключает onupdate
+                Article.updated_at: Article.updated_at
+            }, synchronize_session=False)
+        )
+        db.commit()
+        return updated
+
+    def release(self, db: Session, article_ids: List[UUID], worker_id: str) -> int:
+        """Возвращает незавершенные статьи в очередь (штатная остановка воркера)"""
+        if not article_ids:
+            return 0
+
+        updated = (
+            db.query(Article)
+            .filter(
+                Article.id.in_(article_ids),
+                Article.locked_by == worker_id,
+                Article.status == ArticleStatus.GENERATING
+            )
+            .update({
+                Article.status: ArticleStatus.PENDING,
+                Article.locked_by: None,
+                Article.lease_expires_at: None,
+                # Штатная остановка не считается неудачной попыткой
+                Article.attempts: Article.attempts - 1,
+                Article.updated_at: datetime.utcnow()
+            }, synchronize_session=False)
+        )
+        db.commit()
+        for article_id in article_ids:
+            publish_article_event(db, article_id, "status", ArticleStatus.PENDING.value)
+        return updated
+
+    def requeue_expired(self, db: Session) -> Tuple[int, int]:
+        """Возвращает в pending статьи с истекшей арендой; исчерпавшие попытки помечает failed"""
+        now = datetime.utcnow()
+        # Блокируем просроченные строки, чтобы параллельные воркеры не обработали их дважды
+        expired = (
+            db.query(Article.id, Article.attempts)
+            .filter(
+                Article.status == ArticleStatus.GENERATING,
+                Article.lease_expires_at.isnot(None),
+                Article.lease_expires_at < now
+            )
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+        if not expired:
+            db.rollback()
+            return 0, 0
+
+        failed_ids = [article_id for article_id, attempts in expired if attempts >= self.max_attempts]
+        requeued_ids = [article_id for article_id, attempts in expired if attempts < self.max_attempts]
+        error_message = f"Генерация прервана {self.max_attempts} раз(а): воркер не продлил аренду"
+
+        if failed_ids:
+            db.query(Article).filter(Article.id.in_(failed_ids)).update({
+                Article.status: ArticleStatus.FAILED,
+                Article.error_message: error_message,
+                Article.locked_by: None,
+                Article.lease_expires_at: None,
+                Article.updated_at: now
+            }, synchronize_session=False)
+        if requeued_ids:
+            db.query(Article).filter(Article.id.in_(requeued_ids)).update({
+                Article.status: ArticleStatus.PENDING,
+                Article.locked_by: None,
+                Article.lease_expires_at: None,
+                Article.updated_at: now
+            }, synchronize_session=False)
+        db.commit()
+
+        for article_id in failed_ids:
+            publish_article_event(db, article_id, "status", ArticleStatus.FAILED.value, error_message)
+        for article_id in requeued_ids:
+            publish_article_event(db, article_id, "status", ArticleStatus.PENDING.value)
+        return len(requeued_ids), len(failed_ids)
+
+    def pending_count(self, db: Session) -> int:
+        """Количество статей, ожидающих генерации"""
+        return db.query(Article).filter(Article.status == ArticleStatus.PENDING).count()
@@ -0,0 +1,178 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# Граница предложений: знак конца предложения, пробелы и начало следующего
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?…])["»)]*\s+(?=\S)')
+LIST_ITEM = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s+')
+
+
+class LengthControlStats:
+    """Счетчики путей коррекции длины статьи (в пределах процесса)"""
+
+    def __init__(self):
+        self.within_tolerance = 0
+        self.trimmed_locally = 0
+        self.accepted_short = 0
+        self.llm_expand = 0
+        self.llm_shorten = 0
+        self.chars_trimmed = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "within_tolerance": self.within_tolerance,
+            "trimmed_locally": self.trimmed_locally,
+            "accepted_short": self.accepted_short,
+            "llm_expand": self.llm_expand,
+            "llm_shorten": self.llm_shorten,
+            "chars_trimmed": self.chars_trimmed
+        }
+
+# Глобальные счетчики коррекции длины
+length_control_stats = LengthControlStats()
+
+
+def plan_length_adjustment(article: str, target_length: int) -> Tuple[Optional[str], str]:
+    """Подгоняет длину статьи локально, если это возможно.
+
+    Возвращает (действие, текст): действие None - текст готов, "expand" или
+    "shorten" - нужен дополнительный запрос к LLM. Длинная статья сокращается
+    удалением целых предложений и пунктов списков без обращения к модели;
+    небольшой недобор принимается как есть - дописывать через LLM имеет смысл
+    только при большом недоборе.
+    """
+    tolerance = settings.LENGTH_TOLERANCE
+    current_length = len(article)
+
+    if target_length - tolerance <= current_length <= target_length + tolerance:
+        length_control_stats.within_tolerance += 1
+        return None, article
+
+    if current_length < target_length - tolerance:
+        if target_length - current_length < target_length * settings.LENGTH_EXPAND_MIN_SHORTFALL:
+            length_control_stats.accepted_short += 1
+            logger.info(f"📏 Статья короче нужного ({current_length} из {target_length}), недобор небольшой - оставляем")
+            return None, article
+        length_control_stats.llm_expand += 1
+        logger.info(f"📏 Статья слишком короткая ({current_length} из {target_length}), дописываем через LLM")
+        return "expand", article
+
+    trimmed = trim_to_length(article, target_length, tolerance)
+    if trimmed is not None:
+        length_control_stats.trimmed_locally += 1
+        length_control_stats.chars_trimmed += current_length - len(trimmed)
+        logger.info(f"✂️ Статья сокращена локально: {current_length} → {len(trimmed)} знаков")
+        return None, trimmed
+
+    length_control_stats.llm_shorten += 1
+    logger.info(f"📏 Локально сократить не удалось ({current_length} из {target_length}), сокращаем через LLM")
+    return "shorten", article
+
+
+def trim_to_length(article: str, target_length: int, tolerance: int = 200) -> Optional[str]:
+    """Сокращает markdown-статью до target_length ± tolerance удалением предложений и пунктов списков.
+
+    Заголовок, лид (все до первого H2), последний раздел (вывод и призыв к
+    действию), заголовки, цитаты и предложения с **выводами** не трогаются.
+    Сокращается в первую очередь самый длинный из остальных разделов.
+    Возвращает None, если уложиться в допуск так не получается.
+    """
+    upper = target_length + tolerance
+    lower = target_length - tolerance
+    sections = _parse_sections(article)
+    length = len(_render(sections))
+
+    while length > upper:
+        units = _removable_units(sections)
+        if not units:
+            return None
+
+        excess = length - upper
+        # Если одно удаление сразу попадает в допуск - берем самое маленькое такое
+        fitting = [unit for unit in units if excess <= unit[1] <= length - lower]
+        if fitting:
+            unit = min(fitting, key=lambda unit: unit[1])
+        else:
+            allowed = [unit for unit in units if unit[1] <= length - lower]
+            if not allowed:
+                return None
+            # Иначе режем самый длинный раздел, начиная с крупных фрагментов
+            unit = max(allowed, key=lambda unit: (unit[0], unit[1]))
+
+        _remove_unit(sections, unit[2])
+        length = len(_render(sections))
+
+    return _render(sections)
+
+
+def _parse_sections(article: str) -> List[List[str]]:
+    """Делит статью на разделы по заголовкам H2; раздел - список блоков (абзацев, списков, заголовков)"""
+    sections: List[List[str]] = [[]]
+    for raw_block in re.split(r'\n\s*\n', article.strip()):
+        lines = raw_block.split("\n")
+        # Заголовок, написанный вплотную к абзацу, выделяем в отдельный блок
+        blocks = [lines[0], "\n".join(lines[1:])] if lines[0].startswith("#") and len(lines) > 1 else [raw_block]
+        for block in blocks:
+            if not block.strip():
+                continue
+            if block.startswith("## "):
+                sections.append([])
+            sections[-1].append(block)
+    return sections
+
+
+def _render(sections: List[List[str]]) -> str:
+    return "\n\n".join(block for section in sections for block in section)
+
+
+def _removable_units(sections: List[List[str]]) -> List[Tuple[int, int, Tuple[int, int, str]]]:
+    """Фрагменты, которые можно удалить: (длина раздела, размер фрагмента, (раздел, блок, новый текст блока))"""
+    units = []
+    # Первый раздел - заголовок и лид, последний - вывод с призывом к действию
+    for section_index in range(1, len(sections) - 1):
+        section = sections[section_index]
+        section_length = sum(len(block) for block in section)
+        paragraphs = [block for block in section if _is_paragraph(block)]
+
+        for block_index, block in enumerate(section):
+            if block.startswith("#") or block.lstrip().startswith(">"):
+                continue
+
+            lines = block.split("\n")
+            if all(LIST_ITEM.match(line) for line in lines):
+                # Список оставляем хотя бы из двух пунктов; пункты с выводами не удаляем
+                removable = [i for i in range(2, len(lines)) if "**" not in lines[i]]
+                if removable:
+                    i = removable[-1]
+                    units.append((section_length, len(lines[i]) + 1, (section_index, block_index, "\n".join(lines[:i] + lines[i + 1:]))))
+                continue
+
+            boundaries = list(SENTENCE_BOUNDARY.finditer(block))
+            if boundaries:
+                last_sentence = block[boundaries[-1].end():]
+                if "**" not in last_sentence:
+                    kept = block[:boundaries[-1].start()] + block[boundaries[-1].start():boundaries[-1].end()].rstrip()
+                    units.append((section_length, len(block) - len(kept), (section_index, block_index, kept)))
+            elif len(paragraphs) > 1 and "**" not in block:
+                # Абзац из одного предложения удаляем целиком, если в разделе остаются другие
+                units.append((section_length, len(block) + 2, (section_index, block_index, "")))
+    return units
+
+
+def _is_paragraph(block: str) -> bool:
+    return not block.startswith("#") and not block.lstrip().startswith(">") and not LIST_ITEM.match(block)
+
+
+def _remove_unit(sections: List[List[str]], target: Tuple[int, int, str]):
+    section_index, block_index, new_block = target
+    if new_block:
+        sections[section_index][block_index] = new_block
+    else:
+        del sections[section_index][block_index]
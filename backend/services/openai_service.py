@@ -1,10 +1,12 @@
 import openai
-from typing import Dict, List, Tuple
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from decimal import Decimal
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
+from services.length_control import plan_length_adjustment
+from services.token_budget import detect_language, token_budget
 
 class OpenAIService:
     def __init__(self):
@@ -14,6 +16,8 @@ class OpenAIService:
         try:
             openai.api_key = settings.OPENAI_API_KEY
             self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+            # Асинхронный клиент для фоновой генерации без блокировки event loop
+            self.async_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
         except Exception as e:
             print(f"Error initializing OpenAI client: {e}")
             raise
@@ -53,95 +57,389 @@ class OpenAIService:
                           questions: List[str], model: str = "gpt-4o-mini") -> Tuple[str, Dict]:
         """Генерирует структуру статьи"""
         
-        keywords_str = ", ".join(keywords[:10])
-        questions_str = "\n".join(questions[:5])
-        
-        prompt = f"""
-Создай подробную структуру SEO-статьи на тему: "{topic}"
-
-Тезисы автора: {thesis}
-
-Ключевые слова для включения: {keywords_str}
-
-Популярные вопросы пользователей:
-{questions_str}
-
-Требования к структуре:
-1. Используй markdown формат с заголовками H1, H2, H3
-2. Включи введение, основную часть с подразделами и заключение
-3. Обязательно используй предоставленные ключевые слова
-4. Ответь на популярные вопросы пользователей
-5. Структура должна быть логичной и SEO-оптимизированной
-6. Длина статьи должна быть 2000-3000 слов
-
-Верни только структуру в markdown формате, без дополнительных комментариев.
-"""
+        prompt = self._build_structure_prompt(topic, thesis, keywords, questions)
         
         try:
             config = self.get_model_config(model)
             response = self.client.chat.completions.create(
                 model=model,
-                messages=[
-                    {"role": "system", "content": "Ты эксперт по SEO и созданию структур статей. Создавай подробные, логичные структуры статей в markdown формате."},
-                    {"role": "user", "content": prompt}
-                ],
+                messages=self._structure_messages(prompt),
                 max_tokens=config["max_tokens"],
                 temperature=config["temperature"]
             )
             
             structure = response.choices[0].message.content
-            usage_info = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
+            return structure, self._usage_from_response(response)
             
-            return structure, usage_info
+        except Exception as e:
+            print(f"Error generating structure: {e}")
+            # Возвращаем базовую структуру
+            return self._basic_structure(topic), {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    
+    async def generate_structure_async(self, topic: str, thesis: str, keywords: List[str], 
+                                       questions: List[str], model: str = "gpt-4o-mini") -> Tuple[str, Dict]:
+        """Асинхронно генерирует структуру статьи через AsyncOpenAI"""
+        
+        prompt = self._build_structure_prompt(topic, thesis, keywords, questions)
+        
+        try:
+            config = self.get_model_config(model)
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=self._structure_messages(prompt),
+                max_tokens=config["max_tokens"],
+                temperature=config["temperature"]
+            )
+            
+            structure = response.choices[0].message.content
+            return structure, self._usage_from_response(response)
             
         except Exception as e:
             print(f"Error generating structure: {e}")
             # Возвращаем базовую структуру
-            basic_structure = f"""# {topic}
-
-## Введение
-- Что такое {topic}
-- Актуальность темы
-
-## Основная часть
-
-### Основные понятия
-### Преимущества и недостатки
-### Практическое применение
-### Советы и рекомендации
-
-## Заключение
-- Выводы
-- Рекомендации
-"""
-            return basic_structure, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            return self._basic_structure(topic), {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
     
     def generate_article(self, topic: str, thesis: str, structure: str, 
                         keywords: List[str], style_examples: str = "", 
                         character_count: int = 5000, model: str = "gpt-4o-mini") -> Tuple[str, Dict]:
         """Генерирует полный текст статьи по структуре"""
         
+        prompt = self._build_article_prompt(topic, thesis, structure, keywords, style_examples, character_count)
+        
+        try:
+            config = self.get_model_config(model)
+            # Лимит ответа рассчитывается из нужного числа знаков, а не фиксированный
+            article_max_tokens = token_budget.max_tokens_for(model, character_count, detect_language(topic + thesis))
+            
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=self._article_messages(prompt),
+                max_tokens=article_max_tokens,
+                temperature=config["temperature"]
+            )
+            
+            article = response.choices[0].message.content
+            usage_info = self._usage_from_response(response)
+            
+            # Проверяем и корректируем длину статьи
+            article = self.adjust_article_length(article, character_count, model)
+            
+            return article, usage_info
+            
+        except Exception as e:
+            print(f"Error generating article: {e}")
+            # Возвращаем базовую статью
+            return self._basic_article(topic, thesis), {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    
+    async def generate_article_async(self, topic: str, thesis: str, structure: str, 
+                                     keywords: List[str], style_examples: str = "", 
+                                     character_count: int = 5000, model: str = "gpt-4o-mini",
+                                     on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+                                     style_digest: Optional[str] = None) -> Tuple[str, Dict]:
+        """Асинхронно генерирует полный текст статьи через AsyncOpenAI.
+
+        Если передан on_delta, ответ запрашивается потоково (stream=True)
+        и каждый фрагмент текста передается в callback по мере получения.
+        style_digest - сжатое описание стиля, заменяющее в промпте исходные примеры.
+        """
+        
+        prompt = self._build_article_prompt(topic, thesis, structure, keywords, style_examples, character_count, style_digest)
+        
+        try:
+            config = self.get_model_config(model)
+            # Лимит ответа рассчитывается из нужного числа знаков, а не фиксированный
+            article_max_tokens = token_budget.max_tokens_for(model, character_count, detect_language(topic + thesis))
+            
+            if on_delta:
+                article, usage_info = await self._stream_completion(
+                    model, self._article_messages(prompt), article_max_tokens, config["temperature"], on_delta
+                )
+            else:
+                response = await self.async_client.chat.completions.create(
+                    model=model,
+                    messages=self._article_messages(prompt),
+                    max_tokens=article_max_tokens,
+                    temperature=config["temperature"]
+                )
+                
+                article = response.choices[0].message.content
+                usage_info = self._usage_from_response(response)
+            
+            # Проверяем и корректируем длину статьи
+            article = await self.adjust_article_length_async(article, character_count, model)
+            
+            return article, usage_info
+            
+        except Exception as e:
+            print(f"Error generating article: {e}")
+            # Возвращаем базовую статью
+            return self._basic_article(topic, thesis), {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    
+    async def generate_section_async(self, topic: str, thesis: str, structure: str, keywords: List[str],
+                                     style_examples: str, section: str, character_count: int, position: str,
+                                     model: str = "gpt-4o-mini", style_digest: Optional[str] = None) -> Tuple[str, Dict]:
+        """Генерирует один раздел статьи; ошибки не перехватываются - решает вызывающий код"""
+        prompt = self._build_section_prompt(topic, thesis, structure, keywords, style_examples, section,
+                                            character_count, position, style_digest)
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=self._article_messages(prompt),
+            max_tokens=token_budget.max_tokens_for(model, character_count, detect_language(topic + thesis)),
+            temperature=self.get_model_config(model)["temperature"]
+        )
+        return response.choices[0].message.content, self._usage_from_response(response)
+    
+    async def generate_style_digest_async(self, style_examples: str, model: str = "gpt-4o-mini") -> Tuple[str, Dict]:
+        """Сжимает примеры стиля в компактное описание (результат кешируется по хешу текста)"""
+        prompt = self._build_style_digest_prompt(style_examples)
+        response = await self.async_client.chat.completions.create(
+            model=model,
+            messages=self._style_digest_messages(prompt),
+            max_tokens=800,
+            temperature=0.3
+        )
+        return response.choices[0].message.content, self._usage_from_response(response)
+    
+    async def _stream_completion(self, model: str, messages: List[Dict], max_tokens: int, temperature: float,
+                                 on_delta: Callable[[str], Awaitable[None]]) -> Tuple[str, Dict]:
+        """Потоково получает ответ модели, передавая каждый фрагмент в on_delta"""
+        stream = await self.async_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=True,
+            # Без этого OpenAI не присылает usage в потоковом режиме
+            stream_options={"include_usage": True}
+        )
+        
+        parts = []
+        usage_info = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                text = chunk.choices[0].delta.content
+                parts.append(text)
+                await on_delta(text)
+            if chunk.usage:
+                usage_info = self._usage_from_response(chunk)
+        
+        return "".join(parts), usage_info
+    
+    def calculate_cost(self, usage_info: Dict, model: str) -> Decimal:
+        """Рассчитывает стоимость использования OpenAI API"""
+        pricing = settings.OPENAI_PRICING.get(model, settings.OPENAI_PRICING["gpt-4o-mini"])
+        
+        # Кешированные входные токены OpenAI тарифицирует со скидкой 50%
+        cached_tokens = usage_info.get("cached_tokens", 0)
+        input_cost = ((usage_info["prompt_tokens"] - cached_tokens * 0.5) / 1000) * pricing["input"]
+        output_cost = (usage_info["completion_tokens"] / 1000) * pricing["output"]
+        
+        return Decimal(str(input_cost + output_cost)).quantize(Decimal('0.000001'))
+    
+    def adjust_article_length(self, article: str, target_length: int, model: str) -> str:
+        """Корректирует длину статьи: лишнее срезается локально, LLM дописывает только при большом недоборе"""
+        direction, article = plan_length_adjustment(article, target_length)
+        
+        if direction == "expand":
+            # Статья слишком короткая, нужно расширить
+            return self._expand_article(article, target_length, model)
+        elif direction == "shorten":
+            # Локально сократить не удалось
+            return self._shorten_article(article, target_length, model)
+        
+        return article
+    
+    async def adjust_article_length_async(self, article: str, target_length: int, model: str) -> str:
+        """Асинхронно корректирует длину статьи: лишнее срезается локально, LLM дописывает только при большом недоборе"""
+        direction, article = plan_length_adjustment(article, target_length)
+        
+        if direction == "expand":
+            return await self._expand_article_async(article, target_length, model)
+        elif direction == "shorten":
+            return await self._shorten_article_async(article, target_length, model)
+        
+        return article
+    
+    def _expand_article(self, article: str, target_length: int, model: str) -> str:
+        """Расширяет статью до нужной длины"""
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=self._expand_messages(article, target_length),
+                max_tokens=token_budget.max_tokens_for(model, target_length, detect_language(article)),
+                temperature=0.3
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            print(f"Error expanding article: {e}")
+            return article
+    
+    async def _expand_article_async(self, article: str, target_length: int, model: str) -> str:
+        """Асинхронно расширяет статью до нужной длины"""
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=self._expand_messages(article, target_length),
+                max_tokens=token_budget.max_tokens_for(model, target_length, detect_language(article)),
+                temperature=0.3
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            print(f"Error expanding article: {e}")
+            return article
+    
+    def _shorten_article(self, article: str, target_length: int, model: str) -> str:
+        """Сокращает статью до нужной длины"""
+        try:
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=self._shorten_messages(article, target_length),
+                max_tokens=token_budget.max_tokens_for(model, target_length, detect_language(article)),
+                temperature=0.3
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            print(f"Error shortening article: {e}")
+            return article
+    
+    async def _shorten_article_async(self, article: str, target_length: int, model: str) -> str:
+        """Асинхронно сокращает статью до нужной длины"""
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=self._shorten_messages(article, target_length),
+                max_tokens=token_budget.max_tokens_for(model, target_length, detect_language(article)),
+                temperature=0.3
+            )
+            
+            return response.choices[0].message.content
+            
+        except Exception as e:
+            print(f"Error shortening article: {e}")
+            return article
+    
+    def _usage_from_response(self, response) -> Dict:
+        """Извлекает информацию об использовании токенов из ответа OpenAI"""
+        # Токены префикса, прочитанные из кеша провайдера (входят в prompt_tokens)
+        details = getattr(response.usage, "prompt_tokens_details", None)
+        return {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "cached_tokens": getattr(details, "cached_tokens", None) or 0
+        }
+    
+    def _structure_messages(self, prompt: str) -> List[Dict]:
+        """Сообщения для генерации структуры"""
+        return [
+            {"role": "system", "content": "Ты эксперт по SEO и созданию структур статей. Создавай подробные, логичные структуры статей в markdown формате."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _article_messages(self, prompt: str) -> List[Dict]:
+        """Сообщения для генерации статьи.
+
+        Постоянные инструкции стоят в начале и не меняются между запросами -
+        OpenAI автоматически кеширует такой префикс (от 1024 токенов).
+        """
+        return [
+            {"role": "system", "content": self._article_instructions()},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _style_digest_messages(self, prompt: str) -> List[Dict]:
+        """Сообщения для сжатия примеров стиля"""
+        return [
+            {"role": "system", "content": "Ты опытный редактор, который точно описывает авторский стиль текстов."},
+            {"role": "user", "content": prompt}
+        ]
+    
+    def _expand_messages(self, article: str, target_length: int) -> List[Dict]:
+        """Сообщения для расширения статьи"""
+        return [
+            {"role": "system", "content": "Ты эксперт-редактор, умеющий качественно расширять тексты."},
+            {"role": "user", "content": self._build_expand_prompt(article, target_length)}
+        ]
+    
+    def _shorten_messages(self, article: str, target_length: int) -> List[Dict]:
+        """Сообщения для сокращения статьи"""
+        return [
+            {"role": "system", "content": "Ты эксперт-редактор, умеющий качественно сокращать тексты без потери смысла."},
+            {"role": "user", "content": self._build_shorten_prompt(article, target_length)}
+        ]
+    
+    def _build_structure_prompt(self, topic: str, thesis: str, keywords: List[str], questions: List[str]) -> str:
+        """Формирует промпт для генерации структуры статьи"""
         keywords_str = ", ".join(keywords[:10])
+        questions_str = "\n".join(questions[:5])
         
         prompt = f"""
-Напиши полную статью о здоровом питании и снижении веса на основе следующей структуры:
+Создай подробную структуру SEO-статьи на тему: "{topic}"
 
-Тема: {topic}
 Тезисы автора: {thesis}
 
-Структура статьи:
-{structure}
+Ключевые слова для включения: {keywords_str}
 
-Ключевые слова для обязательного включения: {keywords_str}
+Популярные вопросы пользователей:
+{questions_str}
+
+Требования к структуре:
+1. Используй markdown формат с заголовками H1, H2, H3
+2. Включи введение, основную часть с подразделами и заключение
+3. Обязательно используй предоставленные ключевые слова
+4. Ответь на популярные вопросы пользователей
+5. Структура должна быть логичной и SEO-оптимизированной
+6. Длина статьи должна быть 2000-3000 слов
 
-ПРИМЕРЫ СТИЛЯ ДЛЯ ПОДРАЖАНИЯ:
+Верни только структуру в markdown формате, без дополнительных комментариев.
+"""
+        return prompt
+    
+    def _build_style_digest_prompt(self, style_examples: str) -> str:
+        """Формирует промпт для сжатия примеров стиля в компактное описание"""
+        prompt = f"""
+Проанализируй примеры текстов ниже и составь компактное описание их стиля, по которому другой автор сможет писать точно так же.
+
+Опиши:
+1. Тон и эмоциональность
+2. Способ обращения к читателю
+3. Длину и строение предложений
+4. Характерные речевые обороты и слова (приведи 5-10 коротких цитат из примеров)
+5. Строение абзацев и форматирование
+6. Приемы вовлечения читателя и призывы к действию
+
+Не пересказывай содержание примеров. Ответ - не более 1200 знаков, маркированным списком, без вступления.
+
+ПРИМЕРЫ:
+{style_examples}
+"""
+        return prompt
+    
+    def _style_section(self, style_examples: str, style_digest: Optional[str]) -> str:
+        """Блок стиля для промпта статьи: сжатое описание стиля или исходные примеры"""
+        if style_digest:
+            return f"""ОПИСАНИЕ СТИЛЯ ДЛЯ ПОДРАЖАНИЯ:
+{style_digest}
+
+ВАЖНО: Пиши статью точно в описанном стиле: тот же тон, речевые обороты, структура предложений и способы обращения к читателю.
+"""
+        return f"""ПРИМЕРЫ СТИЛЯ ДЛЯ ПОДРАЖАНИЯ:
 {style_examples}
 
 ВАЖНО: Изучи приведенные примеры стиля и пиши статью точно в таком же тоне, используя аналогичные речевые обороты, структуру предложений и способы обращения к читателю.
+"""
+    
+    def _article_instructions(self) -> str:
+        """Постоянные инструкции для статьи: неизменный префикс промпта, который кешируется провайдером"""
+        return """Ты эксперт-копирайтер, специализирующийся на создании качественных SEO-статей. Пишешь информативно, экспертно, с хорошей структурой и естественным включением ключевых слов.
+
+Ты пишешь статьи о здоровом питании и снижении веса по структуре, теме и тезисам из запроса.
 
 ВАЖНАЯ ЗАДАЧА: Создать статью, которая мотивирует читателя к действию - нажать кнопки «Получить персональный план питания» или «Бесплатный курс по снижению веса» в конце статьи.
 
@@ -168,7 +466,7 @@ class OpenAIService:
 - Зарубежных экспертов
 
 ТРЕБОВАНИЯ К ТЕКСТУ:
-КРИТИЧЕСКИ ВАЖНО: Статья должна быть ТОЧНО {character_count} знаков (±200 знаков). Это строгое требование!
+- Длина статьи в знаках указана в запросе - это строгое требование
 - Заголовок до 60-70 символов с социальным триггером
 - Лид-абзац 2-3 предложения с главным ключом
 - Подзаголовки H2-H3 по 200-300 символов
@@ -177,11 +475,6 @@ class OpenAIService:
 - Bold для выводов, italic для терминов
 - БЕЗ таблиц
 
-КОНТРОЛЬ ДЛИНЫ:
-- Если текст получается короче {character_count} знаков - добавь больше примеров, деталей, объяснений
-- Если текст получается длиннее {character_count} знаков - сократи, убери лишние детали
-- В конце проверь длину и подкорректируй до нужного размера
-
 СТРУКТУРА КОНТЕНТА:
 1. Эмоциональный зацеп в начале
 2. Объяснение проблемы (почему диеты не работают)
@@ -189,96 +482,73 @@ class OpenAIService:
 4. Практические решения
 5. Мотивирующий финал, подводящий к кнопкам действия
 
-Напиши полную статью в markdown формате, следуя этому стилю и требованиям.
+Пиши полную статью в markdown формате, следуя стилю и требованиям из запроса.
 """
+    
+    def _build_article_prompt(self, topic: str, thesis: str, structure: str, keywords: List[str],
+                              style_examples: str, character_count: int, style_digest: Optional[str] = None) -> str:
+        """Формирует переменную часть промпта статьи (постоянные инструкции - в _article_instructions)"""
+        style_section = self._style_section(style_examples, style_digest)
+        context = self._article_context(topic, thesis, structure, keywords)
         
-        try:
-            config = self.get_model_config(model)
-            # Для генерации статьи используем больше токенов
-            article_max_tokens = min(config["max_tokens"] * 2, 8000)
-            
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "Ты эксперт-копирайтер, специализирующийся на создании качественных SEO-статей. Пишешь информативно, экспертно, с хорошей структурой и естественным включением ключевых слов."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=article_max_tokens,
-                temperature=config["temperature"]
-            )
-            
-            article = response.choices[0].message.content
-            usage_info = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens
-            }
-            
-            # Проверяем и корректируем длину статьи
-            article = self._adjust_article_length(article, character_count, model)
-            
-            return article, usage_info
-            
-        except Exception as e:
-            print(f"Error generating article: {e}")
-            # Возвращаем базовую статью
-            basic_article = f"""# {topic}
-
-{thesis}
-
-## Введение
+        # Блок стиля идет первым: у статей с одним профилем стиля совпадает и эта часть префикса
+        prompt = f"""{style_section}
+Напиши полную статью на основе следующей структуры:
 
-В данной статье мы рассмотрим тему "{topic}". Эта тема является актуальной и важной для понимания.
-
-## Основная часть
+{context}
+КРИТИЧЕСКИ ВАЖНО: Статья должна быть ТОЧНО {character_count} знаков (±200 знаков). Это строгое требование!
 
-### Основные понятия
+КОНТРОЛЬ ДЛИНЫ:
+- Если текст получается короче {character_count} знаков - добавь больше примеров, деталей, объяснений
+- Если текст получается длиннее {character_count} знаков - сократи, убери лишние детали
+- В конце проверь длину и подкорректируй до нужного размера
+"""
+        return prompt
+    
+    def _article_context(self, topic: str, thesis: str, structure: str, keywords: List[str]) -> str:
+        """Общие данные статьи для промпта: тема, тезисы, структура и ключевые слова"""
+        keywords_str = ", ".join(keywords[:10])
+        return f"""Тема: {topic}
+Тезисы автора: {thesis}
 
-Ключевые аспекты темы включают в себя различные элементы, которые необходимо рассмотреть подробно.
+Структура статьи:
+{structure}
 
-### Практическое применение
+Ключевые слова для обязательного включения: {keywords_str}
+"""
+    
+    def _build_section_prompt(self, topic: str, thesis: str, structure: str, keywords: List[str],
+                              style_examples: str, section: str, character_count: int, position: str,
+                              style_digest: Optional[str] = None) -> str:
+        """Формирует промпт для одного раздела статьи (position: first, middle или last)"""
+        style_section = self._style_section(style_examples, style_digest)
+        context = self._article_context(topic, thesis, structure, keywords)
+        heading = section.split("\n", 1)[0]
+        if position == "first":
+            position_note = "Это первый раздел: перед ним напиши заголовок статьи H1 и лид-абзац 2-3 предложения с главным ключом и эмоциональным зацепом."
+        elif position == "last":
+            position_note = "Это финальный раздел статьи: подведи итоги и мотивируй читателя нажать кнопки действия."
+        else:
+            position_note = "Не пиши введение и заключение статьи - только этот раздел."
+        start_note = "с заголовка H1 статьи" if position == "first" else f'с заголовка "{heading}"'
+        
+        prompt = f"""{style_section}
+Статья пишется по следующей структуре, ее разделы пишутся параллельно:
 
-Рассмотрим практические аспекты использования знаний по данной теме.
+{context}
+ТВОЯ ЧАСТЬ - только этот раздел со всеми его подразделами:
+{section}
 
-## Заключение
+{position_note}
+Длина раздела: около {character_count} знаков.
 
-В заключение можно сказать, что тема "{topic}" требует детального изучения и практического применения.
+Верни только текст раздела в markdown, начиная {start_note}, без комментариев.
 """
-            return basic_article, {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+        return prompt
     
-    def calculate_cost(self, usage_info: Dict, model: str) -> Decimal:
-        """Рассчитывает стоимость использования OpenAI API"""
-        pricing = settings.OPENAI_PRICING.get(model, settings.OPENAI_PRICING["gpt-4o-mini"])
-        
-        input_cost = (usage_info["prompt_tokens"] / 1000) * pricing["input"]
-        output_cost = (usage_info["completion_tokens"] / 1000) * pricing["output"]
-        
-        return Decimal(str(input_cost + output_cost)).quantize(Decimal('0.000001'))
-    
-    def _adjust_article_length(self, article: str, target_length: int, model: str) -> str:
-        """Корректирует длину статьи если она не соответствует требованиям"""
-        current_length = len(article)
-        tolerance = 200  # Допустимое отклонение
-        
-        # Если длина в пределах допустимого отклонения, возвращаем как есть
-        if target_length - tolerance <= current_length <= target_length + tolerance:
-            return article
-        
-        print(f"Корректируем длину статьи: текущая {current_length}, нужна {target_length}")
-        
-        if current_length < target_length - tolerance:
-            # Статья слишком короткая, нужно расширить
-            return self._expand_article(article, target_length, model)
-        elif current_length > target_length + tolerance:
-            # Статья слишком длинная, нужно сократить
-            return self._shorten_article(article, target_length, model)
-        
-        return article
-    
-    def _expand_article(self, article: str, target_length: int, model: str) -> str:
-        """Расширяет статью до нужной длины"""
-        try:
-            prompt = f"""
+    def _build_expand_prompt(self, article: str, target_length: int) -> str:
+        """Формирует промпт для расширения статьи"""
+        prompt = f"""
 Исходная статья:
 {article}
 
@@ -292,28 +562,11 @@ class OpenAIService:
 
 Верни ТОЛЬКО расширенную статью без комментариев.
 """
-            
-            config = self.get_model_config(model)
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "Ты эксперт-редактор, умеющий качественно расширять тексты."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=config["max_tokens"],
-                temperature=0.3
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            print(f"Error expanding article: {e}")
-            return article
+        return prompt
     
-    def _shorten_article(self, article: str, target_length: int, model: str) -> str:
-        """Сокращает статью до нужной длины"""
-        try:
-            prompt = f"""
+    def _build_shorten_prompt(self, article: str, target_length: int) -> str:
+        """Формирует промпт для сокращения статьи"""
+        prompt = f"""
 Исходная статья:
 {article}
 
@@ -327,20 +580,49 @@ class OpenAIService:
 
 Верни ТОЛЬКО сокращенную статью без комментариев.
 """
-            
-            config = self.get_model_config(model)
-            response = self.client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "Ты эксперт-редактор, умеющий качественно сокращать тексты без потери смысла."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=config["max_tokens"],
-                temperature=0.3
-            )
-            
-            return response.choices[0].message.content
-            
-        except Exception as e:
-            print(f"Error shortening article: {e}")
-            return article 
\ No newline at end of file
+        return prompt
+    
+    def _basic_structure(self, topic: str) -> str:
+        """Базовая структура статьи на случай ошибки API"""
+        return f"""# {topic}
+
+## Введение
+- Что такое {topic}
+- Актуальность темы
+
+## Основная часть
+
+### Основные понятия
+### Преимущества и недостатки
+### Практическое применение
+### Советы и рекомендации
+
+## Заключение
+- Выводы
+- Рекомендации
+"""
+    
+    def _basic_article(self, topic: str, thesis: str) -> str:
+        """Базовая статья на случай ошибки API"""
+        return f"""# {topic}
+
+{thesis}
+
+## Введение
+
+В данной статье мы рассмотрим тему "{topic}". Эта тема является актуальной и важной для понимания.
+
+## Основная часть
+
+### Основные понятия
+
+Ключевые аспекты темы включают в себя различные элементы, которые необходимо рассмотреть подробно.
+
+### Практическое применение
+
+Рассмотрим практические аспекты использования знаний по данной теме.
+
+## Заключение
+
+В заключение можно сказать, что тема "{topic}" требует детального изучения и практического применения.
+"""
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+class StagePipeline:
+    """Небольшой граф этапов генерации.
+
+    Каждый этап запускается, как только готовы его зависимости, поэтому
+    независимая работа (SERP, описание стиля, записи в базу) идет параллельно.
+    Для каждого этапа записываются время начала и конца, по ним строится
+    критический путь - цепочка этапов, которая определила общее время.
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, Tuple[Callable[[], Awaitable[Any]], Tuple[str, ...]]] = {}
+        self.results: Dict[str, Any] = {}
+        self._started: Dict[str, float] = {}
+        self._finished: Dict[str, float] = {}
+        self._origin: Optional[float] = None
+        self._origin_wall: Optional[datetime] = None
+
+    def add(self, name: str, func: Callable[[], Awaitable[Any]], depends_on: Iterable[str] = ()):
+        """Добавляет этап; зависимости должны быть добавлены раньше (граф без циклов)"""
+        depends_on = tuple(depends_on)
+        unknown = [dependency for dependency in depends_on if dependency not in self._stages]
+        if unknown:
+            raise ValueError(f"Неизвестные зависимости этапа {name}: {', '.join(unknown)}")
+        self._stages[name] = (func, depends_on)
+
+    async def run(self) -> Dict[str, Any]:
+        """Выполняет все этапы; при ошибке любого этапа остальные отменяются и ошибка пробрасывается"""
+        self._origin = time.monotonic()
+        self._origin_wall = datetime.utcnow()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(name: str):
+            func, depends_on = self._stages[name]
+            if depends_on:
+                await asyncio.gather(*(tasks[dependency] for dependency in depends_on))
+            self._started[name] = time.monotonic()
+            try:
+                self.results[name] = await func()
+            except asyncio.CancelledError:
+                # У отмененного этапа нет времени окончания
+                raise
+            except Exception:
+                self._finished[name] = time.monotonic()
+                raise
+            self._finished[name] = time.monotonic()
+
+        for name in self._stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+
+        try:
+            done, pending = await asyncio.wait(tasks.values(), return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            # Дожидаемся отмены, чтобы этапы не продолжали работу после выхода
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return self.results
+
+    def critical_path(self) -> List[str]:
+        """Цепочка этапов от последнего завершившегося назад через самую позднюю зависимость"""
+        if not self._finished:
+            return []
+        path = [max(self._finished, key=self._finished.get)]
+        while True:
+            dependencies = [dependency for dependency in self._stages[path[-1]][1] if dependency in self._finished]
+            if not dependencies:
+                break
+            path.append(max(dependencies, key=self._finished.get))
+        return list(reversed(path))
+
+    def timings(self) -> Dict[str, Any]:
+        """Времена этапов в миллисекундах от начала конвейера (для сохранения в pipeline_timings)"""
+        if self._origin is None:
+            return {}
+
+        def offset(moment: float) -> int:
+            return int((moment - self._origin) * 1000)
+
+        stages = {}
+        for name in self._stages:
+            if name not in self._started:
+                continue
+            stage = {"start_ms": offset(self._started[name])}
+            if name in self._finished:
+                stage["end_ms"] = offset(self._finished[name])
+                stage["duration_ms"] = stage["end_ms"] - stage["start_ms"]
+            stages[name] = stage
+
+        return {
+            "started_at": self._origin_wall.isoformat(),
+            "total_ms": max((stage.get("end_ms", 0) for stage in stages.values()), default=0),
+            "stages": stages,
+            "critical_path": self.critical_path()
+        }
@@ -0,0 +1,107 @@
+import asyncio
+import logging
+import re
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+H2_HEADING = re.compile(r'^##\s+\S', re.MULTILINE)
+
+# Заголовок H1 и лид первого раздела
+LEAD_CHARS = 400
+
+
+def split_structure(structure: str) -> List[str]:
+    """Делит markdown-структуру на разделы H2 (каждый - заголовок со своими подпунктами)"""
+    starts = [match.start() for match in H2_HEADING.finditer(structure or "")]
+    return [structure[start:end].strip() for start, end in zip(starts, starts[1:] + [len(structure)])]
+
+
+def section_budgets(sections: List[str], character_count: int) -> List[int]:
+    """Делит объем статьи между разделами пропорционально числу пунктов в их структуре"""
+    weights = [1 + len([line for line in section.split("\n")[1:] if line.strip()]) for section in sections]
+    body_chars = max(character_count - LEAD_CHARS, character_count // 2)
+    budgets = [max(int(body_chars * weight / sum(weights)), 300) for weight in weights]
+    budgets[0] += character_count - body_chars
+    return budgets
+
+
+class SectionGenerationError(Exception):
+    """Генерация по разделам не удалась; usage - токены разделов, успевших завершиться"""
+
+    def __init__(self, message: str, usage: Dict):
+        super().__init__(message)
+        self.usage = usage
+
+
+def sum_usage(usages: List[Dict]) -> Dict:
+    keys = ("prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens", "cache_write_tokens")
+    return {key: sum(usage.get(key, 0) for usage in usages) for key in keys}
+
+
+async def cancel_tasks(tasks: List[asyncio.Task]):
+    """Отменяет задачи разделов и дожидается их завершения, чтобы запросы к модели не висели после ошибки"""
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def generate_article_by_sections(service, topic: str, thesis: str, structure: str, keywords: List[str],
+                                       style_examples: str, character_count: int, model: str,
+                                       on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
+                                       style_digest: Optional[str] = None) -> Optional[Tuple[str, Dict]]:
+    """Генерирует разделы H2 статьи одновременно и склеивает их по порядку.
+
+    Каждый раздел получает общий контекст (тема, тезисы, вся структура,
+    ключевые слова, стиль) и свою долю объема, поэтому время генерации
+    определяется самым длинным разделом, а не суммой. Возвращает None, если
+    в структуре меньше двух разделов - тогда статья пишется одним запросом.
+    """
+    sections = split_structure(structure)
+    if len(sections) < 2:
+        return None
+
+    budgets = section_budgets(sections, character_count)
+    semaphore = asyncio.Semaphore(settings.SECTION_PARALLEL_CONCURRENCY)
+    results: List[Optional[Tuple[str, Dict]]] = [None] * len(sections)
+    flush_lock = asyncio.Lock()
+    flushed = 0
+
+    async def generate(index: int):
+        nonlocal flushed
+        position = "first" if index == 0 else "last" if index == len(sections) - 1 else "middle"
+        async with semaphore:
+            text, usage = await service.generate_section_async(
+                topic, thesis, structure, keywords, style_examples, sections[index],
+                budgets[index], position, model, style_digest
+            )
+        results[index] = (text.strip(), usage)
+
+        # Трансляция идет по порядку: раздел отдается, когда готовы все предыдущие
+        async with flush_lock:
+            while flushed < len(results) and results[flushed] is not None:
+                text = results[flushed][0]
+                flushed += 1
+                if on_delta:
+                    await on_delta(text + "\n\n")
+
+    tasks = [asyncio.create_task(generate(index)) for index in range(len(sections))]
+    try:
+        await asyncio.gather(*tasks)
+    except Exception as e:
+        await cancel_tasks(tasks)
+        # Токены готовых разделов уже оплачены - отдаем их вызывающему для учета
+        finished = [result[1] for result in results if result is not None]
+        raise SectionGenerationError(str(e), sum_usage(finished)) from e
+    except BaseException:
+        await cancel_tasks(tasks)
+        raise
+
+    logger.info(f"🧩 Статья собрана из {len(sections)} разделов, сгенерированных параллельно")
+    article = "\n\n".join(text for text, _ in results)
+    return article, sum_usage([usage for _, usage in results])
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from database import AsyncSessionLocal
+import crud_async
+
+logger = logging.getLogger(__name__)
+
+PUNCTUATION = re.compile(r'[^\w\s]+')
+WHITESPACE = re.compile(r'\s+')
+
+# Просроченные записи общего кеша чистим не чаще этого интервала
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+def normalize_query(query: str) -> str:
+    """Приводит запрос к виду, по которому совпадают равнозначные формулировки"""
+    query = (query or "").lower().replace("ё", "е")
+    query = PUNCTUATION.sub(" ", query)
+    return WHITESPACE.sub(" ", query).strip()
+
+
+def make_cache_key(query: str, hl: str, gl: str) -> str:
+    return hashlib.sha256(f"{hl}|{gl}|{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+
+class SERPCache:
+    """Кеш результатов поиска по (нормализованный запрос, hl, gl).
+
+    Первый уровень - LRU в памяти процесса с ограничением по числу записей,
+    второй (SERP_CACHE_SHARED) - таблица serp_cache, общая для API и воркеров.
+    Оба уровня живут SERP_CACHE_TTL_SECONDS, поэтому повторные и близкие темы
+    не тратят квоту SERP API и не ждут сетевого запроса.
+    """
+
+    def __init__(self):
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._pruned_at: Optional[float] = None
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    async def get(self, query: str, hl: str, gl: str) -> Optional[Dict[str, Any]]:
+        """Возвращает закешированные результаты или None"""
+        if not settings.SERP_CACHE_ENABLED:
+            return None
+
+        key = make_cache_key(query, hl, gl)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, results = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return results
+            del self._entries[key]
+
+        if settings.SERP_CACHE_SHARED:
+            results = await self._load(key)
+            if results is not None:
+                # Остаток TTL записи в базе не известен - держим в памяти полный срок, это не дольше суток
+                self._remember(key, results)
+                self.shared_hits += 1
+                logger.info(f"🗄️ Результаты поиска взяты из общего кеша: {query}")
+                return results
+
+        self.misses += 1
+        return None
+
+    async def put(self, query: str, hl: str, gl: str, results: Dict[str, Any]):
+        """Сохраняет выдачу; без органических результатов не кешируется, чтобы сбой поиска не закрепился на весь TTL"""
+        if not settings.SERP_CACHE_ENABLED or not results.get("results"):
+            return
+
+        key = make_cache_key(query, hl, gl)
+        self._remember(key, results)
+        self.stores += 1
+        if settings.SERP_CACHE_SHARED:
+            await self._save(key, normalize_query(query), hl, gl, results)
+
+    def _remember(self, key: str, results: Dict[str, Any]):
+        self._entries[key] = (time.monotonic() + settings.SERP_CACHE_TTL_SECONDS, results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.SERP_CACHE_MAX_ENTRIES:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with AsyncSessionLocal() as db:
+                return await crud_async.get_serp_cache(db, key)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прочитать общий кеш поиска: {e}")
+            return None
+
+    async def _save(self, key: str, query: str, hl: str, gl: str, results: Dict[str, Any]):
+        try:
+            async with AsyncSessionLocal() as db:
+                await crud_async.save_serp_cache(db, key, query, hl, gl, results, settings.SERP_CACHE_TTL_SECONDS)
+                if self._pruned_at is None or time.monotonic() - self._pruned_at > PRUNE_INTERVAL_SECONDS:
+                    self._pruned_at = time.monotonic()
+                    deleted = await crud_async.delete_expired_serp_cache(db)
+                    if deleted:
+                        logger.info(f"🧹 Удалено просроченных записей кеша поиска: {deleted}")
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить результаты поиска в общий кеш: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.shared_hits + self.misses
+        return {
+            "enabled": settings.SERP_CACHE_ENABLED,
+            "shared": settings.SERP_CACHE_SHARED,
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": round((self.memory_hits + self.shared_hits) / lookups, 3) if lookups else None
+        }
+
+# Глобальный кеш результатов поиска
+serp_cache = SERPCache()
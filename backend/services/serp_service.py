@@ -1,30 +1,53 @@
-import requests
+import asyncio
+import time
+import aiohttp
 from bs4 import BeautifulSoup
-from typing import List, Dict
+from collections import Counter
+from typing import Any, Dict, List, Optional
 import re
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlparse
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import settings
+from services.serp_cache import serp_cache, make_cache_key, normalize_query
+
+SERP_API_URL = "https://serpapi.com/search"
+SERP_API_TIMEOUT_SECONDS = 15
+GOOGLE_TIMEOUT_SECONDS = 10
 
 class SERPService:
+    """Асинхронный клиент поиска.
+
+    Запросы идут через общую aiohttp-сессию (keep-alive, без нового TLS
+    на каждый поиск) и не блокируют event loop. Одновременные поиски одного
+    и того же запроса объединяются в один запрос к источнику, а число
+    одновременных запросов к каждому хосту ограничено, чтобы не выходить
+    за квоты SerpAPI.
+    """
+
     def __init__(self):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         self.serp_api_key = settings.SERP_API_KEY
         print(f"SERP_API_KEY: {'Set' if self.serp_api_key else 'Not set'}")
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._host_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.upstream_requests = 0
+        self.coalesced_requests = 0
+        self.upstream_errors = 0
+        self.fanout_queries = 0
+        self.fanout_timeouts = 0
     
-    def analyze_topic(self, topic: str) -> Dict[str, List[str]]:
+    async def analyze_topic(self, topic: str) -> Dict[str, List[str]]:
         """Анализирует тему и возвращает ключевые слова, заголовки и вопросы"""
         try:
-            # Сначала пробуем официальный SERP API
-            if self.serp_api_key:
-                search_results = self._serp_api_search(topic)
-            else:
-                # Fallback на Google поиск
-                search_results = self._google_search(topic)
+            if settings.SERP_FANOUT_ENABLED:
+                return await self._analyze_fanout(topic)
+            
+            search_results = (await self.search(topic))["results"]
             
             # Извлекаем данные
             keywords = self._extract_keywords(topic, search_results)
@@ -48,23 +71,134 @@ class SERPService:
                 "related_searches": []
             }
     
-    def _serp_api_search(self, query: str) -> List[Dict]:
+    async def _analyze_fanout(self, topic: str) -> Dict[str, List[str]]:
+        """Анализирует тему вместе со связанными запросами.
+
+        Выдачи связанных запросов (из related_searches/related_questions SerpAPI,
+        при их отсутствии - шаблонных) запрашиваются одновременно и объединяются.
+        Все укладывается в SERP_FANOUT_DEADLINE_SECONDS от начала анализа: не
+        успевшие запросы не ждем, их результаты попадут в кеш для следующих статей.
+        """
+        deadline = time.monotonic() + settings.SERP_FANOUT_DEADLINE_SECONDS
+        primary = await self.search(topic)
+        related_questions = list(primary.get("related_questions", []))
+        related_searches = list(primary.get("related_searches", []))
+        
+        queries = self._dedupe(related_searches + related_questions + self._extract_related_searches(topic))
+        queries = [query for query in queries if normalize_query(query) != normalize_query(topic)]
+        queries = queries[:settings.SERP_FANOUT_MAX_QUERIES]
+        
+        payloads = [primary]
+        remaining = deadline - time.monotonic()
+        if queries and remaining > 0:
+            self.fanout_queries += len(queries)
+            tasks = [asyncio.ensure_future(self.search(query)) for query in queries]
+            done, pending = await asyncio.wait(tasks, timeout=remaining)
+            for task in pending:
+                # Отменяется только ожидание: сам поиск защищен shield и завершится в фоне
+                task.cancel()
+            self.fanout_timeouts += len(pending)
+            payloads += [task.result() for task in tasks if task in done and task.exception() is None]
+        
+        for payload in payloads[1:]:
+            related_questions += payload.get("related_questions", [])
+            related_searches += payload.get("related_searches", [])
+        related_searches = self._dedupe(related_searches)
+        search_results = self._merge_results(payloads)
+        print(f"SERP fan-out: {len(payloads)} of {len(queries) + 1} queries, {len(search_results)} unique results")
+        
+        return {
+            "keywords": self._merge_keywords(topic, payloads, related_searches),
+            "titles": self._extract_titles(search_results),
+            # Настоящие вопросы из выдачи важнее шаблонных, шаблонными только дополняем
+            "questions": self._dedupe(related_questions + self._extract_questions(topic))[:8],
+            "related_searches": related_searches[:10] or self._extract_related_searches(topic)
+        }
+    
+    async def search(self, query: str) -> Dict[str, Any]:
+        """Возвращает выдачу (results, related_questions, related_searches); одновременные вызовы с тем же запросом ждут один общий поиск"""
+        key = make_cache_key(query, settings.SERP_HL, settings.SERP_GL)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._cached_search(query))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced_requests += 1
+        # Отмена одного ожидающего не должна отменять поиск, который ждут остальные
+        return await asyncio.shield(future)
+    
+    async def _cached_search(self, query: str) -> Dict[str, Any]:
+        """Возвращает результаты поиска из кеша или выполняет поиск"""
+        cached = await serp_cache.get(query, settings.SERP_HL, settings.SERP_GL)
+        if cached is not None:
+            return cached
+
+        # Сначала пробуем официальный SERP API
+        if self.serp_api_key:
+            results = await self._serp_api_search(query)
+        else:
+            # Fallback на Google поиск
+            results = await self._google_search(query)
+        await serp_cache.put(query, settings.SERP_HL, settings.SERP_GL, results)
+        return results
+    
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Общая HTTP-сессия процесса (создается при первом поиске)"""
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=settings.SERP_API_CONCURRENCY + settings.SERP_SCRAPE_CONCURRENCY, keepalive_timeout=60)
+            )
+        return self.session
+    
+    def _host_semaphore(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self._host_semaphores:
+            limit = settings.SERP_API_CONCURRENCY if url.startswith(SERP_API_URL) else settings.SERP_SCRAPE_CONCURRENCY
+            self._host_semaphores[host] = asyncio.Semaphore(limit)
+        return self._host_semaphores[host]
+    
+    async def _fetch(self, url: str, timeout: int, params: Optional[Dict[str, Any]] = None,
+                     headers: Optional[Dict[str, str]] = None, as_json: bool = False):
+        """GET через общую сессию с ограничением одновременных запросов к хосту"""
+        async with self._host_semaphore(url):
+            self.upstream_requests += 1
+            async with self._get_session().get(
+                url, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)
+            ) as response:
+                response.raise_for_status()
+                return await response.json() if as_json else await response.read()
+    
+    async def close(self):
+        """Закрывает общую HTTP-сессию"""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "upstream_requests": self.upstream_requests,
+            "coalesced_requests": self.coalesced_requests,
+            "upstream_errors": self.upstream_errors,
+            "in_flight": len(self._in_flight),
+            "fanout_queries": self.fanout_queries,
+            "fanout_timeouts": self.fanout_timeouts,
+            "cache": serp_cache.get_stats()
+        }
+    
+    async def _serp_api_search(self, query: str) -> Dict[str, Any]:
         """Выполняет поиск через официальный SERP API"""
         try:
-            url = "https://serpapi.com/search"
             params = {
                 "q": query,
                 "api_key": self.serp_api_key,
                 "engine": "google",
                 "num": 10,
-                "hl": "ru",
-                "gl": "ru"
+                "hl": settings.SERP_HL,
+                "gl": settings.SERP_GL
             }
             
-            response = requests.get(url, params=params, timeout=15)
-            response.raise_for_status()
-            
-            data = response.json()
+            data = await self._fetch(SERP_API_URL, SERP_API_TIMEOUT_SECONDS, params=params, as_json=True)
             results = []
             
             # Извлекаем результаты из SERP API ответа
@@ -77,22 +211,26 @@ class SERPService:
                     })
             
             print(f"SERP API found {len(results)} results")
-            return results[:10]
+            return {
+                "results": results[:10],
+                "related_questions": [item["question"] for item in data.get("related_questions", []) if item.get("question")],
+                "related_searches": [item["query"] for item in data.get("related_searches", []) if item.get("query")]
+            }
             
         except Exception as e:
+            self.upstream_errors += 1
             print(f"Error in SERP API search: {e}")
             # Fallback на Google поиск
-            return self._google_search(query)
+            return await self._google_search(query)
     
-    def _google_search(self, query: str) -> List[Dict]:
+    async def _google_search(self, query: str) -> Dict[str, Any]:
         """Выполняет поиск в Google и возвращает результаты (fallback метод)"""
-        search_url = f"https://www.google.com/search?q={quote_plus(query)}&num=10"
+        search_url = f"https://www.google.com/search?q={quote_plus(query)}&num=10&hl={settings.SERP_HL}&gl={settings.SERP_GL}"
         
         try:
-            response = requests.get(search_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
+            content = await self._fetch(search_url, GOOGLE_TIMEOUT_SECONDS, headers=self.headers)
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = BeautifulSoup(content, 'html.parser')
             results = []
             
             # Извлекаем результаты поиска
@@ -109,10 +247,11 @@ class SERPService:
                     })
             
             print(f"Google search found {len(results)} results")
-            return results[:10]
+            return {"results": results[:10], "related_questions": [], "related_searches": []}
         except Exception as e:
+            self.upstream_errors += 1
             print(f"Error in Google search: {e}")
-            return []
+            return {"results": [], "related_questions": [], "related_searches": []}
     
     def _extract_keywords(self, topic: str, results: List[Dict]) -> List[str]:
         """Извлекает ключевые слова из результатов поиска"""
@@ -134,6 +273,42 @@ class SERPService:
         filtered_keywords = [kw for kw in keywords if len(kw) >= 3 and kw not in ['что', 'как', 'для', 'это', 'или']]
         return list(filtered_keywords)[:20]
     
+    def _merge_keywords(self, topic: str, payloads: List[Dict[str, Any]], related_searches: List[str]) -> List[str]:
+        """Ключевые слова по нескольким выдачам: тема, связанные запросы, затем слова из большего числа выдач"""
+        counts = Counter()
+        for payload in payloads:
+            words = set()
+            for result in payload.get("results", []):
+                text = f"{result.get('title', '')} {result.get('snippet', '')}".lower()
+                words.update(re.findall(r'\b[а-яё]{3,}\b', text))
+            counts.update(words - {'что', 'как', 'для', 'это', 'или'})
+        
+        topic_words = [word for word in topic.lower().split() if len(word) >= 3]
+        phrases = [search.lower() for search in related_searches[:5]]
+        return self._dedupe(topic_words + phrases + [word for word, _ in counts.most_common()])[:30]
+    
+    def _merge_results(self, payloads: List[Dict[str, Any]]) -> List[Dict]:
+        """Объединяет результаты выдач без повторов одной и той же страницы"""
+        merged, seen = [], set()
+        for payload in payloads:
+            for result in payload.get("results", []):
+                key = result.get('link') or result.get('title')
+                if key and key not in seen:
+                    seen.add(key)
+                    merged.append(result)
+        return merged
+    
+    @staticmethod
+    def _dedupe(queries: List[str]) -> List[str]:
+        """Убирает повторы запросов с точностью до нормализации, сохраняя порядок"""
+        unique, seen = [], set()
+        for query in queries:
+            normalized = normalize_query(query)
+            if normalized and normalized not in seen:
+                seen.add(normalized)
+                unique.append(query)
+        return unique
+    
     def _extract_titles(self, results: List[Dict]) -> List[str]:
         """Извлекает заголовки из результатов поиска"""
         return [result.get('title', '') for result in results if result.get('title')]
@@ -182,4 +357,7 @@ class SERPService:
         # Добавляем общие SEO слова
         keywords.extend(['преимущества', 'недостатки', 'использование', 'применение', 'выбор'])
         
-        return keywords[:15] 
\ No newline at end of file
+        return keywords[:15]
+
+# Глобальный SERP-клиент: общие сессия, объединение запросов и лимиты на процесс
+serp_service = SERPService()
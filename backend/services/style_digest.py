@@ -0,0 +1,144 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from database import SessionLocal
+import crud
+
+logger = logging.getLogger(__name__)
+
+# Описаний в памяти процесса (остальные читаются из style_profiles)
+CACHE_MAX_ENTRIES = 256
+# Отметка "описание не дает экономии": примеры передаются как есть, модель повторно не спрашиваем
+NO_DIGEST = ""
+
+
+class StyleDigestService:
+    """Сжимает примеры стиля в краткое описание для промпта статьи.
+
+    Описание составляется моделью один раз на уникальный текст примеров и
+    хранится в style_profiles.digest (плюс кеш в памяти процесса), поэтому
+    следующие статьи с теми же примерами платят только за короткое описание.
+    Любая ошибка - не повод ронять генерацию: статья пишется по исходным примерам.
+    """
+
+    def __init__(self, ai_service):
+        self.ai_service = ai_service
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        # Составление описания в процессе: одновременные запросы с теми же примерами ждут его
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.generated = 0
+        self.failures = 0
+        self.digest_tokens = 0
+
+    def should_digest(self, style_examples: str) -> bool:
+        return settings.STYLE_DIGEST_ENABLED and len(style_examples or "") >= settings.STYLE_DIGEST_MIN_CHARS
+
+    async def get_digest(self, style_examples: str, model: str) -> Tuple[Optional[str], Optional[Dict]]:
+        """Возвращает (описание стиля или None, если нужно передать примеры как есть; usage составления).
+
+        usage не None только у вызова, который сам составил описание: эти токены
+        учитываются в статистике его статьи.
+        """
+        if not self.should_digest(style_examples):
+            return None, None
+
+        content_hash = crud.style_content_hash(style_examples)
+        digest = await self._lookup(content_hash)
+        if digest is not None:
+            self.hits += 1
+            return digest or None, None
+
+        # Одно составление описания на текст, даже если пакет статей пришел одновременно
+        future = self._in_flight.get(content_hash)
+        if future is not None:
+            digest, _ = await asyncio.shield(future)
+            return digest, None
+
+        future = asyncio.ensure_future(self._generate(content_hash, style_examples, model))
+        self._in_flight[content_hash] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(content_hash, None))
+        return await asyncio.shield(future)
+
+    async def _generate(self, content_hash: str, style_examples: str, model: str) -> Tuple[Optional[str], Optional[Dict]]:
+        digest = await self._lookup(content_hash)
+        if digest is not None:
+            self.hits += 1
+            return digest or None, None
+
+        self.misses += 1
+        digest_model = settings.STYLE_DIGEST_MODEL or model
+        try:
+            digest, usage = await self.ai_service.generate_style_digest_async(style_examples, digest_model)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"⚠️ Не удалось составить описание стиля: {str(e)}")
+            return None, None
+        usage = {**usage, "model": digest_model}
+        self.digest_tokens += usage.get("total_tokens", 0)
+
+        if not digest or len(digest) >= len(style_examples):
+            # Описание не короче примеров - экономии нет; запоминаем это, чтобы не спрашивать модель снова
+            logger.info(f"🎨 Описание стиля не короче примеров ({len(style_examples)} знаков) - примеры передаются как есть")
+            digest = NO_DIGEST
+        else:
+            self.generated += 1
+            logger.info(f"🎨 Описание стиля составлено: {len(style_examples)} → {len(digest)} знаков")
+
+        self._remember(content_hash, digest)
+        try:
+            await asyncio.to_thread(self._save, style_examples, digest, digest_model)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось сохранить описание стиля: {str(e)}")
+        return digest or None, usage
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "generated": self.generated,
+            "failures": self.failures,
+            "digest_tokens": self.digest_tokens
+        }
+
+    async def _lookup(self, content_hash: str) -> Optional[str]:
+        """Сохраненное описание, NO_DIGEST, если экономии нет, или None, если описания еще не было"""
+        digest = self._cache.get(content_hash)
+        if digest is not None:
+            self._cache.move_to_end(content_hash)
+            return digest
+        try:
+            digest = await asyncio.to_thread(self._load, content_hash)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось прочитать описание стиля: {str(e)}")
+            return None
+        if digest is not None:
+            self._remember(content_hash, digest)
+        return digest
+
+    def _remember(self, content_hash: str, digest: str):
+        self._cache[content_hash] = digest
+        self._cache.move_to_end(content_hash)
+        while len(self._cache) > CACHE_MAX_ENTRIES:
+            self._cache.popitem(last=False)
+
+    def _load(self, content_hash: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            return crud.get_style_digest(db, content_hash)
+        finally:
+            db.close()
+
+    def _save(self, style_examples: str, digest: str, model: str):
+        db = SessionLocal()
+        try:
+            crud.save_style_digest(db, style_examples, digest, model)
+        finally:
+            db.close()
@@ -0,0 +1,101 @@
+import logging
+import re
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+import crud
+
+logger = logging.getLogger(__name__)
+
+CYRILLIC = re.compile(r'[а-яё]', re.IGNORECASE)
+LETTER = re.compile(r'[^\W\d_]')
+
+# Меньше этого ответ модели не ограничиваем
+MIN_MAX_TOKENS = 512
+# Лимит ответа для моделей, которых нет в MODEL_MAX_OUTPUT_TOKENS
+DEFAULT_MAX_OUTPUT_TOKENS = 4096
+
+
+def detect_language(text: str) -> str:
+    """Грубо определяет язык текста: "ru", если заметная доля букв кириллические, иначе "en" """
+    letters = LETTER.findall(text or "")
+    if not letters:
+        return "ru"
+    return "ru" if len(CYRILLIC.findall(text)) / len(letters) > 0.3 else "en"
+
+
+def default_chars_per_token(model: str, language: str) -> float:
+    """Стартовая оценка знаков на токен по токенизатору модели (до накопления статистики)"""
+    if model.startswith("gpt-4o"):
+        # o200k_base заметно экономнее на кириллице
+        return 3.0 if language == "ru" else 4.2
+    if model.startswith("claude"):
+        return 2.4 if language == "ru" else 3.5
+    # cl100k_base: GPT-3.5 и GPT-4
+    return 2.3 if language == "ru" else 4.0
+
+
+class TokenBudget:
+    """Задает max_tokens статьи по запрошенному числу знаков.
+
+    Число знаков на токен берется по модели и языку: сначала стартовая
+    оценка, затем калибровка по прошлым готовым статьям (длина текста /
+    article_completion_tokens из openai_usage). Так короткие статьи не резервируют
+    лишнего, а длинные не обрезаются и не уходят на повторное дописывание.
+    """
+
+    def __init__(self):
+        self._calibration: Dict[Tuple[str, str], float] = {}
+        self._samples: Dict[Tuple[str, str], int] = {}
+        self._calibrated_at: Optional[float] = None
+
+    def chars_per_token(self, model: str, language: str = "ru") -> float:
+        return self._calibration.get((model, language)) or default_chars_per_token(model, language)
+
+    def max_tokens_for(self, model: str, character_count: int, language: str = "ru") -> int:
+        """max_tokens для ответа длиной character_count знаков (с запасом на разметку и допуск длины)"""
+        expected_tokens = (character_count + settings.LENGTH_TOLERANCE) / self.chars_per_token(model, language)
+        limit = settings.MODEL_MAX_OUTPUT_TOKENS.get(model, DEFAULT_MAX_OUTPUT_TOKENS)
+        return max(MIN_MAX_TOKENS, min(int(expected_tokens * settings.TOKEN_BUDGET_HEADROOM), limit))
+
+    def needs_refresh(self) -> bool:
+        return self._calibrated_at is None or time.monotonic() - self._calibrated_at > settings.TOKEN_BUDGET_REFRESH_SECONDS
+
+    def refresh(self, db: Session):
+        """Пересчитывает знаки на токен по последним готовым статьям"""
+        # Время ставим сразу: при ошибке базы не повторяем запрос на каждой статье
+        self._calibrated_at = time.monotonic()
+        totals: Dict[Tuple[str, str], Tuple[int, int, int]] = {}
+        for model, completion_tokens, article_length, article_start in crud.get_token_calibration_samples(db):
+            key = (model, detect_language(article_start))
+            chars, tokens, count = totals.get(key, (0, 0, 0))
+            totals[key] = (chars + article_length, tokens + completion_tokens, count + 1)
+
+        calibration = {}
+        for key, (chars, tokens, count) in totals.items():
+            if count < settings.TOKEN_BUDGET_MIN_SAMPLES:
+                continue
+            default = default_chars_per_token(*key)
+            # Выбросы (обрезанные или дописанные статьи) не должны уводить оценку далеко от токенизатора
+            calibration[key] = round(min(max(chars / tokens, default * 0.5), default * 2), 3)
+
+        self._calibration = calibration
+        self._samples = {key: totals[key][2] for key in calibration}
+        logger.info(f"🧮 Калибровка знаков на токен обновлена: {len(calibration)} моделей/языков")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calibrated": {
+                f"{model}:{language}": {"chars_per_token": value, "samples": self._samples[(model, language)]}
+                for (model, language), value in self._calibration.items()
+            },
+            "age_seconds": int(time.monotonic() - self._calibrated_at) if self._calibrated_at is not None else None
+        }
+
+# Глобальная оценка бюджета токенов
+token_budget = TokenBudget()
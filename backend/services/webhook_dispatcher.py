@@ -0,0 +1,227 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from uuid import UUID, uuid4
+
+import aiohttp
+from sqlalchemy import select, update
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import settings
+from database import AsyncSessionLocal
+from models import WebhookDelivery
+
+logger = logging.getLogger(__name__)
+
+# Доставка, взятая в работу, не подхватывается повторной выборкой в течение этого времени
+DELIVERY_LEASE_SECONDS = 120
+
+# Доставка в очереди: (id, url, payload, attempts, next_attempt_at при захвате - метка аренды)
+Delivery = Tuple[UUID, str, Dict[str, Any], int, datetime]
+
+
+class WebhookDispatcher:
+    """Доставляет webhook'и вне обработки запроса.
+
+    Каждый webhook сначала сохраняется в webhook_deliveries, затем отправляется
+    фоновыми воркерами через общую aiohttp-сессию (пул keep-alive соединений к n8n).
+    Неудачные доставки повторяются с экспоненциальной задержкой; недоставленные
+    после перезапуска дино подхватывает периодическая выборка из базы.
+
+    Перед отправкой воркер заново захватывает строку условным UPDATE по метке
+    аренды (next_attempt_at): если пока доставка ждала в памяти, ее забрал
+    другой процесс или она уже доставлена, webhook не отправляется повторно.
+    """
+
+    def __init__(self, concurrency: Optional[int] = None):
+        self.concurrency = concurrency or settings.WEBHOOK_CONCURRENCY
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.queue: Optional[asyncio.Queue] = None
+        self.tasks: List[asyncio.Task] = []
+        # Доставки в очереди этого процесса - повторная выборка их не берет
+        self.queued_ids: Set[UUID] = set()
+        self.total_delivered = 0
+        self.total_skipped = 0
+        self.total_retried = 0
+        self.total_failed = 0
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self.tasks)
+
+    async def start(self):
+        """Создает общую HTTP-сессию и запускает воркеры доставки"""
+        if self.is_running:
+            return
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=self.concurrency * 2, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=settings.WEBHOOK_TIMEOUT_SECONDS),
+            headers={"Content-Type": "application/json"}
+        )
+        self.queue = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._deliver_loop()) for _ in range(self.concurrency)]
+        self.tasks.append(asyncio.create_task(self._retry_loop()))
+        logger.info(f"🔗 Диспетчер webhook'ов запущен ({self.concurrency} воркеров)")
+
+    async def stop(self):
+        """Останавливает воркеры; недоставленное останется в базе и будет отправлено после запуска"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def enqueue(self, url: str, payload: Dict[str, Any]) -> UUID:
+        """Сохраняет webhook и ставит его в очередь отправки (без ожидания ответа получателя)"""
+        delivery_id = uuid4()
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=DELIVERY_LEASE_SECONDS)
+        async with AsyncSessionLocal() as db:
+            db.add(WebhookDelivery(
+                id=delivery_id,
+                url=url,
+                payload=payload,
+                status="pending",
+                attempts=0,
+                # Пока доставка в памяти, повторная выборка ее не трогает
+                next_attempt_at=lease_until,
+                created_at=now
+            ))
+            await db.commit()
+
+        if not self.is_running:
+            await self.start()
+        self._put((delivery_id, url, payload, 0, lease_until))
+        return delivery_id
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "delivered": self.total_delivered,
+            "skipped": self.total_skipped,
+            "retried": self.total_retried,
+            "failed": self.total_failed
+        }
+
+    def _retry_delay(self, attempts: int) -> float:
+        return min(settings.WEBHOOK_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), settings.WEBHOOK_RETRY_MAX_SECONDS)
+
+    def _put(self, delivery: Delivery):
+        self.queued_ids.add(delivery[0])
+        self.queue.put_nowait(delivery)
+
+    async def _deliver_loop(self):
+        while True:
+            delivery_id, url, payload, attempts, lease_until = await self.queue.get()
+            try:
+                await self._deliver(delivery_id, url, payload, attempts, lease_until)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработки webhook {delivery_id}: {str(e)}")
+            finally:
+                self.queued_ids.discard(delivery_id)
+                self.queue.task_done()
+
+    async def _acquire(self, delivery_id: UUID, lease_until: datetime) -> Optional[datetime]:
+        """Продлевает аренду на время отправки, если строка все еще pending с нашей меткой; возвращает новую метку"""
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(WebhookDelivery)
+                .where(
+                    WebhookDelivery.id == delivery_id,
+                    WebhookDelivery.status == "pending",
+                    WebhookDelivery.next_attempt_at == lease_until
+                )
+                .values(next_attempt_at=now + timedelta(seconds=DELIVERY_LEASE_SECONDS))
+                .returning(WebhookDelivery.next_attempt_at)
+            )
+            acquired = result.scalar_one_or_none()
+            await db.commit()
+        return acquired
+
+    async def _deliver(self, delivery_id: UUID, url: str, payload: Dict[str, Any], attempts: int, lease_until: datetime):
+        """Отправляет webhook и записывает результат попытки"""
+        lease_until = await self._acquire(delivery_id, lease_until)
+        if lease_until is None:
+            # Аренда истекла, пока доставка ждала в памяти: строку забрал другой воркер или она уже завершена
+            self.total_skipped += 1
+            logger.info(f"⏭️ Webhook {delivery_id} уже обработан другим воркером, пропускаем")
+            return
+
+        error = None
+        try:
+            async with self.session.post(url, json=payload) as response:
+                if response.status >= 400:
+                    error = f"HTTP {response.status}"
+        except asyncio.TimeoutError:
+            error = "Таймаут"
+        except aiohttp.ClientError as e:
+            error = str(e) or e.__class__.__name__
+
+        attempts += 1
+        now = datetime.utcnow()
+        if error is None:
+            values = {"status": "delivered", "attempts": attempts, "delivered_at": now, "last_error": None}
+            self.total_delivered += 1
+            logger.info(f"✅ Webhook {delivery_id} доставлен (попытка {attempts})")
+        elif attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+            values = {"status": "failed", "attempts": attempts, "last_error": error}
+            self.total_failed += 1
+            logger.error(f"❌ Webhook {delivery_id} не доставлен после {attempts} попыток: {error}")
+        else:
+            delay = self._retry_delay(attempts)
+            values = {"attempts": attempts, "last_error": error, "next_attempt_at": now + timedelta(seconds=delay)}
+            self.total_retried += 1
+            logger.warning(f"⚠️ Webhook {delivery_id} не доставлен ({error}), повтор через {int(delay)} с")
+
+        async with AsyncSessionLocal() as db:
+            # Результат пишем, только если за время отправки аренду никто не перехватил
+            await db.execute(
+                update(WebhookDelivery)
+                .where(WebhookDelivery.id == delivery_id, WebhookDelivery.next_attempt_at == lease_until)
+                .values(**values)
+            )
+            await db.commit()
+
+    async def _retry_loop(self):
+        """Периодически забирает из базы доставки, которые пора повторить"""
+        while True:
+            try:
+                for delivery in await self._claim_due():
+                    self._put(delivery)
+            except Exception as e:
+                logger.error(f"❌ Ошибка выборки webhook'ов для повтора: {str(e)}")
+            await asyncio.sleep(settings.WEBHOOK_POLL_SECONDS)
+
+    async def _claim_due(self, limit: int = 50) -> List[Delivery]:
+        """Захватывает доставки с наступившим next_attempt_at (SKIP LOCKED - безопасно для нескольких дино)"""
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=DELIVERY_LEASE_SECONDS)
+        query = (
+            select(WebhookDelivery.id, WebhookDelivery.url, WebhookDelivery.payload, WebhookDelivery.attempts)
+            .where(WebhookDelivery.status == "pending", WebhookDelivery.next_attempt_at <= now)
+            .order_by(WebhookDelivery.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        if self.queued_ids:
+            # Уже ждущие в очереди этого процесса не дублируем
+            query = query.where(WebhookDelivery.id.notin_(list(self.queued_ids)))
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            due = [tuple(row) + (lease_until,) for row in result.all()]
+            if due:
+                await db.execute(
+                    update(WebhookDelivery)
+                    .where(WebhookDelivery.id.in_([row[0] for row in due]))
+                    .values(next_attempt_at=lease_until)
+                )
+            await db.commit()
+        return due
+
+# Глобальный диспетчер webhook'ов
+webhook_dispatcher = WebhookDispatcher()
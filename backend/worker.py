@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Отдельный процесс генерации статей.
+
+Забирает статьи в статусе pending из Postgres-очереди и выполняет весь
+конвейер (SERP → структура → статья → SEO-оценка → статистика). Веб-процесс
+в режиме GENERATION_MODE=worker только ставит статьи в очередь и читает их.
+Масштабируется независимо от веба: `heroku ps:scale worker=N`.
+"""
+
+import os
+import sys
+import asyncio
+import logging
+import signal
+
+# Add the backend directory to Python path
+backend_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, backend_dir)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("worker")
+
+from config import settings
+from services.background_tasks import BackgroundTaskManager, background_task_manager
+from services.serp_service import serp_service
+
+
+async def log_stats(manager: BackgroundTaskManager):
+    """Периодически пишет метрики пула в лог"""
+    while True:
+        await asyncio.sleep(settings.WORKER_STATS_INTERVAL)
+        logger.info(f"📊 Метрики воркера: {manager.get_stats()}")
+
+
+async def run_worker():
+    """Запускает пул генерации и работает до SIGTERM/SIGINT"""
+    manager = background_task_manager
+    # У воркера своя настройка параллелизма, независимая от веб-процесса
+    manager.max_workers = settings.WORKER_CONCURRENCY
+    if not manager.is_durable:
+        logger.error("❌ worker.py работает только с GENERATION_QUEUE_BACKEND=postgres")
+        sys.exit(1)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    await manager.start()
+    stats_task = asyncio.create_task(log_stats(manager))
+    logger.info(f"🚀 Воркер {manager.worker_id} запущен, одновременных генераций: {manager.max_workers}")
+
+    await stop_event.wait()
+
+    # Heroku дает 30 секунд после SIGTERM: незавершенные статьи сразу возвращаются в очередь
+    logger.info("🛑 Получен сигнал остановки, возвращаем незавершенные статьи в очередь...")
+    stats_task.cancel()
+    await manager.stop()
+    await serp_service.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
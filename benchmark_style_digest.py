@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+📏 Бенчмарк сжатия примеров стиля
+Сравнивает число входных токенов промпта статьи с исходными примерами стиля
+и с их сжатым описанием (style digest).
+
+Использование:
+    python benchmark_style_digest.py --style-file examples.txt --model gpt-4o-mini
+    python benchmark_style_digest.py --style-file examples.txt --digest-file digest.txt
+
+Токены считает сам провайдер: оба промпта отправляются с max_tokens=1,
+поэтому запуск стоит почти только входные токены.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+
+# Добавляем backend в путь
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+
+from services.ai_service import AIService
+
+SAMPLE_TOPIC = "Как похудеть без жестких диет"
+SAMPLE_THESIS = "Сбалансированное питание и режим работают лучше ограничений"
+SAMPLE_STRUCTURE = """# Как похудеть без жестких диет
+## Почему диеты не работают
+## Сбалансированная тарелка
+## Режим питания и сна
+## Вода и белок
+## Итоги"""
+SAMPLE_KEYWORDS = ["похудеть без диет", "правильное питание", "норма белка", "режим питания"]
+
+
+async def count_prompt_tokens(ai_service: AIService, model: str, prompt: str) -> int:
+    """Отправляет промпт с max_tokens=1 и возвращает число входных токенов по данным провайдера"""
+    service = ai_service.get_service_for_model(model)
+    if ai_service.get_provider_for_model(model) == "anthropic":
+        response = await service.async_client.messages.create(
+            model=model, max_tokens=1, system=service._article_system(), messages=service._user_messages(prompt)
+        )
+    else:
+        response = await service.async_client.chat.completions.create(
+            model=model, max_tokens=1, messages=service._article_messages(prompt)
+        )
+    return service._usage_from_response(response)["prompt_tokens"]
+
+
+async def run(args):
+    with open(args.style_file, encoding="utf-8") as f:
+        style_examples = f.read()
+
+    ai_service = AIService()
+    service = ai_service.get_service_for_model(args.model)
+
+    digest_tokens = 0
+    if args.digest_file:
+        with open(args.digest_file, encoding="utf-8") as f:
+            digest = f.read()
+    else:
+        print("🎨 Составляем описание стиля...")
+        digest, usage = await ai_service.generate_style_digest_async(style_examples, args.model)
+        digest_tokens = usage["total_tokens"]
+
+    def build_prompt(style_digest=None):
+        return service._build_article_prompt(
+            SAMPLE_TOPIC, SAMPLE_THESIS, SAMPLE_STRUCTURE, SAMPLE_KEYWORDS,
+            style_examples, args.character_count, style_digest
+        )
+
+    raw_tokens = await count_prompt_tokens(ai_service, args.model, build_prompt())
+    digest_prompt_tokens = await count_prompt_tokens(ai_service, args.model, build_prompt(digest))
+    saved = raw_tokens - digest_prompt_tokens
+
+    print()
+    print(f"Модель: {args.model}")
+    print(f"Примеры стиля: {len(style_examples)} знаков, описание: {len(digest)} знаков")
+    print(f"Промпт статьи с примерами: {raw_tokens} токенов")
+    print(f"Промпт статьи с описанием: {digest_prompt_tokens} токенов")
+    print(f"Экономия на статью: {saved} токенов ({saved / raw_tokens * 100:.1f}%)")
+    if digest_tokens:
+        print(f"Разовая стоимость описания: {digest_tokens} токенов")
+        if saved > 0:
+            print(f"Окупается после {digest_tokens / saved:.1f} статей")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Экономия входных токенов от сжатия примеров стиля")
+    parser.add_argument("--style-file", required=True, help="Файл с примерами стиля")
+    parser.add_argument("--digest-file", help="Готовое описание стиля (иначе составляется моделью)")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--character-count", type=int, default=5000)
+    asyncio.run(run(parser.parse_args()))
@@ -99,7 +99,13 @@ try:
     test_topic = "искусственный интеллект"
     print(f"🔍 Тестируем поиск по теме: '{test_topic}'")
     
-    serp_data = serp_service.analyze_topic(test_topic)
+    async def analyze_and_close():
+        try:
+            return await serp_service.analyze_topic(test_topic)
+        finally:
+            await serp_service.close()
+    
+    serp_data = asyncio.run(analyze_and_close())
     print(f"✅ Поиск выполнен успешно:")
     print(f"   - Ключевых слов: {len(serp_data.get('keywords', []))}")
     print(f"   - Заголовков: {len(serp_data.get('titles', []))}")
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from './ui/card';
 import { Button } from './ui/button';
 import { Badge } from './ui/badge';
@@ -16,7 +16,7 @@ import {
   XCircle,
   Loader2
 } from 'lucide-react';
-import { ArticleListItem, ArticleStatus } from '../types/api';
+import { ArticleListItem, ArticleStatus, ArticleEvent } from '../types/api';
 import { articleApi } from '../services/api';
 
 interface ArticleHistoryProps {
@@ -27,14 +27,27 @@ export const ArticleHistory: React.FC<ArticleHistoryProps> = ({ onViewArticle })
   const [articles, setArticles] = useState<ArticleListItem[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // Актуальный список для обработчика push-событий (он создается один раз)
+  const articlesRef = useRef<ArticleListItem[]>([]);
+  // Курсор изменений: после него догружаем только измененные статьи
+  const changesCursorRef = useRef<string | null>(null);
 
-  const fetchArticles = async () => {
-    setIsLoading(true);
+  useEffect(() => {
+    articlesRef.current = articles;
+  }, [articles]);
+
+  const fetchArticles = async (showLoader: boolean = true) => {
+    if (showLoader) {
+      setIsLoading(true);
+    }
     setError(null);
     
     try {
+      // Курсор берем до загрузки списка: изменения между ними придут повторно, но не потеряются
+      const { cursor } = await articleApi.getArticleChanges();
       const data = await articleApi.getArticles();
       setArticles(data);
+      changesCursorRef.current = cursor;
     } catch (err: any) {
       console.error('Error fetching articles:', err);
       setError('Не удалось загрузить статьи. Проверьте подключение к серверу.');
@@ -43,23 +56,83 @@ export const ArticleHistory: React.FC<ArticleHistoryProps> = ({ onViewArticle })
     }
   };
 
+  // Догружает только статьи, изменившиеся после курсора, вместо всего списка
+  const fetchChanges = async () => {
+    const since = changesCursorRef.current;
+    if (!since) {
+      fetchArticles(false);
+      return;
+    }
+
+    try {
+      let hasMore = true;
+      let cursor: string | null = since;
+      const changed: ArticleListItem[] = [];
+      while (hasMore && cursor) {
+        const page = await articleApi.getArticleChanges(cursor);
+        changed.push(...page.items);
+        cursor = page.cursor;
+        hasMore = page.has_more;
+      }
+      changesCursorRef.current = cursor;
+      if (changed.length === 0) {
+        return;
+      }
+
+      setArticles(current => {
+        const byId = new Map(current.map(article => [article.id, article]));
+        changed.forEach(item => byId.set(item.id, { ...byId.get(item.id), ...item }));
+        return Array.from(byId.values()).sort((a, b) =>
+          (b.updated_at || b.created_at).localeCompare(a.updated_at || a.created_at)
+        );
+      });
+    } catch (err: any) {
+      console.error('Error fetching article changes:', err);
+      fetchArticles(false);
+    }
+  };
+
+  const handleArticleEvent = (event: ArticleEvent) => {
+    if (event.event === 'deleted') {
+      setArticles(current => current.filter(article => article.id !== event.article_id));
+      return;
+    }
+
+    const isKnown = articlesRef.current.some(article => article.id === event.article_id);
+
+    // Завершенной статье нужны поля, которых нет в событии (SEO-оценка)
+    if (event.event === 'status' && isKnown && event.status !== 'completed') {
+      setArticles(current => current.map(article =>
+        article.id === event.article_id
+          ? {
+              ...article,
+              status: event.status || article.status,
+              error_message: event.error_message ?? null,
+              updated_at: event.updated_at
+            }
+          : article
+      ));
+      return;
+    }
+
+    // Массовое удаление в изменениях не видно - перечитываем список целиком
+    if (event.event === 'bulk_deleted') {
+      fetchArticles(false);
+      return;
+    }
+
+    // Новая или незнакомая статья, завершение - догружаем изменения
+    fetchChanges();
+  };
+
   useEffect(() => {
     fetchArticles();
     
-    // Автоматическое обновление каждые 5 секунд для отслеживания статуса генерации
-    const interval = setInterval(() => {
-      // Обновляем только если есть статьи в процессе генерации
-      const hasGeneratingArticles = articles.some(article => 
-        article.status === 'pending' || article.status === 'generating'
-      );
-      
-      if (hasGeneratingArticles) {
-        fetchArticles();
-      }
-    }, 5000);
+    // Статусы генерации приходят push-событиями - без периодического опроса
+    const unsubscribe = articleApi.subscribeToArticleEvents(handleArticleEvent, fetchChanges);
 
-    return () => clearInterval(interval);
-  }, [articles]);
+    return unsubscribe;
+  }, []);
 
   const handleDeleteArticle = async (articleId: string, e: React.MouseEvent) => {
     e.stopPropagation();
@@ -168,7 +241,7 @@ export const ArticleHistory: React.FC<ArticleHistoryProps> = ({ onViewArticle })
         <CardContent className="p-8">
           <div className="text-center">
             <p className="text-red-600 mb-4">{error}</p>
-            <Button onClick={fetchArticles} variant="outline">
+            <Button onClick={() => fetchArticles()} variant="outline">
               <RefreshCw className="h-4 w-4 mr-2" />
               Попробовать снова
             </Button>
@@ -190,7 +263,7 @@ export const ArticleHistory: React.FC<ArticleHistoryProps> = ({ onViewArticle })
             </Badge>
           )}
         </div>
-        <Button onClick={fetchArticles} variant="outline" size="sm">
+        <Button onClick={() => fetchArticles()} variant="outline" size="sm">
           <RefreshCw className="h-4 w-4 mr-2" />
           Обновить
         </Button>
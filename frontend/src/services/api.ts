@@ -8,7 +8,9 @@ import {
   ModelsResponse, 
   HealthResponse,
   AsyncGenerationResponse,
-  ArticleStatusResponse
+  ArticleStatusResponse,
+  ArticleEvent,
+  ArticleChangesResponse
 } from '../types/api';
 
 // Определяем URL API в зависимости от окружения
@@ -91,6 +93,14 @@ export const articleApi = {
     return response.data;
   },
 
+  // Получение статей, изменившихся после курсора (без текстов статей)
+  getArticleChanges: async (since?: string, limit = 200): Promise<ArticleChangesResponse> => {
+    const response = await api.get('/api/articles/changes', {
+      params: { since, limit }
+    });
+    return response.data;
+  },
+
   // Получение статьи по ID
   getArticle: async (articleId: string): Promise<GenerationResponse> => {
     console.log('API: Запрашиваем статью с ID:', articleId);
@@ -122,6 +132,36 @@ export const articleApi = {
   healthCheck: async (): Promise<HealthResponse> => {
     const response = await api.get('/api/health');
     return response.data;
+  },
+
+  // Подписка на push-события статей (вместо периодического опроса списка)
+  // onReconnect вызывается после восстановления соединения - события за время разрыва потеряны
+  subscribeToArticleEvents: (
+    onEvent: (event: ArticleEvent) => void,
+    onReconnect?: () => void
+  ): (() => void) => {
+    const source = new EventSource(`${API_BASE_URL}/api/articles/events`);
+    let wasDisconnected = false;
+
+    source.addEventListener('article', (message) => {
+      try {
+        onEvent(JSON.parse((message as MessageEvent).data));
+      } catch (error) {
+        console.error('Article event parse error:', error);
+      }
+    });
+    source.onopen = () => {
+      if (wasDisconnected && onReconnect) {
+        onReconnect();
+      }
+      wasDisconnected = false;
+    };
+    // EventSource переподключается автоматически
+    source.onerror = () => {
+      wasDisconnected = true;
+    };
+
+    return () => source.close();
   }
 };
 
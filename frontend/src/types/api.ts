@@ -2,8 +2,10 @@ export interface GenerationRequest {
   topic: string;
   thesis: string;
   style_examples?: string;
+  style_profile_id?: string;   // ID сохраненного профиля стиля вместо style_examples
   character_count?: number;
   model: string;
+  parallel_sections?: boolean; // Разделы статьи генерируются параллельно
 }
 
 export interface OpenAIUsage {
@@ -13,6 +15,7 @@ export interface OpenAIUsage {
   prompt_tokens: number;
   completion_tokens: number;
   total_tokens: number;
+  cached_tokens?: number;
   cost_usd: string;
   created_at: string;
 }
@@ -25,6 +28,7 @@ export interface GenerationResponse {
   topic: string;
   thesis: string;
   style_examples?: string;
+  style_profile_id?: string | null;
   character_count?: number;
   keywords?: string[] | null;  // Может быть null до завершения генерации
   structure?: string | null;   // Может быть null до завершения генерации
@@ -41,6 +45,7 @@ export interface Article {
   topic: string;
   thesis: string;
   style_examples?: string;
+  style_profile_id?: string | null;
   character_count?: number;
   keywords?: string[] | null;  // Может быть null до завершения генерации
   structure?: string | null;   // Может быть null до завершения генерации
@@ -49,15 +54,23 @@ export interface Article {
   model_used: string;
   status: ArticleStatus;       // Новое поле статуса
   error_message?: string | null; // Новое поле для сообщений об ошибках
+  pipeline_timings?: PipelineTimings | null; // Времена этапов генерации
   created_at: string;
   updated_at?: string | null;  // Новое поле времени обновления
 }
 
+// Времена этапов генерации (мс от начала) и критический путь
+export interface PipelineTimings {
+  started_at: string;
+  total_ms: number;
+  stages: Record<string, { start_ms: number; end_ms?: number; duration_ms?: number }>;
+  critical_path: string[];
+}
+
 export interface ArticleListItem {
   id: string;
   topic: string;
   thesis: string;
-  style_examples?: string;
   character_count?: number;
   seo_score?: number | null;   // Может быть null до завершения генерации
   model_used: string;
@@ -67,6 +80,13 @@ export interface ArticleListItem {
   updated_at?: string | null;  // Новое поле времени обновления
 }
 
+// Изменения статей после курсора (инкрементальное обновление списка)
+export interface ArticleChangesResponse {
+  items: ArticleListItem[];
+  cursor: string | null;
+  has_more: boolean;
+}
+
 // Новые типы для асинхронной генерации
 export interface AsyncGenerationResponse {
   article_id: string;
@@ -84,6 +104,15 @@ export interface ArticleStatusResponse {
   updated_at?: string | null;
 }
 
+// Push-событие об изменении статьи (SSE /api/articles/events)
+export interface ArticleEvent {
+  event: 'created' | 'status' | 'deleted' | 'bulk_created' | 'bulk_updated' | 'bulk_deleted';
+  article_id: string | null;
+  status?: ArticleStatus | null;
+  error_message?: string | null;
+  updated_at: string;
+}
+
 export interface SEORecommendations {
   article_id: string;
   seo_score: number;
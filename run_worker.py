@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Скрипт для запуска воркера генерации SEO Article Generator
+"""
+
+import os
+import sys
+import asyncio
+
+# Добавляем backend директорию в Python path
+backend_dir = os.path.join(os.path.dirname(__file__), 'backend')
+sys.path.insert(0, backend_dir)
+
+if __name__ == "__main__":
+    # Меняем рабочую директорию на backend
+    os.chdir(backend_dir)
+    
+    from worker import run_worker
+    
+    # Запускаем воркер (GENERATION_MODE=worker в API, чтобы веб только ставил статьи в очередь)
+    asyncio.run(run_worker())